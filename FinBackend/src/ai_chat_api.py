@@ -3,14 +3,19 @@ import json
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from dotenv import load_dotenv
-from openai import OpenAI
-from firebase_admin import auth as firebase_auth
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
+import pymongo
+from firebase_admin_setup import verify_id_token
+from metrics import track_dependency
+import resilience
+from db_budget import db_budget
+from expense_schema import BASE_AMOUNT_EXPR
+from notes_api import notes
 
 from db import (
     expense_collection,
     budget_collection,
     tasks_collection,
-    notes_collection,
     goals_collection,
     users_collection,
     currency_collection
@@ -25,8 +30,15 @@ OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_KEY:
     raise RuntimeError("OPENAI_API_KEY missing")
 
-client = OpenAI(api_key=OPENAI_KEY)
+# No SDK retries: a retry would run past the request deadline, and the
+# breaker decides when the upstream is worth trying again
+client = OpenAI(api_key=OPENAI_KEY, max_retries=0)
 MAX_TOKENS = int(os.getenv("AI_REPLY_MAX_TOKENS", 512))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", 20))
+# The app-data summary is optional: skip it when it can't be built in this
+# long, or when less than OPENAI_MIN_SECONDS would be left for the reply
+CONTEXT_TIMEOUT_SECONDS = float(os.getenv("CHAT_CONTEXT_TIMEOUT_SECONDS", 1.5))
+OPENAI_MIN_SECONDS = float(os.getenv("OPENAI_MIN_SECONDS", 3))
 
 bp = Blueprint("ai_chat", __name__, url_prefix="/api")
 
@@ -43,8 +55,10 @@ def verify_token_get_uid(req):
         return None, "Invalid Authorization header"
 
     try:
-        decoded = firebase_auth.verify_id_token(parts[1])
+        decoded = verify_id_token(parts[1])
         return decoded["uid"], None
+    except resilience.DependencyUnavailable:
+        raise
     except Exception as e:
         return None, str(e)
 
@@ -82,23 +96,38 @@ def detect_intent(message: str):
 # USER DATA (FIXED FIELD NAMES)
 # -------------------------------
 def build_full_user_context(uid):
-    expenses = list(expense_collection.find({"user_id": uid}))
-    budgets = list(budget_collection.find({"user_id": uid}))
-    tasks = list(tasks_collection.find({"user_id": uid}))
-    notes = list(notes_collection.find({"uid": uid}))
-    goals = list(goals_collection.find({"user_id": uid}))
-    currency = list(currency_collection.find({"user_id": uid}))
+    # Everything is counted or summed server-side: one small reply per
+    # collection instead of every task, note, goal and conversion
+    expense_totals = next(expense_collection.aggregate([
+        {"$match": {"user_id": uid}},
+        {"$group": {"_id": None, "total": {"$sum": BASE_AMOUNT_EXPR}, "count": {"$sum": 1}}},
+    ]), None) or {"total": 0, "count": 0}
+    budgets = list(budget_collection.find({"user_id": uid}, {"total_budget": 1}))
 
     return {
         "total_budget": sum(float(b.get("total_budget", 0)) for b in budgets),
-        "total_expenses": sum(float(e.get("amount", 0)) for e in expenses),
-        "expense_count": len(expenses),
-        "pending_tasks": sum(1 for t in tasks if not t.get("completed", False)),
-        "notes_count": len(notes),
-        "goals_count": len(goals),
-        "currency_conversions": len(currency)
+        "total_expenses": float(expense_totals["total"]),
+        "expense_count": expense_totals["count"],
+        "pending_tasks": tasks_collection.count_documents({"user_id": uid, "completed": False}),
+        "notes_count": notes.count(uid),
+        "goals_count": goals_collection.count_documents({"user_id": uid}),
+        "currency_conversions": currency_collection.count_documents({"user_id": uid})
     }
 
+
+def optional_user_context(uid):
+    """build_full_user_context() within its time budget, or None to answer without it."""
+    left = resilience.time_left()
+    budget = CONTEXT_TIMEOUT_SECONDS if left is None else min(CONTEXT_TIMEOUT_SECONDS, left - OPENAI_MIN_SECONDS)
+    if budget <= 0:
+        return None
+    try:
+        with pymongo.timeout(budget):
+            return build_full_user_context(uid)
+    except pymongo.errors.PyMongoError as e:
+        print("AI CONTEXT SKIPPED:", e)
+        return None
+
 # -------------------------------
 # SYSTEM PROMPT
 # -------------------------------
@@ -117,6 +146,7 @@ Rules:
 # CHAT ROUTE
 # -------------------------------
 @bp.route("/chat", methods=["POST"])
+@db_budget(round_trips=7)  # app-data context (6) + chat history (1)
 @cross_origin()
 def chat():
     try:
@@ -131,38 +161,54 @@ def chat():
         intent = detect_intent(user_message)
 
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        degraded = []
 
         if intent == "fetch_user_data":
-            context = build_full_user_context(uid)
-            messages.append({
-                "role": "system",
-                "content": f"User app summary:\n{json.dumps(context)}"
-            })
+            context = optional_user_context(uid)
+            if context is None:
+                degraded.append("context")
+            else:
+                messages.append({
+                    "role": "system",
+                    "content": f"User app summary:\n{json.dumps(context)}"
+                })
 
         messages.append({"role": "user", "content": user_message})
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.3,
-            max_tokens=MAX_TOKENS,
-        )
+        # Timeouts, connection errors, 5xx and 429 count against the breaker
+        upstream_errors = (APIConnectionError, InternalServerError, RateLimitError)
+        with resilience.guard("openai", OPENAI_TIMEOUT_SECONDS, trips=upstream_errors) as timeout:
+            with track_dependency("openai", "chat.completions"):
+                response = client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=MAX_TOKENS,
+                    timeout=timeout,
+                )
 
         reply = response.choices[0].message.content.strip()
 
+        # Both turns in one write
         users_collection.update_one(
             {"uid": uid},
-            {"$push": {"chat_history": {"role": "user", "text": user_message}}},
+            {"$push": {"chat_history": {"$each": [
+                {"role": "user", "text": user_message},
+                {"role": "bot", "text": reply},
+            ]}}},
             upsert=True
         )
 
-        users_collection.update_one(
-            {"uid": uid},
-            {"$push": {"chat_history": {"role": "bot", "text": reply}}}
-        )
-
-        return jsonify({"reply": reply})
+        payload = {"reply": reply}
+        if degraded:
+            payload["degraded"] = degraded
+        return jsonify(payload)
 
+    except resilience.DependencyUnavailable:
+        raise
+    except (APIConnectionError, InternalServerError, RateLimitError) as e:
+        print("AI UPSTREAM ERROR:", e)
+        return jsonify({"error": "AI temporarily unavailable"}), 503
     except Exception as e:
         print("AI ERROR:", e)
         return jsonify({"error": "AI failure"}), 500
@@ -16,18 +16,45 @@ FIREBASE_KEY_PATH = os.getenv("FIREBASE_SERVICE_KEY")
 
 if not firebase_admin._apps:
     cred = credentials.Certificate(FIREBASE_KEY_PATH)
-    firebase_admin.initialize_app(cred)
+    firebase_admin.initialize_app(cred, {"httpTimeout": float(os.getenv("FIREBASE_HTTP_TIMEOUT_SECONDS", 5))})
     print("✅ Firebase Admin Initialized Successfully")
 
 # ✅ Import MongoDB Connection
 from db import db
 
+# ✅ Metrics (Mongo listeners must be installed before the first query)
+import metrics
+metrics.install_mongo_metrics()
+
 # ✅ Create Flask App (ONLY ONCE)
 app = Flask(__name__)
 
 # ✅ Enable CORS Globally
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# ✅ orjson responses that encode ObjectId / datetime / Decimal128 natively
+from json_provider import ORJSONProvider
+app.json = ORJSONProvider(app)
+
+# ✅ Per-route latency histograms + /metrics
+metrics.init_flask_metrics(app)
+
+# ✅ Token-bucket limits on the expensive routes (chat, add_expense)
+import rate_limit
+rate_limit.init_flask_rate_limits(app)
+
+# ✅ Request deadlines + 503 when an upstream's circuit breaker is open
+import resilience
+resilience.init_flask_resilience(app)
+
+# ✅ Opt-in request profiling (X-Profile: 1 from an admin, or PROFILE_SAMPLE_RATE) + /api/admin/profiles
+import profiler
+profiler.init_flask_profiling(app)
+
+# ✅ Per-request MongoDB round trips vs each route's @db_budget (after the rate limiter: its bucket isn't the route's)
+import db_budget
+db_budget.init_flask_db_budgets(app)
+
 # ✅ Import Blueprints AFTER app + firebase init
 from budget_planner_api import budget_api
 from expense_tracker_api import expense_api
@@ -36,6 +63,9 @@ from todo_api import todo_api
 from ai_chat_api import bp as ai_bp
 from notes_api import notes_api
 from quotes_api import quotes_api
+from recurring_api import recurring_api
+from export_api import export_api
+from dashboard_api import dashboard_api
 app.register_blueprint(quotes_api, url_prefix="/api/quotes")
 
 
@@ -46,6 +76,9 @@ app.register_blueprint(saving_goals_bp, url_prefix="/api/goals")
 app.register_blueprint(todo_api, url_prefix="/api/todo")
 app.register_blueprint(ai_bp)  # ✅ /api/chat
 app.register_blueprint(notes_api, url_prefix="/api/notes")
+app.register_blueprint(recurring_api, url_prefix="/api/recurring")
+app.register_blueprint(export_api, url_prefix="/api/export")
+app.register_blueprint(dashboard_api, url_prefix="/api/dashboard")
 
 # -----------------------------
 # ✅ Start Currency FastAPI Server
@@ -57,7 +90,8 @@ def start_currency_api():
         stderr=subprocess.PIPE,
     )
 
-start_currency_api()
+if os.getenv("START_CURRENCY_API", "1") == "1":
+    start_currency_api()
 
 # -----------------------------
 # ✅ Run Flask Server
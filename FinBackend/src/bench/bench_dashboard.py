@@ -0,0 +1,103 @@
+# bench/bench_dashboard.py
+"""
+Home screen load: six widget calls vs one /api/dashboard call.
+
+    python bench/bench_dashboard.py --mongo mongodb://127.0.0.1:27017 --users 20 --loads 200 --concurrency 8
+
+Each "load" is one home-screen render for a random seeded user, done
+three ways:
+
+- sequential: get_summary, get_budget_summary, get_goals, tasks,
+  notes/latest and quotes/daily one after another (the current client);
+- parallel: the same six calls issued at once (best case for the client);
+- dashboard: a single GET /api/dashboard.
+
+Reports per-load latency percentiles and loads/s for each mode at the
+given client concurrency.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import env, seed  # noqa: E402
+from bench.load import ENDPOINTS  # noqa: E402
+from bench.report import latency_summary, save_results  # noqa: E402
+
+WIDGETS = ["get_summary", "get_budget_summary", "get_goals", "get_tasks", "latest_note", "daily_quote"]
+
+
+def run_mode(stack, mode, uids, loads, concurrency):
+    import requests
+
+    local = threading.local()
+    widget_pool = ThreadPoolExecutor(max_workers=len(WIDGETS) * concurrency)
+
+    def call(session, name, uid, rng):
+        _, method, path_fn, kwargs_fn = ENDPOINTS[name]
+        resp = session.request(method, stack.flask_url + path_fn(uid), timeout=30, **kwargs_fn(uid, rng))
+        return resp.status_code
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        rng = random.Random(i)
+        uid = uids[i % len(uids)]
+        start = time.perf_counter()
+        if mode == "sequential":
+            statuses = [call(session, name, uid, rng) for name in WIDGETS]
+        elif mode == "parallel":
+            # One session per widget, like a browser's parallel connections
+            statuses = list(widget_pool.map(lambda n: call(requests.Session(), n, uid, rng), WIDGETS))
+        else:
+            statuses = [call(session, "dashboard", uid, rng)]
+        return time.perf_counter() - start, max(statuses)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(loads)))
+    wall = time.perf_counter() - started
+    widget_pool.shutdown()
+
+    return {
+        "loads": loads,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "loads_per_s": loads / wall if wall else 0.0,
+        **latency_summary([r[0] for r in results]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--loads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    results = {}
+    try:
+        uids = seed.user_ids(args.users) if args.no_seed else seed.seed(args.users)
+        for mode in ("sequential", "parallel", "dashboard"):
+            results[mode] = run_mode(stack, mode, uids, args.loads, args.concurrency)
+            r = results[mode]
+            print(f"{mode:12s} {r['loads_per_s']:8.1f} loads/s  p50 {r['p50_ms']:7.2f}  "
+                  f"p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+    finally:
+        stack.stop()
+
+    print(f"\nsaved {save_results('dashboard', {'config': vars(args), 'modes': results})}")
+
+
+if __name__ == "__main__":
+    main()
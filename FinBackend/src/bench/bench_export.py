@@ -0,0 +1,117 @@
+# bench/bench_export.py
+"""
+Streaming export on large synthetic accounts.
+
+    python bench/bench_export.py --mongo mongodb://127.0.0.1:27017 --sizes 10000 100000 300000
+
+For each account size, one user is seeded with that many expenses (plus
+proportional notes/tasks and some bill files). /api/export is then
+downloaded and read in chunks. The script reports throughput,
+time-to-first-byte and the peak Python heap growth (tracemalloc) during
+the export. Peak memory should stay flat as the account grows. Use a
+real mongod for the memory numbers: mongomock copies result sets
+eagerly.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import env, seed  # noqa: E402
+from bench.fakes import token_for  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+BILL_BYTES = 256 * 1024
+
+
+def seed_account(uid, expenses, bills):
+    import db
+    from expense_schema import to_compact
+
+    for name in ("expenses", "notes", "tasks", "goals"):
+        db.db[name].delete_many({"user_id": uid} if name != "notes" else {"uid": uid})
+
+    os.makedirs("uploaded_bills", exist_ok=True)
+    batch = []
+    for i, doc in enumerate(seed._expenses(uid, expenses, random.Random(7), datetime.utcnow())):
+        if i < bills:
+            doc["bill_filename"] = f"bench_{uid}_{i}.bin"
+            with open(os.path.join("uploaded_bills", doc["bill_filename"]), "wb") as f:
+                f.write(os.urandom(BILL_BYTES))
+        batch.append(to_compact(doc))
+        if len(batch) == 5000:
+            db.expense_collection.insert_many(batch)
+            batch = []
+    if batch:
+        db.expense_collection.insert_many(batch)
+
+    rng = random.Random(1)
+    db.notes_collection.insert_many(list(seed._notes(uid, max(expenses // 20, 1), rng)))
+    db.tasks_collection.insert_many(list(seed._tasks(uid, max(expenses // 10, 1), rng, datetime.utcnow())))
+
+
+def download(stack, uid):
+    import requests
+
+    started = time.perf_counter()
+    first_byte = None
+    total = 0
+    with requests.get(
+        f"{stack.flask_url}/api/export",
+        headers={"Authorization": f"Bearer {token_for(uid)}"},
+        stream=True,
+        timeout=600,
+    ) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            total += len(chunk)
+    return total, first_byte or 0.0, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--bills", type=int, default=50)
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    results = {}
+    try:
+        for size in args.sizes:
+            uid = f"bench-export-{size}"
+            seed_account(uid, size, args.bills)
+
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            total, ttfb, elapsed = download(stack, uid)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            tracemalloc.stop()
+
+            results[str(size)] = {
+                "expenses": size,
+                "bytes": total,
+                "seconds": elapsed,
+                "ttfb_ms": ttfb * 1000,
+                "mb_per_s": total / elapsed / 1e6 if elapsed else 0.0,
+                "peak_heap_growth_mb": peak / 1e6,
+            }
+            r = results[str(size)]
+            print(f"{size:>8} expenses  {r['bytes'] / 1e6:8.1f} MB  {r['seconds']:6.2f}s  "
+                  f"ttfb {r['ttfb_ms']:6.1f} ms  peak +{r['peak_heap_growth_mb']:.1f} MB")
+    finally:
+        stack.stop()
+
+    print(f"\nsaved {save_results('export', {'config': vars(args), 'sizes': results})}")
+
+
+if __name__ == "__main__":
+    main()
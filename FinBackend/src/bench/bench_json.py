@@ -0,0 +1,125 @@
+# bench/bench_json.py
+"""
+JSON serialization of large list responses.
+
+    python bench/bench_json.py [--docs 10000] [--repeat 5]
+
+Builds 10k expense-, note- and task-shaped documents as they come out of
+pymongo (ObjectId ids, datetime stamps, a Decimal128 amount) and times
+turning them into a response body:
+
+- "before": the old per-document loop (str() every ObjectId, isoformat()
+  every datetime) followed by Flask's default json provider;
+- "after": json_provider.ORJSONProvider on the raw documents.
+
+Both run inside a Flask app context so jsonify() goes through the
+configured provider, exactly as in a request.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import Decimal128, ObjectId  # noqa: E402
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import ORJSONProvider  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+
+def make_docs(n, rng):
+    now = datetime.utcnow()
+    expenses = [{
+        "_id": ObjectId(),
+        "user_id": "bench-user",
+        "date": (now - timedelta(days=rng.randint(0, 700))).strftime("%Y-%m-%d"),
+        "category": rng.choice(["Food", "Travel", "Rent", "Bills"]),
+        "description": rng.choice(["coffee", "groceries", "uber", "netflix"]),
+        "amount": round(rng.uniform(2, 900), 2),
+        "amount_base": Decimal128(str(round(rng.uniform(2, 900), 2))),
+        "currency": "₹",
+        "payment_mode": "UPI",
+        "bill_filename": None,
+    } for _ in range(n)]
+    notes = [{
+        "_id": ObjectId(),
+        "uid": "bench-user",
+        "content": "Lorem ipsum dolor sit amet. " * rng.randint(1, 20),
+        "createdAt": now - timedelta(hours=i),
+        "updatedAt": now - timedelta(hours=i),
+    } for i in range(n)]
+    tasks = [{
+        "_id": ObjectId(),
+        "user_id": "bench-user",
+        "title": f"Task {i}",
+        "deadline_at": now + timedelta(days=rng.randint(-30, 30)),
+        "priority": "Medium",
+        "completed": rng.random() < 0.5,
+    } for i in range(n)]
+    return {"expenses": expenses, "notes": notes, "tasks": tasks}
+
+
+def legacy_convert(docs):
+    """What the blueprints used to do before jsonify."""
+    out = []
+    for d in docs:
+        d = dict(d)
+        d["id"] = str(d.pop("_id"))
+        for k, v in d.items():
+            if isinstance(v, datetime):
+                d[k] = v.isoformat()
+            elif isinstance(v, Decimal128):
+                d[k] = float(v.to_decimal())
+        out.append(d)
+    return out
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = make_docs(args.docs, random.Random(42))
+    before_app, after_app = Flask("before"), Flask("after")
+    before_app.json = DefaultJSONProvider(before_app)
+    after_app.json = ORJSONProvider(after_app)
+
+    results = {}
+    for name, docs in payloads.items():
+        with before_app.app_context():
+            before, before_bytes = best_of(lambda: before_app.json.response(legacy_convert(docs)).get_data(),
+                                           args.repeat)
+        with after_app.app_context():
+            after, after_bytes = best_of(lambda: after_app.json.response(docs).get_data(), args.repeat)
+        results[name] = {
+            "before_ms": before * 1000,
+            "after_ms": after * 1000,
+            "speedup": before / after if after else 0.0,
+            "before_mb_per_s": before_bytes / before / 1e6,
+            "after_mb_per_s": after_bytes / after / 1e6,
+        }
+        r = results[name]
+        print(f"{name:10s} before {r['before_ms']:8.1f} ms  after {r['after_ms']:7.1f} ms  "
+              f"x{r['speedup']:.1f}  ({r['after_mb_per_s']:.0f} MB/s)")
+
+    print(f"\nsaved {save_results('json', {'config': vars(args), 'payloads': results})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench/bench_notes.py
+"""
+Autosave cost of a long note: full-text saves vs delta patches.
+
+    python bench/bench_notes.py --mongo mongomock [--size-kb 50] [--saves 200]
+
+Creates one --size-kb note, then autosaves it --saves times, each save a
+small edit (a few characters typed or deleted at a random position), in
+two modes:
+
+- content: the whole text in every PUT /api/notes/update;
+- patch: a note_revisions delta against the previous revision.
+
+Reports request bytes per save, history bytes stored per save (the
+compressed note_revisions entries, snapshots included) and save
+latency p50 / p95 / p99. Finally every stored revision of the patched
+note is rebuilt through /api/notes/<id>/revisions/<n> and compared with
+the text that was saved.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import env  # noqa: E402
+from bench.fakes import token_for  # noqa: E402
+from bench.report import latency_summary, save_results  # noqa: E402
+
+WORDS = ["budget", "rent", "groceries", "save", "invest", "emergency", "fund", "goal", "monthly", "plan"]
+
+
+def edit(text, rng):
+    pos = rng.randint(0, len(text))
+    cut = rng.randint(0, min(4, len(text) - pos))
+    typed = " " + rng.choice(WORDS) if rng.random() < 0.8 else ""
+    return text[:pos] + typed + text[pos + cut:]
+
+
+def run(stack, mode, size_kb, saves, rng):
+    import requests
+    import note_revisions
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token_for(f'bench-notes-{mode}')}"
+    base = stack.flask_url + "/api/notes"
+
+    text = " ".join(rng.choice(WORDS) for _ in range(size_kb * 1024 // 7))[: size_kb * 1024]
+    note = session.post(base + "/add", json={"content": text}).json()
+    note_id = str(note["_id"])
+    revision = note["revision"]
+
+    saved, samples, request_bytes = {revision: text}, [], 0
+    for _ in range(saves):
+        new = edit(text, rng)
+        if mode == "patch":
+            body = {"id": note_id, "patch": note_revisions.diff(text, new), "base_revision": revision}
+        else:
+            body = {"id": note_id, "content": new}
+        payload = json.dumps(body).encode()
+        request_bytes += len(payload)
+        start = time.perf_counter()
+        resp = session.put(base + "/update", data=payload, headers={"Content-Type": "application/json"})
+        samples.append(time.perf_counter() - start)
+        resp.raise_for_status()
+        revision = resp.json()["revision"]
+        text = saved[revision] = new
+
+    history = session.get(f"{base}/{note_id}/revisions").json()["revisions"]
+    result = {
+        "request_bytes_per_save": request_bytes / saves,
+        "history_bytes_per_save": sum(r["size"] for r in history) / len(history),
+        **latency_summary(samples),
+    }
+    if mode == "patch":
+        result["rebuilt_ok"] = all(
+            session.get(f"{base}/{note_id}/revisions/{n}").json().get("content") == t for n, t in saved.items()
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--size-kb", type=int, default=50)
+    parser.add_argument("--saves", type=int, default=200)
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    try:
+        results = {mode: run(stack, mode, args.size_kb, args.saves, random.Random(7)) for mode in ("content", "patch")}
+    finally:
+        stack.stop()
+
+    for mode, r in results.items():
+        print(f"{mode:8s} request {r['request_bytes_per_save']:10,.0f} B/save  history {r['history_bytes_per_save']:8,.0f} B/save  "
+              f"p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms"
+              + (f"  rebuilt {'ok' if r['rebuilt_ok'] else 'MISMATCH'}" if "rebuilt_ok" in r else ""))
+    print(f"\nsaved {save_results('notes', {'config': vars(args), 'modes': results})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# bench/bench_rate_limit.py
+"""
+Overhead of the rate limiter on the request hot path.
+
+    python bench/bench_rate_limit.py [--iterations 100000] [--mongo mongodb://127.0.0.1:27017]
+
+Reports microseconds per call for:
+
+- an unlimited route (only the rule lookup);
+- looking up the uid of an already verified bearer token;
+- a full check (uid + IP buckets) with the memory backend, for one
+  hot client and for 10k distinct clients;
+- with --mongo, the same check against the shared Mongo backend (one
+  round trip per bucket).
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limit  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def fake_id_token(uid):
+    """Unsigned token shaped like a Firebase ID token, recorded as verified for the limiter."""
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    header = part({"alg": "RS256", "kid": "bench", "typ": "JWT"})
+    claims = part({"iss": "https://securetoken.google.com/nexwise", "aud": "nexwise",
+                   "user_id": uid, "sub": uid, "iat": 0, "exp": 2 ** 31})
+    token = f"{header}.{claims}.{'x' * 342}"
+    rate_limit.remember_verified(token, {"user_id": uid, "exp": 2 ** 31})
+    return f"Bearer {token}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--mongo", help="also benchmark the Mongo backend against this URI")
+    args = parser.parse_args()
+
+    rule = rate_limit.rule_for("POST", "/api/chat")
+    # Effectively unlimited so every call takes the "allowed" path
+    rule.uid = rule.ip = (10 ** 9, 10 ** 9)
+    token = fake_id_token("bench-user")
+    tokens = [fake_id_token(f"user-{i}") for i in range(10_000)]
+    memory = rate_limit.MemoryBackend()
+
+    results = {
+        "unlimited_route_us": per_call_us(lambda i: rate_limit.rule_for("GET", "/api/expense/get_expenses"),
+                                          args.iterations),
+        "verified_uid_us": per_call_us(lambda i: rate_limit.uid_from_authorization(token), args.iterations),
+        "memory_check_hot_us": per_call_us(
+            lambda i: rate_limit.check(rule, rate_limit.uid_from_authorization(token), "10.0.0.1",
+                                       backend=memory),
+            args.iterations,
+        ),
+        "memory_check_10k_clients_us": per_call_us(
+            lambda i: rate_limit.check(rule, rate_limit.uid_from_authorization(tokens[i % 10_000]),
+                                       f"10.0.{i % 250}.{i % 10_000 // 250}", backend=memory),
+            args.iterations,
+        ),
+    }
+
+    if args.mongo:
+        from pymongo import MongoClient
+
+        collection = MongoClient(args.mongo)["finbuddy_bench"]["rate_limits"]
+        collection.delete_many({})
+        mongo = rate_limit.MongoBackend(collection)
+        results["mongo_check_us"] = per_call_us(
+            lambda i: rate_limit.check(rule, f"user-{i % 1000}", "10.0.0.1", backend=mongo),
+            min(args.iterations, 5_000),
+        )
+
+    for name, value in results.items():
+        print(f"{name:32s} {value:10.2f} us")
+    print(f"\nsaved {save_results('rate_limit', {'config': vars(args), 'results': results})}")
+
+
+if __name__ == "__main__":
+    main()
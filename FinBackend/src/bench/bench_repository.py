@@ -0,0 +1,133 @@
+# bench/bench_repository.py
+"""
+The same repository workload against MongoDB and SQLite.
+
+    python bench/bench_repository.py [--mongo mongodb://127.0.0.1:27017] [--users 50] [--docs 200] [--ops 2000]
+
+Seeds --users x --docs expense-shaped documents (bulk insert, timed)
+into each backend, then times single operations on random users:
+
+- insert: one new document;
+- find: the user's 50 newest documents (indexed sort on `date`);
+- group_sum: totals per category;
+- update: set two fields on one document;
+- delete: one document.
+
+Prints per-operation p50 / p95 / p99 and ops/s. `--mongo mongomock`
+exercises the Mongo code path without a server (its timings say
+nothing about a real mongod). SQLite runs on a temporary file in WAL
+mode; `--sqlite-path` keeps it somewhere else.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.report import latency_summary, save_results  # noqa: E402
+
+CATEGORIES = ["Food", "Travel", "Rent", "Bills", "Shopping", "Health", "Entertainment"]
+
+
+def make_doc(uid, rng, now):
+    return {
+        "user_id": uid,
+        "date": now - timedelta(days=rng.randint(0, 700), seconds=rng.randint(0, 86_399)),
+        "category": rng.choice(CATEGORIES),
+        "description": rng.choice(["coffee", "groceries", "uber", "netflix", "rent"]),
+        "amount": round(rng.uniform(2, 900), 2),
+        "currency": "₹",
+        "payment_mode": rng.choice(["UPI", "Card", "Cash"]),
+    }
+
+
+def mongo_repository(uri):
+    os.environ["MONGO_URI"] = "mongodb://127.0.0.1:27017" if uri == "mongomock" else uri
+    os.environ["MONGO_DB_NAME"] = "finbuddy_bench"
+    import db
+    from repository import MongoRepository
+
+    if uri == "mongomock":
+        import mongomock
+
+        shared = mongomock.MongoClient()
+        db.MongoClient = lambda *args, **kwargs: shared
+    db.get_db()["bench_repository"].drop()
+    return MongoRepository("bench_repository", indexes=("date",))
+
+
+def sqlite_repository(path):
+    from repository import SQLiteRepository
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return SQLiteRepository("bench_repository", indexes=("date",), path=path)
+
+
+def run(repo, args):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    uids = [f"bench-user-{i:05d}" for i in range(args.users)]
+
+    started = time.perf_counter()
+    ids = {uid: repo.insert_many([make_doc(uid, rng, now) for _ in range(args.docs)]) for uid in uids}
+    seed_seconds = time.perf_counter() - started
+
+    def timed(fn):
+        samples = []
+        for _ in range(args.ops):
+            uid = rng.choice(uids)
+            start = time.perf_counter()
+            fn(uid)
+            samples.append(time.perf_counter() - start)
+        return {"ops_per_s": len(samples) / sum(samples), **latency_summary(samples)}
+
+    def delete(uid):
+        if ids[uid]:
+            repo.delete(uid, ids[uid].pop())
+
+    results = {
+        "seed_docs_per_s": args.users * args.docs / seed_seconds,
+        "insert": timed(lambda uid: repo.insert(make_doc(uid, rng, now))),
+        "find": timed(lambda uid: repo.find_by_user(uid, sort=[("date", -1)], limit=50)),
+        "group_sum": timed(lambda uid: repo.group_sum(uid, "category", "amount")),
+        "update": timed(lambda uid: repo.update(uid, rng.choice(ids[uid]),
+                                                 {"description": "edited", "amount": 1.5})),
+        "delete": timed(delete),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", help='"mongomock" or a mongodb:// URI (skipped when omitted)')
+    parser.add_argument("--sqlite-path", default=os.path.join(tempfile.gettempdir(), "nexwise-bench.db"))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    backends = {"sqlite": lambda: sqlite_repository(args.sqlite_path)}
+    if args.mongo:
+        backends["mongo"] = lambda: mongo_repository(args.mongo)
+
+    results = {}
+    for name, build in backends.items():
+        results[name] = r = run(build(), args)
+        print(f"{name}: seeded {r['seed_docs_per_s']:,.0f} docs/s")
+        for op in ("insert", "find", "group_sum", "update", "delete"):
+            o = r[op]
+            print(f"    {op:10s} {o['ops_per_s']:10,.0f} ops/s  p50 {o['p50_ms']:7.3f}  "
+                  f"p95 {o['p95_ms']:7.3f}  p99 {o['p99_ms']:7.3f} ms")
+
+    print(f"\nsaved {save_results('repository', {'config': vars(args), 'backends': results})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# bench/bench_search.py
+"""
+/api/expense/search on one user with 100k expenses.
+
+    python bench/bench_search.py [--mongo mongodb://127.0.0.1:27017] [--expenses 100000] [--requests 50]
+
+Seeds --expenses compact expenses for a single user (two years of
+dates, realistic descriptions), then for each query below times
+--requests first-page requests (limit 50) and a walk of --pages pages
+through the keyset cursor:
+
+- newest: no filter, sort -date;
+- amount_range: amount>=100 amount<250, sort -amount;
+- month_mode: one month, two payment modes;
+- category_currency: two categories, one currency, not Cash;
+- keyword / keyword_range: text search alone and with a date range.
+
+The baseline is what clients did before: GET /api/expense/get_expenses
+for the whole history and filter locally (one request, timed).
+
+Against a real mongod it also prints each query's plan: keys and
+documents examined per page returned, from explain(). mongomock can't
+run $text queries or explain, so the keyword cases are skipped there
+and its timings are a full scan in Python.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import env, seed  # noqa: E402
+from bench.fakes import token_for  # noqa: E402
+from bench.report import latency_summary, save_results  # noqa: E402
+
+UID = "bench-search-user"
+DESCRIPTIONS = [
+    "coffee with team", "weekly groceries", "uber to airport", "netflix subscription", "rent june",
+    "pharmacy refill", "dinner with friends", "movie night", "electricity bill", "gym membership",
+    "flight tickets", "hotel booking", "street food", "book store", "phone recharge",
+]
+QUERIES = {
+    "newest": ("", "-date"),
+    "amount_range": ("amount>=100 amount<250", "-amount"),
+    "month_mode": ("date:{month} mode:UPI,Card", "-date"),
+    "category_currency": ("category:Food,Travel currency:₹ -mode:Cash", "-date"),
+    "keyword": ("coffee", "-date"),
+    "keyword_range": ("dinner date>={quarter}", "-date"),
+}
+TEXT_QUERIES = {"keyword", "keyword_range"}
+
+
+def seed_user(count, rng):
+    from db import expense_collection
+    from expense_schema import build_expense
+
+    expense_collection.delete_many({"user_id": UID})
+    today = datetime.utcnow()
+    batch = []
+    for i in range(count):
+        day = today - timedelta(days=rng.randint(0, 730))
+        batch.append(build_expense(
+            UID, day.strftime("%Y-%m-%d"), rng.choice(seed.CATEGORIES), rng.choice(DESCRIPTIONS),
+            round(rng.uniform(2, 900), 2), rng.choice(seed.PAYMENT_MODES), rng.choice(seed.CURRENCIES),
+            None, "INR", None,
+        ))
+        if len(batch) == 10_000 or i == count - 1:
+            expense_collection.insert_many(batch, ordered=False)
+            batch = []
+
+
+def plan_summary(q, sort, limit):
+    from db import expense_collection
+    from expense_search import search_pipeline
+
+    pipeline, _, _ = search_pipeline(UID, q, sort=sort, limit=limit)
+    match, order = pipeline[0]["$match"], pipeline[1]["$sort"]
+    stats = expense_collection.find(match).sort(list(order.items())).limit(limit + 1).explain()["executionStats"]
+    return {
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    import requests
+
+    stack = env.boot(mongo=args.mongo)
+    results = {}
+    try:
+        started = time.perf_counter()
+        seed_user(args.expenses, random.Random(11))
+        print(f"seeded {args.expenses:,} expenses in {time.perf_counter() - started:.1f}s")
+
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token_for(UID)}"
+        url = stack.flask_url + "/api/expense/search"
+        today = datetime.utcnow()
+        fill = {"month": (today - timedelta(days=60)).strftime("%Y-%m"),
+                "quarter": (today - timedelta(days=90)).strftime("%Y-%m-%d")}
+
+        start = time.perf_counter()
+        resp = session.get(stack.flask_url + "/api/expense/get_expenses")
+        results["baseline_get_expenses"] = {
+            "seconds": time.perf_counter() - start, "bytes": len(resp.content), "status": resp.status_code,
+        }
+
+        for name, (q, sort) in QUERIES.items():
+            if name in TEXT_QUERIES and args.mongo == "mongomock":
+                continue
+            q = q.format(**fill)
+            first = []
+            for _ in range(args.requests):
+                t0 = time.perf_counter()
+                body = session.get(url, params={"q": q, "sort": sort}).json()
+                first.append(time.perf_counter() - t0)
+
+            pages, cursor, returned = [], None, 0
+            for _ in range(args.pages):
+                params = {"q": q, "sort": sort, **({"cursor": cursor} if cursor else {})}
+                t0 = time.perf_counter()
+                body = session.get(url, params=params).json()
+                pages.append(time.perf_counter() - t0)
+                returned += len(body["expenses"])
+                cursor = body["next_cursor"]
+                if not cursor:
+                    break
+
+            results[name] = {
+                "q": q, "sort": sort,
+                "first_page": latency_summary(first),
+                "walk": {"pages": len(pages), "returned": returned, "last_page_ms": pages[-1] * 1000,
+                         **latency_summary(pages)},
+            }
+            if args.mongo != "mongomock":
+                results[name]["plan"] = plan_summary(q, sort, 50)
+    finally:
+        stack.stop()
+
+    base = results["baseline_get_expenses"]
+    print(f"baseline get_expenses: {base['seconds'] * 1000:,.0f} ms, {base['bytes'] / 1e6:.1f} MB")
+    for name, r in results.items():
+        if name == "baseline_get_expenses":
+            continue
+        f, w = r["first_page"], r["walk"]
+        line = (f"    {name:18s} p50 {f['p50_ms']:8.2f}  p95 {f['p95_ms']:8.2f}  p99 {f['p99_ms']:8.2f} ms  "
+                f"walk {w['pages']:3d} pages, last {w['last_page_ms']:8.2f} ms")
+        if "plan" in r:
+            p = r["plan"]
+            line += f"  keys {p['keys_examined']}  docs {p['docs_examined']}  returned {p['returned']}"
+        print(line)
+    print(f"\nsaved {save_results('search', {'config': vars(args), 'results': results})}")
+
+
+if __name__ == "__main__":
+    main()
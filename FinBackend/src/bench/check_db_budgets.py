@@ -0,0 +1,125 @@
+# bench/check_db_budgets.py
+"""
+Fails when a route takes more MongoDB round trips than it declares.
+
+    python bench/check_db_budgets.py [--mongo mongodb://127.0.0.1:27017] [--only get_summary chat]
+
+Boots both apps with DB_BUDGET_ENFORCE=1 against a local mongod, seeds
+a few users and calls every endpoint in bench/load.py ENDPOINTS
+--repeat times. Per endpoint it prints the most round trips seen, the
+declared budget, getMores and the largest reply in bytes. Exit status
+is 1 when any endpoint goes over its budget or declares none.
+
+The counts come from pymongo's command monitoring, which only a real
+server produces. `--mongo mongomock` counts collection method calls
+instead (one per find / aggregate / update...): the round-trip column
+is the same for these handlers, getMores and bytes are not measured.
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DB_BUDGET_ENFORCE"] = "1"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+import db_budget  # noqa: E402
+from bench import env, seed  # noqa: E402
+from bench.load import ENDPOINTS  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+MONGOMOCK_COMMANDS = {
+    "find": "find", "find_one": "find", "aggregate": "aggregate", "count_documents": "aggregate",
+    "distinct": "distinct", "insert_one": "insert", "insert_many": "insert", "update_one": "update",
+    "update_many": "update", "replace_one": "update", "delete_one": "delete", "delete_many": "delete",
+    "find_one_and_update": "findAndModify", "find_one_and_replace": "findAndModify",
+    "find_one_and_delete": "findAndModify", "bulk_write": "bulkWrite", "create_index": "createIndexes",
+}
+
+
+def count_mongomock_calls():
+    """mongomock emits no command events: record one round trip per outermost collection call."""
+    import mongomock
+
+    depth = threading.local()
+
+    def counted(method, command_name):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            outermost = not getattr(depth, "value", 0)
+            depth.value = getattr(depth, "value", 0) + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth.value -= 1
+                tally = db_budget.current()
+                if outermost and tally is not None:
+                    tally.record(command_name, 0)
+        return wrapper
+
+    for name, command_name in MONGOMOCK_COMMANDS.items():
+        setattr(mongomock.collection.Collection, name,
+                counted(getattr(mongomock.collection.Collection, name), command_name))
+
+
+def check(stack, name, uids, repeat):
+    import requests
+
+    app, method, path_fn, kwargs_fn = ENDPOINTS[name]
+    base = stack.flask_url if app == "flask" else stack.fastapi_url
+    rng = random.Random(name)
+    worst = {"round_trips": 0, "get_mores": 0, "reply_bytes": 0, "budget": None, "statuses": [], "commands": []}
+    for i in range(repeat):
+        uid = uids[i % len(uids)]
+        resp = requests.request(method, base + path_fn(uid), timeout=60, **kwargs_fn(uid, rng))
+        worst["statuses"].append(resp.status_code)
+        if resp.headers.get(db_budget.BUDGET_HEADER):
+            worst["budget"] = int(resp.headers[db_budget.BUDGET_HEADER])
+        for key, header in (("round_trips", db_budget.ROUND_TRIPS_HEADER),
+                            ("get_mores", db_budget.GET_MORES_HEADER),
+                            ("reply_bytes", db_budget.REPLY_BYTES_HEADER)):
+            worst[key] = max(worst[key], int(resp.headers.get(header, 0)))
+        if resp.status_code == 500 and resp.headers.get("Content-Type", "").startswith("application/json"):
+            worst["commands"] = resp.json().get("commands", worst["commands"])
+    worst["ok"] = worst["budget"] is not None and worst["round_trips"] <= worst["budget"]
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="calls per endpoint (the worst one counts)")
+    parser.add_argument("--only", nargs="*", help="endpoint names to check")
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    try:
+        import db
+
+        if args.mongo == "mongomock":
+            count_mongomock_calls()
+        db.get_client()  # index builds happen here, not inside the first request
+        uids = seed.seed(args.users)
+
+        results = {}
+        for name in args.only or ENDPOINTS:
+            results[name] = r = check(stack, name, uids, args.repeat)
+            budget = "-" if r["budget"] is None else r["budget"]
+            print(f"    {'PASS' if r['ok'] else 'FAIL'}  {name:20s} round trips {r['round_trips']:3d} / {budget!s:>3}  "
+                  f"getMore {r['get_mores']:3d}  reply {r['reply_bytes']:>10,d} B"
+                  + (f"  [{', '.join(r['commands'])}]" if not r["ok"] and r["commands"] else ""))
+    finally:
+        stack.stop()
+
+    print(f"\nsaved {save_results('db_budgets', {'config': vars(args), 'endpoints': results})}")
+    sys.exit(0 if results and all(r["ok"] for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# bench/check_loan_schedules.py
+"""
+Randomized check of generate_variable_rate_schedule() against a plain
+month-by-month simulation.
+
+    python bench/check_loan_schedules.py [--loans 2000] [--seed 1]
+
+Each loan gets a random amount, rate, tenure and up to 10 rate resets,
+each with a random policy. For every loan it compares months taken,
+total interest (to 0.1%), and for every month: the schedule row's
+balance, balance_after(month) and the simulated balance, which must
+agree and never go negative. A few fixed cases run first, including
+the TENURE_POLICY loan whose final segment used to return a negative
+balance_after. Exit status is 1 on any mismatch.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loan_calculator  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+FIXED_CASES = [
+    # balance_after(207) was -1243.7 while the schedule row showed 0.0
+    (500000, 8.5, 240, [(13, 10.0, "tenure"), (25, 7.0)], loan_calculator.TENURE_POLICY),
+    (500000, 8.5, 240, [(13, 10.0, "tenure"), (25, 7.0)], loan_calculator.EMI_POLICY),
+    (5_000_000, 8.5, 360, [(12 * i + 1, 8.0 + (i % 5) * 0.5) for i in range(1, 30)], loan_calculator.TENURE_POLICY),
+    (100000, 0.0, 12, [(6, 12.0, "tenure")], loan_calculator.EMI_POLICY),
+]
+
+
+def months_to_clear(balance, rate, emi):
+    r = rate / 12.0 / 100.0
+    if emi <= balance * r:
+        return None
+    n = 0
+    while balance > 1e-6:
+        balance = balance * (1 + r) - emi
+        n += 1
+    return n
+
+
+def simulate(amount, rate, months, resets, policy):
+    """(balances after each month, total interest), paying month by month."""
+    timeline = {int(x[0]): x for x in resets}
+    balance = float(amount)
+    emi = loan_calculator.calculate_loan_emi(balance, rate, months=months)
+    end = months
+    balances, interest_total, month = [], 0.0, 0
+    while balance > 0:
+        month += 1
+        if month in timeline:
+            reset = timeline[month]
+            rate = reset[1]
+            remaining = None
+            if (reset[2] if len(reset) > 2 else policy) == loan_calculator.TENURE_POLICY:
+                remaining = months_to_clear(balance, rate, emi)
+            if remaining is None:
+                emi = loan_calculator.calculate_loan_emi(balance, rate, months=end - month + 1)
+            else:
+                end = month - 1 + remaining
+        interest = balance * rate / 12.0 / 100.0
+        principal = balance if month == end else min(emi - interest, balance)
+        balance -= principal
+        if balance < 0.01:
+            balance = 0.0
+        interest_total += interest
+        balances.append(balance)
+    return balances, interest_total
+
+
+def check(amount, rate, months, resets, policy):
+    """List of problems (empty when the schedule matches the simulation)."""
+    result = loan_calculator.generate_variable_rate_schedule(amount, rate, resets, months=months, policy=policy)
+    balances, interest = simulate(amount, rate, months, resets, policy)
+    problems = []
+    if result.months_taken != len(balances):
+        problems.append(f"months taken {result.months_taken} != simulated {len(balances)}")
+    if abs(result.total_interest - interest) > max(1.0, interest * 1e-3):
+        problems.append(f"total interest {result.total_interest} != simulated {interest:.2f}")
+    for row, simulated in zip(result.schedule, balances):
+        point = result.balance_after(row.month)
+        if point < 0 or abs(point - row.balance) > 0.02 or abs(point - simulated) > max(1.0, simulated * 1e-6):
+            problems.append(f"month {row.month}: balance_after {point}, row {row.balance}, simulated {simulated:.2f}")
+            break
+    return problems
+
+
+def random_case(rng):
+    months = rng.randint(1, 30) * 12 + rng.choice((0, rng.randint(1, 11)))
+    resets = []
+    for month in sorted(rng.sample(range(2, months + 12), min(rng.randint(0, 10), months + 10))):
+        reset = (month, round(rng.uniform(0, 16), 2))
+        if rng.random() < 0.5:
+            reset += (rng.choice((loan_calculator.EMI_POLICY, loan_calculator.TENURE_POLICY)),)
+        resets.append(reset)
+    policy = rng.choice((loan_calculator.EMI_POLICY, loan_calculator.TENURE_POLICY))
+    return round(rng.uniform(10_000, 5_000_000), 2), round(rng.uniform(0, 15), 2), months, resets, policy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = FIXED_CASES + [random_case(rng) for _ in range(args.loans)]
+    failures = []
+    for case in cases:
+        problems = check(*case)
+        if problems:
+            failures.append({"case": repr(case), "problems": problems})
+            print(f"    FAIL  {case!r}\n          " + "\n          ".join(problems))
+
+    print(f"{len(cases) - len(failures)} / {len(cases)} loans match the month-by-month simulation")
+    print(f"\nsaved {save_results('loan_schedules', {'config': vars(args), 'failures': failures})}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
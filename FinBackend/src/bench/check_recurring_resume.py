@@ -0,0 +1,88 @@
+# bench/check_recurring_resume.py
+"""
+Pausing and resuming a recurring template must not back-fill the pause.
+
+    python bench/check_recurring_resume.py [--mongo mongomock] [--paused-days 95]
+
+For each rule below it creates a template starting --paused-days ago,
+runs recurring_worker as of that first day, pauses the template through
+PATCH /api/recurring/templates/<id>, moves the worker's clock to today,
+resumes and runs the worker again. Every expense must fall on the first
+day or on/after the resume day: none for occurrences missed while
+paused. Exit status is 1 otherwise.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+from bench import env  # noqa: E402
+from bench.fakes import token_for  # noqa: E402
+
+UID = "check-recurring-resume"
+
+
+def rules(start):
+    return {
+        "daily": {"freq": "daily", "interval": 1},
+        "weekly": {"freq": "weekly", "interval": 1, "weekday": start.weekday()},
+        "monthly": {"freq": "monthly", "interval": 1, "day_of_month": start.day},
+        "cron": {"cron": f"{start.day} * *"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--paused-days", type=int, default=95)
+    args = parser.parse_args()
+
+    import requests
+
+    stack = env.boot(mongo=args.mongo)
+    failures = []
+    try:
+        import recurring_worker
+        from db import expense_collection, recurring_collection
+
+        today = datetime.utcnow().date()
+        start = today - timedelta(days=args.paused_days)
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token_for(UID)}"
+        url = stack.flask_url + "/api/recurring/templates"
+
+        for name, rule in rules(start).items():
+            recurring_collection.delete_many({"user_id": UID})
+            expense_collection.delete_many({"user_id": UID})
+            created = session.post(url, json={
+                "rule": rule, "amount": 10, "category": "Bills", "start_date": f"{start:%Y-%m-%d}",
+            }).json()
+            recurring_worker.run(until=start, restart=True)
+
+            session.patch(f"{url}/{created['id']}", json={"active": False})
+            recurring_worker.run(until=today, restart=True)
+            resumed = session.patch(f"{url}/{created['id']}", json={"active": True}).json()
+            recurring_worker.run(until=today, restart=True)
+
+            days = sorted(d["date"].date() for d in expense_collection.find({"user_id": UID}))
+            backlog = [d for d in days if start < d < today]
+            status = "ok" if days[:1] == [start] and not backlog else "FAIL"
+            print(f"{name:8s} {status}  next_run {resumed.get('template', {}).get('next_run')}  "
+                  f"expenses {[f'{d:%Y-%m-%d}' for d in days]}")
+            if status != "ok":
+                failures.append(name)
+    finally:
+        stack.stop()
+
+    if failures:
+        print(f"\nback-filled after resume: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
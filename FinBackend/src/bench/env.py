@@ -0,0 +1,119 @@
+# bench/env.py
+"""
+Boot the Flask and FastAPI apps against local stand-ins.
+
+    from bench import env
+    stack = env.boot(mongo="mongomock")   # or a mongodb:// URI for a local mongod
+    ...
+    stack.stop()
+
+Must run before anything imports `app`, `db` or a blueprint.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from bench.fakes import FakeUpstream, fake_verify_id_token  # noqa: E402
+
+DEFAULT_MONGO = os.getenv("BENCH_MONGO_URI", "mongodb://127.0.0.1:27017")
+
+
+class Stack:
+    def __init__(self, upstream, flask_url, fastapi_url, servers, workdir):
+        self.upstream = upstream
+        self.flask_url = flask_url
+        self.fastapi_url = fastapi_url
+        self._servers = servers
+        self.workdir = workdir
+
+    def stop(self):
+        for stop in self._servers:
+            stop()
+        self.upstream.stop()
+
+
+def _prepare_environment(mongo, upstream_url, db_name):
+    os.environ["MONGO_URI"] = "mongodb://127.0.0.1:27017" if mongo == "mongomock" else mongo
+    os.environ["MONGO_DB_NAME"] = db_name
+    os.environ.setdefault("FIREBASE_SERVICE_KEY", "bench-service-key.json")
+    os.environ["OPENAI_API_KEY"] = "bench-key"
+    os.environ["OPENAI_BASE_URL"] = f"{upstream_url}/v1"
+    os.environ["EXCHANGE_API_BASE"] = f"{upstream_url}/v4/latest"
+    os.environ["START_CURRENCY_API"] = "0"
+
+
+def _patch_firebase():
+    import firebase_admin
+    from firebase_admin import auth
+
+    # app.py / firebase_admin_setup.py skip initialize_app() when an app exists
+    firebase_admin._apps.setdefault("[DEFAULT]", object())
+    auth.verify_id_token = fake_verify_id_token
+
+
+def _patch_mongo(mongo):
+    import db
+
+    if mongo == "mongomock":
+        import mongomock
+
+        shared = mongomock.MongoClient()
+        db.MongoClient = lambda *args, **kwargs: shared
+
+
+def _serve_flask(app, host="127.0.0.1"):
+    from werkzeug.serving import make_server
+
+    server = make_server(host, 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://{host}:{server.server_port}", server.shutdown
+
+
+def _serve_fastapi(app, host="127.0.0.1"):
+    import socket
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind((host, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    return f"http://{host}:{port}", stop
+
+
+def boot(mongo=DEFAULT_MONGO, db_name="finbuddy_bench"):
+    upstream = FakeUpstream().start()
+    _prepare_environment(mongo, upstream.url, db_name)
+
+    # Bills and other relative paths land in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="nexwise-bench-")
+    os.chdir(workdir)
+
+    _patch_firebase()
+    _patch_mongo(mongo)
+
+    import app as flask_module
+    import currency_converter
+
+    flask_url, stop_flask = _serve_flask(flask_module.app)
+    fastapi_url, stop_fastapi = _serve_fastapi(currency_converter.app)
+
+    return Stack(upstream, flask_url, fastapi_url, [stop_flask, stop_fastapi], workdir)
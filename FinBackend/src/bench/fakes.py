@@ -0,0 +1,131 @@
+# bench/fakes.py
+"""
+Local stand-ins for the external services:
+
+- FakeUpstream: one HTTP server that answers both the exchangerate-api
+  `/v4/latest/<CODE>` route and the OpenAI `/v1/chat/completions` route,
+  with optional injected latency / failures (all routes, or only those
+  starting with one of `paths`).
+- fake_verify_id_token: Firebase verifier accepting "bench-<uid>" tokens.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD-based table, roughly realistic
+RATES_USD = {
+    "USD": 1.0, "INR": 83.2, "EUR": 0.92, "GBP": 0.79, "AUD": 1.52,
+    "JPY": 151.3, "CAD": 1.36, "SGD": 1.34, "CNY": 7.23, "AED": 3.67,
+}
+
+TOKEN_PREFIX = "bench-"
+
+
+def token_for(uid):
+    return f"{TOKEN_PREFIX}{uid}"
+
+
+def fake_verify_id_token(id_token, *args, **kwargs):
+    token = (id_token or "").replace("Bearer ", "")
+    if not token.startswith(TOKEN_PREFIX):
+        raise ValueError("invalid bench token")
+    uid = token[len(TOKEN_PREFIX):]
+    return {"uid": uid, "user_id": uid, "sub": uid, "exp": int(time.time()) + 3600}
+
+
+def rates_for(base):
+    base = base.upper()
+    pivot = RATES_USD.get(base)
+    if pivot is None:
+        return None
+    return {code: rate / pivot for code, rate in RATES_USD.items()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeUpstream/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fault(self):
+        cfg = self.server.faults
+        if cfg.get("paths") and not self.path.startswith(tuple(cfg["paths"])):
+            return None
+        if cfg.get("latency"):
+            time.sleep(cfg["latency"])
+        return cfg.get("status")
+
+    def do_GET(self):
+        status = self._fault()
+        if status:
+            return self._send_json(status, {"error": "injected"})
+
+        if self.path.startswith("/v4/latest/"):
+            base = self.path.rsplit("/", 1)[-1]
+            rates = rates_for(base)
+            if rates is None:
+                return self._send_json(404, {"error": "unknown base"})
+            return self._send_json(200, {
+                "base": base.upper(),
+                "date": time.strftime("%Y-%m-%d"),
+                "rates": rates,
+            })
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        status = self._fault()
+        if status:
+            return self._send_json(status, {"error": {"message": "injected"}})
+
+        if self.path.endswith("/chat/completions"):
+            return self._send_json(200, {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Bench reply."},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+            })
+        self._send_json(404, {"error": "not found"})
+
+
+class FakeUpstream:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.faults = {}
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_faults(self, latency=None, status=None, paths=None):
+        self.httpd.faults = {"latency": latency, "status": status, "paths": paths}
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
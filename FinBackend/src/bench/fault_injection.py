@@ -0,0 +1,175 @@
+# bench/fault_injection.py
+"""
+Upstream brownout drill for resilience.py.
+
+    python bench/fault_injection.py --mongo mongomock [--clients 16] [--seconds 10]
+
+Boots both apps against the fake upstream and runs three phases:
+
+1. healthy: chat and convert succeed, which warms the rate table;
+2. brownout: the fake OpenAI and exchange-rate routes hang for
+   --hang seconds (longer than any client would wait). For --seconds,
+   --clients threads send a mix of chat, convert (with a 1s
+   `X-Request-Timeout`) and get_notes requests, which don't touch an
+   upstream;
+3. recovery: faults cleared; after the breaker's reset time chat
+   answers again.
+
+The apps run with small breaker settings (threshold 3, reset 3s, OpenAI
+timeout 2s) so the drill finishes quickly. Per phase and endpoint it
+reports status counts, p50 / p99 and the request-seconds spent inside
+that endpoint. The latter is the worker time a brownout costs.
+
+Checks (exit status 1 if any fails):
+
+- at most threshold + clients chat requests wait for the OpenAI
+  timeout; the rest get 503 in milliseconds;
+- every convert succeeds, from the last known rates (`stale`) once
+  the table has expired, and none waits past its 1s deadline;
+- get_notes p99 stays under 250 ms;
+- chat succeeds again after recovery.
+
+Firebase is replaced by the bench's fake verifier, so its breaker isn't
+exercised here.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+THRESHOLD = 3
+OPENAI_TIMEOUT = 2.0
+
+_scratch = tempfile.mkdtemp(prefix="nexwise-faults-")
+os.environ.update({
+    "BREAKER_FAILURE_THRESHOLD": str(THRESHOLD),
+    "BREAKER_RESET_SECONDS": "3",
+    "OPENAI_TIMEOUT_SECONDS": str(OPENAI_TIMEOUT),
+    "RATE_TABLE_TTL_SECONDS": "1",
+    "RATE_TABLE_RETRY_SECONDS": "1",
+    "RATE_TABLE_PATH": os.path.join(_scratch, "rates_cache.json"),
+    "RATE_HISTORY_DIR": os.path.join(_scratch, "rate_history"),
+    "RATE_LIMIT_ENABLED": "0",
+})
+
+from bench import env, seed  # noqa: E402
+from bench.load import ENDPOINTS  # noqa: E402
+from bench.report import latency_summary, save_results  # noqa: E402
+
+MIX = ["chat", "chat", "convert", "get_notes", "get_notes"]
+UPSTREAM_PATHS = ["/v1/chat/completions", "/v4/latest/"]
+
+
+def call(stack, name, uid, rng, session):
+    app, method, path_fn, kwargs_fn = ENDPOINTS[name]
+    base = stack.flask_url if app == "flask" else stack.fastapi_url
+    kwargs = kwargs_fn(uid, rng)
+    if name == "chat":
+        kwargs["json"] = {"message": "How do I start an emergency fund?"}  # no app-data context
+    if name == "convert":
+        kwargs["headers"] = {**kwargs.get("headers", {}), "X-Request-Timeout": "1"}
+    start = time.perf_counter()
+    resp = session.request(method, base + path_fn(uid), timeout=60, **kwargs)
+    body = resp.json() if resp.headers.get("Content-Type", "").startswith("application/json") else {}
+    return name, time.perf_counter() - start, resp.status_code, body
+
+
+def summarize(samples):
+    out = {}
+    for name in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == name]
+        out[name] = {
+            "requests": len(rows),
+            "statuses": dict(Counter(str(r[2]) for r in rows)),
+            "request_seconds": sum(r[1] for r in rows),
+            "slow": sum(1 for r in rows if r[1] >= OPENAI_TIMEOUT * 0.9),
+            "stale": sum(1 for r in rows if isinstance(r[3], dict) and r[3].get("stale")),
+            **latency_summary([r[1] for r in rows]),
+        }
+    return out
+
+
+def run_phase(stack, uids, clients, seconds, names):
+    import requests
+
+    samples, lock = [], threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(i):
+        rng = random.Random(i)
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            result = call(stack, rng.choice(names), rng.choice(uids), rng, session)
+            with lock:
+                samples.append(result)
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return summarize(samples)
+
+
+def print_phase(title, summary):
+    print(f"\n{title}")
+    for name, r in summary.items():
+        print(f"    {name:10s} {r['requests']:5d} req  {r['statuses']}  p50 {r['p50_ms']:8.1f}  "
+              f"p99 {r['p99_ms']:8.1f} ms  {r['request_seconds']:6.1f} req-s  slow {r['slow']}  stale {r['stale']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--hang", type=float, default=30, help="injected upstream latency")
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    phases, checks = {}, {}
+    try:
+        uids = seed.seed(args.users)
+
+        phases["healthy"] = run_phase(stack, uids, 4, 2, ["chat", "convert"])
+        print_phase("healthy", phases["healthy"])
+
+        stack.upstream.set_faults(latency=args.hang, paths=UPSTREAM_PATHS)
+        phases["brownout"] = run_phase(stack, uids, args.clients, args.seconds, MIX)
+        print_phase(f"brownout (upstream hangs {args.hang:.0f}s)", phases["brownout"])
+
+        stack.upstream.set_faults()
+        time.sleep(3.5)  # breaker reset
+        phases["recovery"] = run_phase(stack, uids, 4, 2, ["chat", "convert"])
+        print_phase("recovery", phases["recovery"])
+
+        brownout = phases["brownout"]
+        chat, convert, notes = brownout.get("chat", {}), brownout.get("convert", {}), brownout.get("get_notes", {})
+        checks = {
+            "chat fails fast once the breaker opens": chat.get("slow", 0) <= THRESHOLD + args.clients,
+            "chat brownout answers are 503": set(chat.get("statuses", {})) <= {"503"},
+            "convert serves last known rates within its deadline":
+                convert.get("statuses") == {"200": convert.get("requests")}
+                and convert.get("stale", 0) > 0 and convert.get("max_ms", 1e9) < 1500,
+            "get_notes p99 < 250 ms": notes.get("p99_ms", 1e9) < 250,
+            "chat recovers": phases["recovery"].get("chat", {}).get("statuses", {}).get("200", 0) > 0,
+        }
+    finally:
+        stack.upstream.set_faults()
+        stack.stop()
+
+    print()
+    for name, ok in checks.items():
+        print(f"    {'PASS' if ok else 'FAIL'}  {name}")
+    print(f"\nsaved {save_results('fault_injection', {'config': vars(args), 'phases': phases, 'checks': checks})}")
+    sys.exit(0 if checks and all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# bench/load.py
+"""
+End-to-end load test: boots both apps against local stand-ins, seeds data
+and drives every endpoint concurrently.
+
+    python bench/load.py --mongo mongomock --users 20 --requests 200 --concurrency 16
+    python bench/load.py --mongo mongodb://127.0.0.1:27017 --only get_summary
+
+Results (throughput + p50/p95/p99 per endpoint) are written to
+bench/results/load-<git sha>-<timestamp>.json.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import env, seed  # noqa: E402
+from bench.fakes import token_for  # noqa: E402
+from bench.report import latency_summary, save_results  # noqa: E402
+
+
+def _auth(uid, bearer=False):
+    token = token_for(uid)
+    return {"Authorization": f"Bearer {token}" if bearer else token}
+
+
+# name -> (app, method, path(uid), request kwargs(uid, rng))
+ENDPOINTS = {
+    "add_expense": ("flask", "POST", lambda u: "/api/expense/add_expense", lambda u, r: {
+        "headers": _auth(u),
+        "data": {"date": "2025-06-01", "category": r.choice(seed.CATEGORIES),
+                 "description": "bench", "amount": str(r.randint(1, 500)),
+                 "payment_mode": "UPI", "currency": "₹"},
+    }),
+    "get_expenses": ("flask", "GET", lambda u: "/api/expense/get_expenses", lambda u, r: {"headers": _auth(u)}),
+    "get_summary": ("flask", "GET", lambda u: "/api/expense/get_summary", lambda u, r: {"headers": _auth(u)}),
+    "get_analytics": ("flask", "GET", lambda u: "/api/expense/get_analytics", lambda u, r: {"headers": _auth(u)}),
+    "search_expenses": ("flask", "GET", lambda u: "/api/expense/search", lambda u, r: {
+        "headers": _auth(u), "params": {"q": f"amount>={r.randint(1, 300)} mode:UPI,Card", "sort": "-date"},
+    }),
+    "get_budget_summary": ("flask", "GET", lambda u: "/budget/get_budget_summary", lambda u, r: {"headers": _auth(u)}),
+    "add_category_budget": ("flask", "POST", lambda u: "/budget/add_category_budget", lambda u, r: {
+        "headers": _auth(u), "json": {"category": "Food", "amount": r.randint(1000, 9000)},
+    }),
+    "get_goals": ("flask", "GET", lambda u: "/api/goals/get_goals", lambda u, r: {"headers": _auth(u, bearer=True)}),
+    "save_goal": ("flask", "POST", lambda u: "/api/goals/save_goal", lambda u, r: {
+        "headers": _auth(u, bearer=True),
+        "json": {"name": f"Bench goal {r.random()}", "targetAmount": 10000, "deadline": "2027-01-01"},
+    }),
+    "get_tasks": ("flask", "GET", lambda u: f"/api/todo/tasks/{u}", lambda u, r: {}),
+    "create_task": ("flask", "POST", lambda u: "/api/todo/tasks", lambda u, r: {
+        "json": {"user_id": u, "title": "bench", "date": "2025-06-01", "deadline": "2025-06-05"},
+    }),
+    "bulk_tasks": ("flask", "POST", lambda u: "/api/todo/tasks/bulk", lambda u, r: {
+        "json": {"user_id": u, "operations": [
+            {"op": "create", "task": {"title": f"bulk {i}", "date": "2025-06-01"}} for i in range(20)
+        ]},
+    }),
+    "agenda_today": ("flask", "GET", lambda u: f"/api/todo/agenda/{u}/today", lambda u, r: {}),
+    "agenda_counts": ("flask", "GET", lambda u: f"/api/todo/agenda/{u}/counts", lambda u, r: {}),
+    "get_notes": ("flask", "GET", lambda u: "/api/notes", lambda u, r: {"headers": _auth(u, bearer=True)}),
+    "latest_note": ("flask", "GET", lambda u: "/api/notes/latest", lambda u, r: {"headers": _auth(u, bearer=True)}),
+    "add_note": ("flask", "POST", lambda u: "/api/notes/add", lambda u, r: {
+        "headers": _auth(u, bearer=True), "json": {"content": "bench note " * 20},
+    }),
+    "daily_quote": ("flask", "GET", lambda u: "/api/quotes/daily", lambda u, r: {}),
+    "dashboard": ("flask", "GET", lambda u: "/api/dashboard", lambda u, r: {"headers": _auth(u, bearer=True)}),
+    "chat": ("flask", "POST", lambda u: "/api/chat", lambda u, r: {
+        "headers": _auth(u, bearer=True), "json": {"message": "show my budget summary"},
+    }),
+    "convert": ("fastapi", "POST", lambda u: "/api/convert", lambda u, r: {
+        "headers": _auth(u, bearer=True), "json": {"from": "USD", "to": "INR", "amount": r.randint(1, 500)},
+    }),
+    "symbols": ("fastapi", "GET", lambda u: "/api/symbols", lambda u, r: {}),
+}
+
+
+def drive(stack, name, uids, requests_count, concurrency):
+    import requests
+
+    app, method, path_fn, kwargs_fn = ENDPOINTS[name]
+    base = stack.flask_url if app == "flask" else stack.fastapi_url
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        rng = random.Random(i)
+        uid = uids[i % len(uids)]
+        start = time.perf_counter()
+        resp = session.request(method, base + path_fn(uid), timeout=30, **kwargs_fn(uid, rng))
+        return time.perf_counter() - start, resp.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - started
+
+    latencies = [r[0] for r in results]
+    errors = sum(1 for r in results if r[1] >= 400)
+    return {
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": requests_count / wall if wall else 0.0,
+        **latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=env.DEFAULT_MONGO, help='"mongomock" or a mongodb:// URI')
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    stack = env.boot(mongo=args.mongo)
+    try:
+        uids = seed.user_ids(args.users) if args.no_seed else seed.seed(args.users)
+        names = args.only or list(ENDPOINTS)
+
+        results = {}
+        for name in names:
+            results[name] = drive(stack, name, uids, args.requests, args.concurrency)
+            r = results[name]
+            print(f"{name:22s} {r['throughput_rps']:9.1f} rps  p50 {r['p50_ms']:7.2f}  "
+                  f"p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+    finally:
+        stack.stop()
+
+    path = save_results("load", {"config": vars(args), "endpoints": results})
+    print(f"\nsaved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench/micro.py
+"""
+Microbenchmarks for the pure-Python calculators.
+
+    python bench/micro.py [--repeat 5]
+
+Each case reports the best-of-N time per call; results are saved to
+bench/results/micro-<git sha>-<timestamp>.json.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loan_calculator  # noqa: E402
+import tax_estimator  # noqa: E402
+from bench.report import save_results  # noqa: E402
+
+# Yearly resets on a 30-year floating-rate loan
+FLOATING_RESETS = [(12 * i + 1, 8.0 + (i % 5) * 0.5) for i in range(1, 30)]
+
+CASES = {
+    "calculate_loan_emi": lambda: loan_calculator.calculate_loan_emi(500000, 8.5, years=20),
+    "schedule_20y": lambda: loan_calculator.generate_amortization_schedule(500000, 8.5, years=20),
+    "schedule_30y_prepay": lambda: loan_calculator.generate_amortization_schedule(
+        5_000_000, 8.9, years=30, extra_monthly=5000, lump_sum=200000, lump_sum_month=36
+    ),
+    "variable_30y_29_resets": lambda: loan_calculator.generate_variable_rate_schedule(
+        5_000_000, 8.5, FLOATING_RESETS, years=30
+    ),
+    "variable_30y_29_resets_tenure": lambda: loan_calculator.generate_variable_rate_schedule(
+        5_000_000, 8.5, FLOATING_RESETS, years=30, policy=loan_calculator.TENURE_POLICY
+    ),
+    "variable_30y_29_resets_rows": lambda: list(loan_calculator.generate_variable_rate_schedule(
+        5_000_000, 8.5, FLOATING_RESETS, years=30
+    ).schedule),
+    "compare_loans_x5": lambda: loan_calculator.compare_loans([
+        {"loan_amount": 500000 + i * 100000, "annual_rate": 8 + i * 0.25, "years": 15 + i}
+        for i in range(5)
+    ]),
+    "tax_india_x1000": lambda: [tax_estimator.calculate_tax_india(i * 2000) for i in range(1000)],
+    "tax_us_x1000": lambda: [tax_estimator.calculate_tax_us(i * 150) for i in range(1000)],
+    "tax_australia_x1000": lambda: [tax_estimator.calculate_tax_australia(i * 200) for i in range(1000)],
+}
+
+
+def bench(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or list(CASES):
+        seconds = bench(CASES[name], args.repeat)
+        results[name] = {"us_per_call": seconds * 1e6}
+        print(f"{name:24s} {seconds * 1e6:12.2f} us")
+
+    path = save_results("micro", {"cases": results})
+    print(f"\nsaved {path}")
+
+
+if __name__ == "__main__":
+    main()
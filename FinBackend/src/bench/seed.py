@@ -0,0 +1,131 @@
+# bench/seed.py
+"""
+Seed realistic per-user data volumes straight into the bench database.
+
+Defaults model an active user after ~2 years of use: 1,500 expenses,
+150 tasks, 60 notes, 8 goals, a budget with category limits and a few
+hundred currency conversions.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Bills", "Health", "Entertainment", "Travel"]
+PAYMENT_MODES = ["UPI", "Card", "Cash", "Net Banking"]
+CURRENCIES = ["₹", "$", "€"]
+PRIORITIES = ["Low", "Medium", "High"]
+
+DEFAULT_VOLUMES = {
+    "expenses": 1500,
+    "tasks": 150,
+    "notes": 60,
+    "goals": 8,
+    "conversions": 300,
+}
+
+
+def user_ids(count):
+    return [f"bench-user-{i:05d}" for i in range(count)]
+
+
+def _expenses(uid, n, rng, today):
+    for _ in range(n):
+        day = today - timedelta(days=rng.randint(0, 730))
+        yield {
+            "user_id": uid,
+            "date": day.strftime("%Y-%m-%d"),
+            "category": rng.choice(CATEGORIES),
+            "description": rng.choice(["coffee", "groceries", "uber", "netflix", "rent", "pharmacy", "dinner"]),
+            "amount": round(rng.uniform(2, 900), 2),
+            "payment_mode": rng.choice(PAYMENT_MODES),
+            "currency": rng.choice(CURRENCIES),
+            "bill_filename": None,
+        }
+
+
+def _tasks(uid, n, rng, today):
+    for i in range(n):
+        day = today + timedelta(days=rng.randint(-60, 60))
+        deadline = (day + timedelta(days=rng.randint(0, 14))).replace(hour=0, minute=0, second=0, microsecond=0)
+        stamp = (datetime.utcnow() - timedelta(minutes=i)).isoformat()
+        yield {
+            "user_id": uid,
+            "title": f"Task {i}",
+            "description": "",
+            "date": day.strftime("%Y-%m-%d"),
+            "deadline": deadline.strftime("%Y-%m-%d"),
+            "deadline_at": deadline,
+            "priority": rng.choice(PRIORITIES),
+            "urgent": rng.random() < 0.15,
+            "category": "General",
+            "completed": rng.random() < 0.5,
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+
+
+def _notes(uid, n, rng):
+    for i in range(n):
+        stamp = datetime.utcnow() - timedelta(hours=i)
+        yield {
+            "uid": uid,
+            "content": "Lorem ipsum dolor sit amet. " * rng.randint(1, 40),
+            "createdAt": stamp,
+            "updatedAt": stamp,
+        }
+
+
+def _goals(uid, n, rng, today):
+    for i in range(n):
+        yield {
+            "user_id": uid,
+            "name": f"Goal {i}",
+            "targetAmount": rng.randint(5_000, 500_000),
+            "deadline": (today + timedelta(days=rng.randint(30, 900))).strftime("%Y-%m-%d"),
+            "priority": rng.choice(PRIORITIES),
+            "status": "Pending",
+        }
+
+
+def _conversions(uid, n, rng):
+    for _ in range(n):
+        yield {
+            "user_id": uid,
+            "from": "USD",
+            "to": "INR",
+            "amount": rng.uniform(1, 500),
+            "result": 0.0,
+            "rate": 83.2,
+            "date": datetime.utcnow(),
+        }
+
+
+def seed(users, volumes=None, seed_value=42, legacy_expenses=False):
+    """
+    Drop and re-create the bench collections for `users` users.
+    Expenses use the compact schema unless `legacy_expenses` (for the migrator bench).
+    """
+    import db
+    from expense_schema import to_compact
+
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    rng = random.Random(seed_value)
+    today = datetime.utcnow()
+
+    for name in ("expenses", "tasks", "notes", "goals", "budget", "currency", "users"):
+        db.db.drop_collection(name)
+
+    uids = user_ids(users)
+    for uid in uids:
+        expenses = _expenses(uid, volumes["expenses"], rng, today)
+        db.expense_collection.insert_many(list(expenses if legacy_expenses else map(to_compact, expenses)))
+        db.tasks_collection.insert_many(list(_tasks(uid, volumes["tasks"], rng, today)))
+        db.notes_collection.insert_many(list(_notes(uid, volumes["notes"], rng)))
+        db.goals_collection.insert_many(list(_goals(uid, volumes["goals"], rng, today)))
+        db.currency_collection.insert_many(list(_conversions(uid, volumes["conversions"], rng)))
+        db.budget_collection.insert_one({
+            "user_id": uid,
+            "total_budget": 50_000.0,
+            "category_budgets": {c: float(rng.randint(2_000, 15_000)) for c in CATEGORIES},
+        })
+    return uids
@@ -0,0 +1,211 @@
+# budget_alerts.py
+"""
+Incremental category-budget alerts.
+
+Every expense write calls `record_spend(user_id, category, delta)`, which
+keeps a running `category_spent.<category>` total on the user's budget
+document (one $inc) and compares it with `category_budgets.<category>`.
+A budget set before these totals existed has none yet; the first write
+to that category seeds it from the expenses instead of counting from 0.
+Thresholds crossed by that write are stored in `budget_alerts` and pushed
+to the user's open SSE streams in this process; streams in other workers
+pick them up from the collection on their next poll.
+
+Each alert carries a per-user `seq` taken from a server-side $inc
+counter, which the streams use as their cursor. ObjectIds from different
+processes only order to the second, so an `_id` cursor could skip an
+alert another worker inserted later within the same second.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from db import alerts_collection, budget_collection, counters_collection, expense_collection, register_index
+from expense_schema import BASE_AMOUNT_EXPR, category_filter
+
+THRESHOLDS = tuple(sorted(
+    float(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "0.9,1.0").split(",") if t.strip()
+))
+
+# Replaces (user_id, _id), which can be dropped
+register_index(
+    "budget_alerts",
+    [("user_id", 1), ("seq", 1)],
+    unique=True,
+    partialFilterExpression={"seq": {"$exists": True}},
+)
+
+
+# -------------------------------
+# In-process fan-out to SSE streams
+# -------------------------------
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(user_id):
+    event = threading.Event()
+    with _subscribers_lock:
+        _subscribers.setdefault(user_id, set()).add(event)
+    return event
+
+
+def unsubscribe(user_id, event):
+    with _subscribers_lock:
+        events = _subscribers.get(user_id)
+        if events:
+            events.discard(event)
+            if not events:
+                del _subscribers[user_id]
+
+
+def _notify(user_id):
+    with _subscribers_lock:
+        events = list(_subscribers.get(user_id, ()))
+    for event in events:
+        event.set()
+
+
+# -------------------------------
+# Threshold evaluation
+# -------------------------------
+def crossed_thresholds(before, after, limit):
+    if not limit or limit <= 0 or after <= before:
+        return []
+    return [t for t in THRESHOLDS if before < t * limit <= after]
+
+
+def alert_message(category, threshold, spent, limit):
+    if threshold >= 1.0:
+        return f"🚨 {category} budget exceeded ({spent}/{limit})"
+    return f"⚠️ {category} budget {int(threshold * 100)}% used ({spent}/{limit})"
+
+
+def record_spend(user_id, category, delta):
+    """
+    Apply an expense write (already stored) to the running category total
+    and raise any newly crossed alerts. Users without a budget document
+    are skipped.
+    """
+    if not user_id or not category or not delta:
+        return []
+
+    spent, budgeted = f"category_spent.{category}", f"category_budgets.{category}"
+    projection = {budgeted: 1, spent: 1}
+    # Only $inc a total that exists, or one no budget depends on yet
+    # (add_category_budget reseeds it when the budget is set)
+    doc = budget_collection.find_one_and_update(
+        {"user_id": user_id, "$or": [{spent: {"$exists": True}}, {budgeted: {"$exists": False}}]},
+        {"$inc": {spent: delta}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc:
+        after = doc.get("category_spent", {}).get(category, 0)
+        before = after - delta
+    else:
+        doc = _seed_spent(user_id, category, projection)
+        if not doc:
+            return []
+        after = doc["category_spent"][category]  # includes this write
+        before = after - delta
+
+    limit = (doc.get("category_budgets") or {}).get(category)
+
+    now = datetime.utcnow()
+    alerts = [
+        {
+            "user_id": user_id,
+            "category": category,
+            "threshold": t,
+            "spent": round(after, 2),
+            "limit": limit,
+            "message": alert_message(category, t, round(after, 2), limit),
+            "acknowledged": False,
+            "created_at": now,
+        }
+        for t in crossed_thresholds(before, after, limit)
+    ]
+    if alerts:
+        for alert, seq in zip(alerts, _next_seqs(user_id, len(alerts))):
+            alert["seq"] = seq
+        alerts_collection.insert_many(alerts)
+        _notify(user_id)
+    return alerts
+
+
+def _seed_spent(user_id, category, projection):
+    """
+    Set a budgeted category's missing running total from its expenses.
+    None if the user has no budget document, or a concurrent write
+    seeded it first (that seed already counts this write).
+    """
+    spent = f"category_spent.{category}"
+    if not budget_collection.find_one({"user_id": user_id}, {"_id": 1}):
+        return None
+    return budget_collection.find_one_and_update(
+        {"user_id": user_id, spent: {"$exists": False}},
+        {"$set": {spent: category_spent_total(user_id, category)}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def reset_spent(user_ids):
+    """Drop running totals after expenses were re-normalized; record_spend reseeds them."""
+    if user_ids:
+        budget_collection.update_many({"user_id": {"$in": list(user_ids)}}, {"$unset": {"category_spent": ""}})
+
+
+def category_spent_total(user_id, category):
+    """Exact spend for one category (used to seed the running total)."""
+    result = next(expense_collection.aggregate([
+        {"$match": {"user_id": user_id, **category_filter(category)}},
+        {"$group": {"_id": None, "total": {"$sum": BASE_AMOUNT_EXPR}}},
+    ]), None)
+    return result["total"] if result else 0
+
+
+def _next_seqs(user_id, count):
+    doc = counters_collection.find_one_and_update(
+        {"_id": f"budget_alerts:{user_id}"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return range(doc["seq"] - count + 1, doc["seq"] + 1)
+
+
+def latest_seq(user_id):
+    """Highest stored alert seq for the user (0 if none)."""
+    doc = alerts_collection.find_one(
+        {"user_id": user_id, "seq": {"$exists": True}}, {"seq": 1}, sort=[("seq", -1)]
+    )
+    return doc["seq"] if doc else 0
+
+
+def alerts_after(user_id, last_seq=None, limit=50):
+    """Alerts after `last_seq` in seq order, or the unacknowledged ones when it is None."""
+    query = {"user_id": user_id}
+    if last_seq is not None:
+        query["seq"] = {"$gt": last_seq}
+    else:
+        query["acknowledged"] = False
+    return list(alerts_collection.find(query).sort("seq", 1).limit(limit))
+
+
+def contiguous(alerts, last_seq):
+    """
+    The leading alerts that follow `last_seq` with no gap. A gap is a seq
+    another worker has taken but not inserted yet; streaming past it
+    would skip that alert.
+    """
+    ready = []
+    for alert in alerts:
+        if alert["seq"] != last_seq + len(ready) + 1:
+            break
+        ready.append(alert)
+    return ready
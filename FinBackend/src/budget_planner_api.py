@@ -1,17 +1,46 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from firebase_admin_setup import verify_token
 from bson import ObjectId
+from versions import bump_version, current_etag, not_modified, with_etag
+from db_budget import db_budget
+import budget_alerts
+from expense_tracker_api import expense_totals
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
 
 from db import (
     users_collection,
     budget_collection,
-    expense_collection
+    alerts_collection,
+    stream_tickets_collection,
+    register_index,
 )
 
 budget_api = Blueprint('budget_api', __name__)
 CORS(budget_api)
 
+# SSE: how long to wait for an in-process push before re-checking the
+# alerts collection (covers other workers), and when to end the stream
+# so the client reconnects with Last-Event-ID.
+ALERT_POLL_SECONDS = float(os.getenv("ALERT_STREAM_POLL_SECONDS", 5))
+ALERT_STREAM_MAX_SECONDS = float(os.getenv("ALERT_STREAM_MAX_SECONDS", 300))
+# Each open stream holds one gunicorn thread (gunicorn.conf.py), so at
+# most this many per process; the rest of the threads stay for requests.
+ALERT_STREAM_MAX_OPEN = int(os.getenv("ALERT_STREAM_MAX_OPEN", 16))
+ALERT_STREAM_TICKET_SECONDS = int(os.getenv("ALERT_STREAM_TICKET_SECONDS", 60))
+# How long a stream waits on a missing seq before skipping it (the worker
+# that took it died before inserting the alert)
+ALERT_STREAM_GAP_SECONDS = float(os.getenv("ALERT_STREAM_GAP_SECONDS", 10))
+
+_open_streams = threading.BoundedSemaphore(ALERT_STREAM_MAX_OPEN)
+
+register_index("stream_tickets", [("expires_at", 1)], expireAfterSeconds=0)
+
 
 #GET USER ID (Firebase Auth) 
 def get_user_id():
@@ -26,6 +55,7 @@ def get_user_id():
 
 #SET TOTAL BUDGET
 @budget_api.route('/set_total_budget', methods=['POST'])
+@db_budget(round_trips=2)
 def set_total_budget():
     user_id = get_user_id()
     if not user_id:
@@ -40,12 +70,14 @@ def set_total_budget():
         {"$set": {"total_budget": float(total)}},
         upsert=True
     )
+    bump_version(user_id, "budget")
 
     return jsonify({"message": "Total budget saved successfully!"}), 200
 
 
 # ADD CATEGORY BUDGET 
 @budget_api.route('/add_category_budget', methods=['POST'])
+@db_budget(round_trips=3)
 def add_category_budget():
     user_id = get_user_id()
     if not user_id:
@@ -55,45 +87,47 @@ def add_category_budget():
     category = data.get("category")
     amount = float(data.get("amount"))
 
-    # Store category budget inside array
+    # Store category budget inside array, and (re)seed the running total
+    # that add_expense / delete_expense keep up to date for alerts
     budget_collection.update_one(
         {"user_id": user_id},
-        {"$set": {f"category_budgets.{category}": amount}},
+        {"$set": {
+            f"category_budgets.{category}": amount,
+            f"category_spent.{category}": budget_alerts.category_spent_total(user_id, category),
+        }},
         upsert=True
     )
+    bump_version(user_id, "budget")
 
     return jsonify({"message": "Category budget saved successfully!"}), 200
 
 
 # BUDGET SUMMARY 
 @budget_api.route('/get_budget_summary', methods=['GET'])
+@db_budget(round_trips=3)  # ETag, budget document, expense totals
 def get_budget_summary():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"message": "Unauthorized"}), 401
 
+    etag = current_etag(user_id, "budget", "expenses", scope="budget_summary")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     #FETCH USER'S BUDGET
     budget_doc = budget_collection.find_one({"user_id": user_id})
 
-    total_budget = budget_doc.get("total_budget", 0) if budget_doc else 0
-    category_budgets = budget_doc.get("category_budgets", {}) if budget_doc else {}
+    summary = build_budget_summary(budget_doc, expense_totals(user_id))
+    return with_etag(jsonify(summary), etag), 200
 
-    # CATEGORY-WISE EXPENSES
-    pipeline_cat = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}}
-    ]
-    results = list(expense_collection.aggregate(pipeline_cat))
 
-    category_expenses = {r["_id"]: r["total"] for r in results}
+def build_budget_summary(budget_doc, totals):
+    total_budget = budget_doc.get("total_budget", 0) if budget_doc else 0
+    category_budgets = budget_doc.get("category_budgets", {}) if budget_doc else {}
 
-    #TOTAL EXPENSES
-    pipeline_total = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    total_result = list(expense_collection.aggregate(pipeline_total))
-    total_spent = total_result[0]["total"] if total_result else 0
+    # TOTAL + CATEGORY-WISE EXPENSES
+    total_spent, category_expenses, unconverted = totals
 
     remaining = total_budget - total_spent
 
@@ -104,13 +138,158 @@ def get_budget_summary():
         if spent >= 0.9 * limit:
             warnings.append(f"⚠️ {cat} budget nearly used ({spent}/{limit})")
 
-    summary = {
+    return {
         "total_budget": total_budget,
         "total_spent": total_spent,
         "remaining": remaining,
         "category_budgets": category_budgets,
         "category_expenses": category_expenses,
+        "unconverted_expenses": unconverted,
         "warnings": warnings
     }
 
-    return jsonify(summary), 200
+
+# BUDGET ALERTS
+def serialize_alert(a):
+    return {
+        "id": str(a["_id"]),
+        "category": a.get("category"),
+        "threshold": a.get("threshold"),
+        "spent": a.get("spent"),
+        "limit": a.get("limit"),
+        "message": a.get("message"),
+        "acknowledged": a.get("acknowledged", False),
+        "created_at": a["created_at"].isoformat() if a.get("created_at") else None,
+    }
+
+
+@budget_api.route('/alerts', methods=['GET'])
+@db_budget(round_trips=1)
+def get_alerts():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    alerts = budget_alerts.alerts_after(user_id)
+    return jsonify({"alerts": [serialize_alert(a) for a in alerts]}), 200
+
+
+@budget_api.route('/alerts/ack', methods=['POST'])
+@db_budget(round_trips=1)
+def acknowledge_alerts():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    ids = (request.get_json() or {}).get("ids") or []
+    try:
+        object_ids = [ObjectId(i) for i in ids]
+    except Exception:
+        return jsonify({"message": "Invalid alert id"}), 400
+
+    result = alerts_collection.update_many(
+        {"_id": {"$in": object_ids}, "user_id": user_id},
+        {"$set": {"acknowledged": True}}
+    )
+    return jsonify({"acknowledged": result.modified_count}), 200
+
+
+# BUDGET ALERT STREAM (Server-Sent Events)
+# EventSource can't send headers, so browsers first POST for a ticket and
+# open /alerts/stream?ticket=...: the URL (and so the access log) holds a
+# random id valid for ALERT_STREAM_TICKET_SECONDS, never the Firebase
+# token. Reconnects within that window reuse it; after that the client
+# asks for a new one.
+@budget_api.route('/alerts/stream_ticket', methods=['POST'])
+@db_budget(round_trips=1)
+def create_stream_ticket():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    ticket = secrets.token_urlsafe(24)
+    stream_tickets_collection.insert_one({
+        "_id": ticket,
+        "user_id": user_id,
+        "expires_at": datetime.utcnow() + timedelta(seconds=ALERT_STREAM_TICKET_SECONDS),
+    })
+    return jsonify({"ticket": ticket, "expires_in": ALERT_STREAM_TICKET_SECONDS}), 201
+
+
+def stream_user_id():
+    if request.headers.get("Authorization"):
+        return get_user_id()
+    ticket = request.args.get("ticket")
+    if not ticket:
+        return None
+    # The TTL index removes expired tickets lazily, so check expiry here too
+    doc = stream_tickets_collection.find_one({"_id": ticket, "expires_at": {"$gt": datetime.utcnow()}})
+    return doc["user_id"] if doc else None
+
+
+@budget_api.route('/alerts/stream', methods=['GET'])
+@db_budget(round_trips=1)  # the ticket; the polls run in the stream body
+def stream_alerts():
+    user_id = stream_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    if not _open_streams.acquire(blocking=False):
+        response = jsonify({"message": "Too many open alert streams, retry shortly"})
+        response.headers["Retry-After"] = "10"
+        return response, 503
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_seq = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_seq = None  # e.g. an ObjectId from before alerts had a seq
+
+    def event(alert):
+        payload = json.dumps(serialize_alert(alert))
+        if alert.get("seq") is None:  # stored before alerts had a seq
+            return f"event: budget_alert\ndata: {payload}\n\n"
+        return f"id: {alert['seq']}\nevent: budget_alert\ndata: {payload}\n\n"
+
+    def events():
+        nonlocal last_seq
+        wakeup = budget_alerts.subscribe(user_id)
+        deadline = time.monotonic() + ALERT_STREAM_MAX_SECONDS
+        gap_since = None
+        try:
+            yield "retry: 3000\n\n"
+            if last_seq is None:
+                # Pending (unacknowledged) alerts up to the newest stored one,
+                # then only what comes after it
+                last_seq = budget_alerts.latest_seq(user_id)
+                for alert in budget_alerts.alerts_after(user_id):
+                    if alert.get("seq", 0) <= last_seq:
+                        yield event(alert)
+
+            while time.monotonic() < deadline:
+                wakeup.clear()
+                alerts = budget_alerts.alerts_after(user_id, last_seq)
+                ready = budget_alerts.contiguous(alerts, last_seq)
+                if len(ready) < len(alerts):
+                    gap_since = gap_since or time.monotonic()
+                    if time.monotonic() - gap_since >= ALERT_STREAM_GAP_SECONDS:
+                        ready, gap_since = alerts, None
+                else:
+                    gap_since = None
+                for alert in ready:
+                    last_seq = alert["seq"]
+                    yield event(alert)
+
+                if not wakeup.wait(ALERT_POLL_SECONDS):
+                    yield ": keep-alive\n\n"
+        finally:
+            budget_alerts.unsubscribe(user_id, wakeup)
+
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Runs when the server closes the response, whether or not the body started
+    response.call_on_close(_open_streams.release)
+    return response
@@ -2,18 +2,42 @@ from fastapi import FastAPI, HTTPException, Request
 from typing import Dict, Any
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import logging
+import os
+import time
 
 # Firebase + MongoDB
 
 from firebase_admin_setup import verify_token
 from db import currency_collection   # create this collection in db.py
+import metrics
+import rate_table
+import rate_history
+import rate_limit
+import resilience
+import profiler
+import db_budget
+from write_behind import WriteBehindQueue
+from json_provider import dumps_bytes
+
+metrics.install_mongo_metrics()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("currency_api")
 
-app = FastAPI(title="NexWise Currency API (exchangerate-api.com)")
+class BSONJSONResponse(JSONResponse):
+    """JSON responses through the same orjson encoder as the Flask app."""
+
+    def render(self, content):
+        return dumps_bytes(content)
+
+
+app = FastAPI(
+    title="NexWise Currency API (exchangerate-api.com)",
+    default_response_class=BSONJSONResponse,
+)
 
 # CORS so your React app at localhost:3000 can call this
 app.add_middleware(
@@ -24,8 +48,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-EXCHANGE_API_BASE = "https://api.exchangerate-api.com/v4/latest"
-REQUEST_TIMEOUT = 8  # seconds
+# Request deadlines + 503 when an upstream's circuit breaker is open
+resilience.init_fastapi_resilience(app)
+
+# Per-request MongoDB round trips vs each route's @db_budget (inside the rate limiter: its bucket isn't the route's)
+db_budget.init_fastapi_db_budgets(app, app_name="currency_api")
+
+# Token-bucket limits on /api/convert (added before metrics so 429s are still timed)
+rate_limit.init_fastapi_rate_limits(app)
+
+# Per-route latency histograms + /metrics
+metrics.init_fastapi_metrics(app, app_name="currency_api")
+
+# Opt-in request profiling; profiles are listed by the Flask app's /api/admin/profiles
+profiler.init_fastapi_profiling(app, app_name="currency_api")
+
+# Conversion history is written behind the response in batches
+history_queue = WriteBehindQueue(
+    "currency_history",
+    currency_collection,
+    max_size=int(os.getenv("CONVERT_HISTORY_QUEUE_SIZE", 10000)),
+    batch_size=int(os.getenv("CONVERT_HISTORY_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("CONVERT_HISTORY_FLUSH_SECONDS", 1.0)),
+    policy=os.getenv("CONVERT_HISTORY_POLICY", "drop"),
+)
+
+
+@app.on_event("shutdown")
+def flush_history():
+    history_queue.close()
 
 # Helper: get Firebase user ID from Authorization header
 
@@ -42,6 +93,7 @@ def get_user_id(request: Request):
 # /api/convert endpoint (with optional user tracking)
 
 @app.post("/api/convert")
+@db_budget.db_budget(round_trips=0)
 async def convert(payload: Dict[str, Any], request: Request):
     from_code = payload.get("from") or payload.get("from_currency") or payload.get("from_")
     to_code = payload.get("to")
@@ -61,24 +113,36 @@ async def convert(payload: Dict[str, Any], request: Request):
     from_code = from_code.upper()
     to_code = to_code.upper()
 
-    try:
-        resp = requests.get(
-            f"{EXCHANGE_API_BASE}/{from_code}",
-            timeout=REQUEST_TIMEOUT,
-        )
-        data = resp.json()
-    except Exception as e:
-        logger.exception("Error calling exchangerate-api.com")
-        raise HTTPException(status_code=502, detail=f"External API request failed: {e}")
-
-    rates = data.get("rates") or {}
-    if to_code not in rates:
+    on_date = payload.get("date")
+    if on_date:
+        # Historical conversion from the local daily snapshots (see rate_history.py)
+        try:
+            day = rate_history.parse_day(on_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date (expected YYYY-MM-DD)")
+        table = rate_history.table_on(day)
+        if table is None:
+            raise HTTPException(status_code=404, detail=f"No exchange rates recorded for {day.isoformat()}")
+    else:
+        # Shared, locally cached USD table (see rate_table.py); refreshed when stale.
+        # Off the event loop: a refresh may wait on the upstream.
+        table = await run_in_threadpool(rate_table.get_table)
+        if table is None:
+            raise HTTPException(status_code=502, detail="External API request failed: no exchange rates available")
+
+    rate = rate_table.cross_rate(from_code, to_code, table)
+    if rate is None:
         raise HTTPException(
             status_code=502,
-            detail=f"Missing rate for {to_code}. Raw: {str(data)[:300]}",
+            detail=f"Missing rate for {from_code} -> {to_code}",
         )
 
-    rate = float(rates[to_code])
+    pivot = table["rates"].get(from_code, 1.0)
+    data = {
+        "base": from_code,
+        "date": table.get("date"),
+        "rates": {code: value / pivot for code, value in table["rates"].items()},
+    }
     result = rate * amt
     response = {
         "success": True,
@@ -89,12 +153,17 @@ async def convert(payload: Dict[str, Any], request: Request):
         "date": data.get("date") or datetime.utcnow().isoformat(),
         "raw": data,
     }
+    if not on_date and time.time() - table.get("fetched_at", 0) > rate_table.TTL_SECONDS:
+        response["stale"] = True  # last known rates while the upstream is unavailable
 
 
-    # Store conversion in MongoDB for this user
-    user_id = get_user_id(request)
+    # Store conversion in MongoDB for this user (batched, off the request path)
+    try:
+        user_id = await run_in_threadpool(get_user_id, request)
+    except resilience.DependencyUnavailable:
+        user_id = None  # history is best effort; the conversion itself still succeeds
     if user_id:
-        currency_collection.insert_one({
+        record = {
             "user_id": user_id,
             "from": from_code,
             "to": to_code,
@@ -102,13 +171,18 @@ async def convert(payload: Dict[str, Any], request: Request):
             "result": result,
             "rate": rate,
             "date": datetime.utcnow(),
-        })
+        }
+        if history_queue.policy == "block":
+            await run_in_threadpool(history_queue.put, record)
+        else:
+            history_queue.put(record)
 
     return response
 
 # /api/symbols endpoint
 
 @app.get("/api/symbols")
+@db_budget.db_budget(round_trips=0)
 def get_symbols():
     symbols = {
         "USD": {"description": "United States Dollar", "code": "USD"},
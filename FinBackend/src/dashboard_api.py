@@ -0,0 +1,108 @@
+from flask import Blueprint, request, jsonify
+from firebase_admin_setup import verify_token
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from db import budget_collection
+from expense_tracker_api import expense_totals, build_summary, get_base_currency
+from budget_planner_api import build_budget_summary
+from saving_goals_api import list_goals
+from todo_api import list_tasks
+from notes_api import latest_note
+from quotes_api import daily_quote
+import resilience
+from db_budget import db_budget
+
+logger = logging.getLogger("dashboard_api")
+
+dashboard_api = Blueprint("dashboard_api", __name__)
+
+# Shared by all requests of a worker process, so concurrent dashboards
+# can't open more than this many extra Mongo connections
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", 8))
+DASHBOARD_TIMEOUT_SECONDS = float(os.getenv("DASHBOARD_TIMEOUT_SECONDS", 10))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Executor threads don't survive fork: one pool per worker process
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def submit(fn, *args):
+    # Run in a copy of the request's context (metrics / request-scoped contextvars)
+    return get_pool().submit(contextvars.copy_context().run, fn, *args)
+
+
+# -------------------------------
+# Get Firebase User ID
+# -------------------------------
+def get_user_id():
+    token = request.headers.get("Authorization")
+    if not token:
+        return None
+    decoded = verify_token(token.replace("Bearer ", ""))
+    if not decoded:
+        return None
+    return decoded.get("uid")
+
+
+# -------------------------------
+# Home screen: every widget in one request
+# -------------------------------
+@dashboard_api.route("", methods=["GET"])
+@db_budget(round_trips=6)  # one per widget read below
+def get_dashboard():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Only independent reads go to the pool; anything derived from them
+    # (both summaries share one expense aggregation) is built here.
+    futures = {
+        "totals": submit(expense_totals, user_id),
+        "base_currency": submit(get_base_currency, user_id),
+        "budget_doc": submit(budget_collection.find_one, {"user_id": user_id}),
+        "goals": submit(list_goals, user_id),
+        "tasks": submit(list_tasks, user_id),
+        "latest_note": submit(latest_note, user_id),
+    }
+
+    deadline = time.monotonic() + resilience.timeout_for(DASHBOARD_TIMEOUT_SECONDS)
+    results, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            future.cancel()
+            errors[name] = "timeout"
+        except Exception:
+            logger.exception("Dashboard widget %s failed", name)
+            errors[name] = "failed"
+
+    totals = results.get("totals")
+    payload = {
+        "summary": build_summary(totals, results.get("base_currency")) if totals else None,
+        "budget_summary": build_budget_summary(results.get("budget_doc"), totals)
+        if totals and "budget_doc" in results else None,
+        "goals": results.get("goals"),
+        "tasks": results.get("tasks"),
+        "latest_note": results.get("latest_note") or {},
+        "quote": daily_quote(),
+    }
+    if errors:
+        payload["errors"] = errors
+    return jsonify(payload), 200
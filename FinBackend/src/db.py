@@ -1,31 +1,280 @@
 import os
-from pymongo import MongoClient
+import logging
+import threading
+import time
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Get the MongoDB URI from the .env file
+logger = logging.getLogger("db")
+
+# Get the MongoDB URI from the .env file. It is only required once a
+# client is built, so a STORAGE_BACKEND=sqlite install (repository.py)
+# boots and serves the repository-backed routes without it.
 MONGO_URI = os.getenv("MONGO_URI")
 
-if not MONGO_URI:
-    raise ValueError("❌ MONGO_URI is missing! Add it to your .env file.")
+DB_NAME = os.getenv("MONGO_DB_NAME", "finbuddy")
+
+
+# -----------------------------
+# Client options (from .env)
+# -----------------------------
+def _env_int(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def client_options():
+    """
+    PyMongo keyword options built from the environment.
+    Anything not set falls back to the driver default.
+    """
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "appname": os.getenv("MONGO_APP_NAME", "nexwise"),
+    }
+
+    compressors = os.getenv("MONGO_COMPRESSORS")  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        options["compressors"] = compressors
+
+    return {k: v for k, v in options.items() if v is not None}
+
+
+# -----------------------------
+# Connection pool metrics (CMAP events)
+# -----------------------------
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts pool checkouts, checkout wait time and connections in use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._started.clear()
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checked_in = 0
+            self.in_use = 0
+            self.open_connections = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checked_in": self.checked_in,
+                "in_use": self.in_use,
+                "open_connections": self.open_connections,
+                "wait_time_total_seconds": self.wait_time_total,
+                "wait_time_max_seconds": self.wait_time_max,
+            }
+
+    # Checkout wait is measured per thread, from "started" to "checked out"
+    def connection_check_out_started(self, event):
+        self._started[threading.get_ident()] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = self._started.pop(threading.get_ident(), None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def connection_check_out_failed(self, event):
+        self._started.pop(threading.get_ident(), None)
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_in += 1
+            self.in_use = max(self.in_use - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_metrics = PoolMetrics()
+
+# Extra listeners (e.g. command monitoring) registered before the first client is built
+_event_listeners = [pool_metrics]
+
+
+def add_event_listener(listener):
+    _event_listeners.append(listener)
+
+
+# -----------------------------
+# Per-process client factory
+# -----------------------------
+# A MongoClient must not be shared across fork (gunicorn --preload),
+# so every process lazily builds its own on first use.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            if not MONGO_URI:
+                raise ValueError("❌ MONGO_URI is missing! Add it to your .env file.")
+            _client = MongoClient(
+                MONGO_URI,
+                event_listeners=list(_event_listeners),
+                **client_options(),
+            )
+            _client_pid = pid
+            _ensure_indexes(_client[DB_NAME])
+    return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def _reset_after_fork():
+    # Drop the parent's client without closing it (its sockets belong to the parent)
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    pool_metrics.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# -----------------------------
+# Indexes
+# -----------------------------
+# Modules declare the indexes their queries rely on; they are created
+# (idempotently) once per process when its client is built.
+_index_specs = []
+
+
+def register_index(collection_name, keys, **kwargs):
+    _index_specs.append((collection_name, keys, kwargs))
+    if _client is not None and _client_pid == os.getpid():
+        _ensure_indexes(_client[DB_NAME], [_index_specs[-1]])
+
+
+def _ensure_indexes(database, specs=None):
+    if os.getenv("MONGO_ENSURE_INDEXES", "1") != "1":
+        return
+    for collection_name, keys, kwargs in (_index_specs if specs is None else specs):
+        try:
+            database[collection_name].create_index(keys, **kwargs)
+        except Exception:
+            logger.exception("Could not create index %s on %s", keys, collection_name)
+
+
+def close_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def pool_stats():
+    return pool_metrics.snapshot()
+
+
+class _LazyHandle:
+    """
+    Stand-in for a Database / Collection that resolves against the
+    current process's client on every attribute access.
+    """
+
+    def __init__(self, collection_name=None):
+        self._collection_name = collection_name
+
+    def _resolve(self):
+        database = get_db()
+        if self._collection_name is None:
+            return database
+        return database[self._collection_name]
+
+    def __getattr__(self, item):
+        return getattr(self._resolve(), item)
+
+    def __getitem__(self, item):
+        return self._resolve()[item]
+
+    def __repr__(self):
+        return f"<lazy {self._collection_name or DB_NAME}>"
+
+
+def lazy_collection(name):
+    return _LazyHandle(name)
 
-# Create a single global MongoDB client
-client = MongoClient(MONGO_URI)
 
 # Select your database
-db = client["finbuddy"]
+db = _LazyHandle()
 
 # Define collections (you can add more later)
-users_collection = db["users"]
-budget_collection = db["budget"]
-expense_collection = db["expenses"]
-goals_collection = db["goals"]
-loan_collection = db["loans"]
-tax_collection = db["tax"]
-category_collection = db["categories"]
-currency_collection = db["currency"]
-tasks_collection = db["tasks"]
-notes_collection = db["notes"]
-quotes_collection = db["quotes"]
+users_collection = lazy_collection("users")
+budget_collection = lazy_collection("budget")
+expense_collection = lazy_collection("expenses")
+goals_collection = lazy_collection("goals")
+loan_collection = lazy_collection("loans")
+tax_collection = lazy_collection("tax")
+category_collection = lazy_collection("categories")
+currency_collection = lazy_collection("currency")
+tasks_collection = lazy_collection("tasks")
+notes_collection = lazy_collection("notes")
+quotes_collection = lazy_collection("quotes")
+contributions_collection = lazy_collection("goal_contributions")
+alerts_collection = lazy_collection("budget_alerts")
+recurring_collection = lazy_collection("recurring_templates")
+checkpoints_collection = lazy_collection("job_checkpoints")
+insights_collection = lazy_collection("insights")
+rate_limits_collection = lazy_collection("rate_limits")
+payment_modes_collection = lazy_collection("payment_modes")
+counters_collection = lazy_collection("counters")
+stream_tickets_collection = lazy_collection("stream_tickets")
@@ -0,0 +1,250 @@
+# db_budget.py
+"""
+Per-request MongoDB round-trip accounting and per-route budgets.
+
+A pymongo CommandListener counts, for the request that issued them:
+
+- round trips: every command sent to the server except getMore, i.e.
+  one per find / aggregate / insert / update / delete / count...;
+- getMores: follow-up cursor batches. They grow with the result size
+  rather than with the handler's query plan, so they are reported next
+  to the reply bytes instead of being held to the budget;
+- reply bytes: BSON size of every reply.
+
+Routes declare how many round trips they need:
+
+    @notes_api.route("", methods=["GET"])
+    @db_budget(round_trips=1)
+    def get_notes(): ...
+
+Every response carries `X-DB-Round-Trips`, `X-DB-GetMores` and
+`X-DB-Reply-Bytes` (plus `X-DB-Budget` for routes that declare one),
+the per-route histograms are on /metrics, and a route that goes over
+its budget logs a warning. With DB_BUDGET_ENFORCE=1
+(bench/check_db_budgets.py, CI) it answers 500 with the counts instead,
+so an extra query fails the check rather than going unnoticed.
+
+The counts live in a contextvar holding one mutable tally per request,
+so commands issued from copied contexts (dashboard fan-out,
+run_in_threadpool) land in the same tally. Work done outside the
+request (write-behind flushes, jobs) is not counted, nor are
+process-wide cache refills wrapped in untracked() (the expense_schema
+codebooks), which a request only pays now and then, nor the batched
+re-normalization after a base-currency change, which grows with the
+user's history. Streamed bodies
+(export, alerts/stream) are counted up to the point the headers are
+sent.
+
+pymongo only emits command events against a real server; with
+mongomock every count is 0.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import bson
+from pymongo import monitoring
+
+import metrics
+
+logger = logging.getLogger("db_budget")
+
+DB_BUDGET_ENFORCE = os.getenv("DB_BUDGET_ENFORCE", "0") == "1"
+
+ROUND_TRIPS_HEADER = "X-DB-Round-Trips"
+GET_MORES_HEADER = "X-DB-GetMores"
+REPLY_BYTES_HEADER = "X-DB-Reply-Bytes"
+BUDGET_HEADER = "X-DB-Budget"
+
+ROUND_TRIPS = metrics.histogram(
+    "nexwise_db_round_trips_per_request",
+    "MongoDB commands (excluding getMore) issued per request.",
+    ("app", "route"),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50),
+)
+REPLY_BYTES = metrics.histogram(
+    "nexwise_db_reply_bytes_per_request",
+    "BSON bytes returned by MongoDB per request.",
+    ("app", "route"),
+    buckets=(0, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000),
+)
+OVER_BUDGET = metrics.counter(
+    "nexwise_db_budget_exceeded_total",
+    "Requests that issued more MongoDB round trips than their route's budget.",
+    ("app", "route"),
+)
+
+
+# -------------------------------
+# Budgets
+# -------------------------------
+def db_budget(round_trips):
+    """Declare the most MongoDB round trips one call of this view may take."""
+
+    def decorate(view):
+        view._db_budget = round_trips
+        return view
+
+    return decorate
+
+
+def budget_of(view):
+    return getattr(view, "_db_budget", None)
+
+
+# -------------------------------
+# Per-request tally
+# -------------------------------
+class Tally:
+    def __init__(self):
+        self.round_trips = 0
+        self.get_mores = 0
+        self.reply_bytes = 0
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def record(self, command_name, reply_bytes):
+        with self._lock:
+            if command_name == "getMore":
+                self.get_mores += 1
+            else:
+                self.round_trips += 1
+                self.commands.append(command_name)
+            self.reply_bytes += reply_bytes
+
+    def as_dict(self):
+        return {
+            "round_trips": self.round_trips,
+            "get_mores": self.get_mores,
+            "reply_bytes": self.reply_bytes,
+            "commands": list(self.commands),
+        }
+
+
+_tally = contextvars.ContextVar("db_tally", default=None)
+
+
+def start():
+    tally = Tally()
+    _tally.set(tally)
+    return tally
+
+
+def stop():
+    _tally.set(None)
+
+
+def current():
+    return _tally.get()
+
+
+@contextmanager
+def untracked():
+    """Leave the enclosed commands out of the request's tally (cache refills, batched backfills)."""
+    token = _tally.set(None)
+    try:
+        yield
+    finally:
+        _tally.reset(token)
+
+
+class BudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        tally = _tally.get()
+        if tally is not None:
+            tally.record(event.command_name, len(bson.encode(event.reply)))
+
+    def failed(self, event):
+        tally = _tally.get()
+        if tally is not None:
+            tally.record(event.command_name, 0)
+
+
+def install():
+    """Register the listener with db.py (before the first client is built)."""
+    import db
+
+    if getattr(db, "_db_budget_installed", False):
+        return
+    db.add_event_listener(BudgetListener())
+    db._db_budget_installed = True
+
+
+def settle(tally, app_name, route, budget):
+    """Record the request's tally; returns the over-budget error body, or None."""
+    ROUND_TRIPS.observe(tally.round_trips, app=app_name, route=route)
+    REPLY_BYTES.observe(tally.reply_bytes, app=app_name, route=route)
+    if budget is None or tally.round_trips <= budget:
+        return None
+    OVER_BUDGET.inc(app=app_name, route=route)
+    logger.warning("%s took %d MongoDB round trips (budget %d): %s",
+                   route, tally.round_trips, budget, ", ".join(tally.commands))
+    return {"error": "DB round-trip budget exceeded", "route": route, "budget": budget, **tally.as_dict()}
+
+
+def _headers(tally, budget):
+    headers = {
+        ROUND_TRIPS_HEADER: str(tally.round_trips),
+        GET_MORES_HEADER: str(tally.get_mores),
+        REPLY_BYTES_HEADER: str(tally.reply_bytes),
+    }
+    if budget is not None:
+        headers[BUDGET_HEADER] = str(budget)
+    return headers
+
+
+# -------------------------------
+# Framework hooks
+# -------------------------------
+def init_flask_db_budgets(app, app_name="flask"):
+    install()
+    from flask import jsonify, request
+
+    @app.before_request
+    def _db_tally_start():
+        start()
+
+    @app.after_request
+    def _db_tally_settle(response):
+        tally = current()
+        if tally is None:
+            return response
+        budget = budget_of(app.view_functions.get(request.endpoint))
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        exceeded = settle(tally, app_name, rule, budget)
+        if exceeded is not None and DB_BUDGET_ENFORCE:
+            response = jsonify(exceeded)
+            response.status_code = 500
+        response.headers.update(_headers(tally, budget))
+        return response
+
+    @app.teardown_request
+    def _db_tally_stop(exc):
+        stop()
+
+
+def init_fastapi_db_budgets(app, app_name="fastapi"):
+    install()
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    @app.middleware("http")
+    async def _db_budget_middleware(request: Request, call_next):
+        tally = start()
+        try:
+            response = await call_next(request)
+        finally:
+            stop()
+        route = request.scope.get("route")
+        budget = budget_of(getattr(route, "endpoint", None))
+        exceeded = settle(tally, app_name, getattr(route, "path", "<unmatched>"), budget)
+        if exceeded is not None and DB_BUDGET_ENFORCE:
+            response = JSONResponse(exceeded, status_code=500)
+        response.headers.update(_headers(tally, budget))
+        return response
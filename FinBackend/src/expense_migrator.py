@@ -0,0 +1,122 @@
+# expense_migrator.py
+"""
+Rewrite legacy expenses into the compact schema (see expense_schema.py).
+
+    python expense_migrator.py                  # migrate, resuming from the last checkpoint
+    python expense_migrator.py --restart        # start again from the first document
+    python expense_migrator.py --report-only    # just print collection / index sizes
+    python expense_migrator.py --compact        # also run `compact` afterwards to return space
+
+Legacy documents are read in _id order, in batches. Each batch is one
+unordered bulk_write of ReplaceOnes. A ReplaceOne only matches while the
+document is still legacy, so concurrent writers and re-runs are safe.
+The last _id is checkpointed after every batch, so an interrupted run
+resumes where it stopped. Every batch bumps its users' "expenses"
+version, so cached views revalidate against the rewritten documents.
+Collection and index sizes (collStats) are printed before and after the
+run. WiredTiger only returns the freed space to the OS after `compact`.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import ReplaceOne
+
+from db import checkpoints_collection, db, expense_collection
+from expense_schema import to_compact
+from versions import bump_version
+
+CHECKPOINT_ID = "expense_schema:v2"
+LEGACY = {"amount_minor": {"$exists": False}}
+
+
+def size_report(collection_name="expenses"):
+    stats = db.command("collStats", collection_name)
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "total_index_size": stats.get("totalIndexSize", 0),
+        "index_sizes": stats.get("indexSizes", {}),
+    }
+
+
+def print_report(title, report):
+    mb = lambda b: b / 1024 / 1024  # noqa: E731
+    print(f"{title}: {report['count']} documents, data {mb(report['size']):.1f} MB "
+          f"(avg {report['avg_obj_size']} B), storage {mb(report['storage_size']):.1f} MB, "
+          f"indexes {mb(report['total_index_size']):.1f} MB")
+    for name, size in report["index_sizes"].items():
+        print(f"    {name:40s} {mb(size):8.2f} MB")
+
+
+def migrate_batch(docs):
+    writes, failed = [], 0
+    for doc in docs:
+        try:
+            compact = to_compact(doc)
+        except (TypeError, ValueError):
+            failed += 1  # e.g. an unparseable legacy date; left as is
+            continue
+        writes.append(ReplaceOne({"_id": doc["_id"], **LEGACY}, compact))
+    if writes:
+        result = expense_collection.bulk_write(writes, ordered=False)
+        for user_id in {doc.get("user_id") for doc in docs}:
+            bump_version(user_id, "expenses")
+        return result.modified_count, failed
+    return 0, failed
+
+
+def run(batch_size=1000, restart=False):
+    checkpoint = None if restart else checkpoints_collection.find_one({"_id": CHECKPOINT_ID})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    totals = {
+        "migrated": checkpoint.get("migrated", 0) if checkpoint else 0,
+        "failed": checkpoint.get("failed", 0) if checkpoint else 0,
+    }
+    started = time.time()
+
+    while True:
+        query = dict(LEGACY)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(expense_collection.find(query).sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+
+        migrated, failed = migrate_batch(docs)
+        last_id = docs[-1]["_id"]
+        totals["migrated"] += migrated
+        totals["failed"] += failed
+        checkpoints_collection.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow(), **totals}},
+            upsert=True,
+        )
+        print(f"  {totals['migrated']} migrated ({totals['failed']} failed), {time.time() - started:.1f}s")
+
+    checkpoints_collection.update_one(
+        {"_id": CHECKPOINT_ID},
+        {"$set": {"finished_at": datetime.utcnow(), **totals}},
+        upsert=True,
+    )
+    print(f"Done in {time.time() - started:.1f}s: {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    parser.add_argument("--report-only", action="store_true")
+    parser.add_argument("--compact", action="store_true", help="run `compact` on expenses afterwards")
+    args = parser.parse_args()
+
+    print_report("Before", size_report())
+    if not args.report_only:
+        run(batch_size=args.batch_size, restart=args.restart)
+        if args.compact:
+            db.command("compact", "expenses")
+        print_report("After", size_report())
@@ -0,0 +1,273 @@
+# expense_schema.py
+"""
+Compact expense documents.
+
+    {
+        "_id": ObjectId, "user_id": str,
+        "date": datetime,               # midnight UTC of the expense day
+        "category_id": int,             # -> categories     {_id: int, name: str}
+        "payment_mode_id": int,         # -> payment_modes  {_id: int, name: str}
+        "amount_minor": int,            # amount * SCALE
+        "currency": "₹",                # as entered (1-3 chars)
+        "amount_base_minor": int,       # in base_currency; absent until a rate is known
+        "base_currency": "INR",
+        "fx_rate": float,
+        "description": str,
+        "bill_filename": str,           # only when a bill was uploaded
+    }
+
+Older documents have a float `amount` / `amount_base`, a 'YYYY-MM-DD'
+string `date` and string `category` / `payment_mode`.
+expense_migrator.py rewrites them. Until that has run, every reader uses
+the expressions and filters below, which accept both shapes. Clients
+keep seeing the old shape through `expense_view()`.
+
+Category and payment-mode names are mapped to small integer ids by a
+Codebook. The ids are allocated once, globally, and cached per process.
+Aggregations group and project on the id (or the legacy name), and the
+names are filled in afterwards from the cached codebook
+(`category_name()`, `decode_view()`), so a pipeline only carries the
+ids it actually returns, never the codebook itself.
+"""
+
+import threading
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import category_collection, counters_collection, payment_modes_collection, register_index
+from db_budget import untracked
+
+SCALE = 100
+
+register_index("categories", [("name", 1)], unique=True)
+register_index("payment_modes", [("name", 1)], unique=True)
+
+
+def to_minor(amount):
+    return None if amount is None else int(round(float(amount) * SCALE))
+
+
+def from_minor(value):
+    return None if value is None else value / SCALE
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' (or a datetime) -> datetime at midnight; raises ValueError."""
+    if isinstance(value, datetime):
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d")
+
+
+# -------------------------------
+# Name <-> id codebooks
+# -------------------------------
+class Codebook:
+    def __init__(self, collection, counter_id):
+        self.collection = collection
+        self.counter_id = counter_id
+        self._ids = {}
+        self._names = [None]
+        self._lock = threading.Lock()
+
+    def _remember(self, code, name):
+        self._ids[name] = code
+        if code >= len(self._names):
+            self._names.extend([None] * (code + 1 - len(self._names)))
+        self._names[code] = name
+
+    def refresh(self):
+        with untracked():
+            docs = list(self.collection.find({"_id": {"$type": "number"}}))
+        with self._lock:
+            for doc in docs:
+                self._remember(doc["_id"], doc["name"])
+
+    def id_for(self, name, create=True):
+        """Id of `name`, allocating one if needed (None for empty names, or unknown with create=False)."""
+        if name is None or name == "":
+            return None
+        code = self._ids.get(name)
+        if code is not None:
+            return code
+        with untracked():
+            return self._lookup(name, create)
+
+    def _lookup(self, name, create):
+        existing = self.collection.find_one({"name": name})
+        if existing is None and create:
+            code = counters_collection.find_one_and_update(
+                {"_id": self.counter_id}, {"$inc": {"seq": 1}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )["seq"]
+            try:
+                self.collection.insert_one({"_id": code, "name": name})
+                existing = {"_id": code}
+            except DuplicateKeyError:
+                # Another process registered the same name first
+                existing = self.collection.find_one({"name": name})
+        if existing is None:
+            return None
+        with self._lock:
+            self._remember(existing["_id"], name)
+        return existing["_id"]
+
+    def name_for(self, code):
+        if code is None:
+            return None
+        if code >= len(self._names) or self._names[code] is None:
+            self.refresh()
+        return self._names[code] if code < len(self._names) else None
+
+    def decode(self, value):
+        """Name for an id from an aggregation key; legacy names pass through."""
+        if isinstance(value, int) and not isinstance(value, bool):
+            return self.name_for(value)
+        return value
+
+
+categories = Codebook(category_collection, "category_id")
+payment_modes = Codebook(payment_modes_collection, "payment_mode_id")
+
+
+# -------------------------------
+# Aggregation expressions (both document shapes)
+# -------------------------------
+# Amount in the user's base currency. Documents without one (written
+# before normalization, or while no rate was known) count as 0 rather
+# than adding a foreign-currency amount; UNCONVERTED_EXPR flags them.
+_BASE_AMOUNT = {"$ifNull": [{"$divide": ["$amount_base_minor", SCALE]}, {"$ifNull": ["$amount_base", None]}]}
+BASE_AMOUNT_EXPR = {"$ifNull": [_BASE_AMOUNT, 0]}
+UNCONVERTED_EXPR = {"$cond": [{"$eq": [_BASE_AMOUNT, None]}, 1, 0]}
+
+AMOUNT_EXPR = {"$ifNull": [{"$divide": ["$amount_minor", SCALE]}, "$amount"]}
+
+# BSON orders every string before every date, so this is "date is a datetime"
+_IS_DATETIME = {"$gte": ["$date", datetime(1900, 1, 1)]}
+
+DAY_EXPR = {"$cond": [
+    _IS_DATETIME,
+    {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+    "$date",
+]}
+
+MONTH_EXPR = {"$substrBytes": [DAY_EXPR, 0, 7]}
+
+
+# Category / payment mode as an id (compact) or a name (legacy); turn the
+# ids into names after the aggregation with category_name() / decode_view()
+CATEGORY_KEY_EXPR = {"$ifNull": ["$category_id", "$category"]}
+PAYMENT_MODE_KEY_EXPR = {"$ifNull": ["$payment_mode_id", "$payment_mode"]}
+
+
+def category_name(key):
+    return categories.decode(key)
+
+
+def merge_category_totals(rows):
+    """{category name: total} from {_id: CATEGORY_KEY_EXPR, total} rows (legacy and compact keys merged)."""
+    totals = {}
+    for row in rows:
+        name = category_name(row["_id"])
+        totals[name] = totals.get(name, 0) + row["total"]
+    return totals
+
+
+def expense_view():
+    """$project stage giving clients the original expense shape (pass each document to decode_view())."""
+    return {
+        "_id": 0,
+        "id": {"$toString": "$_id"},
+        "user_id": 1,
+        "date": DAY_EXPR,
+        "category": CATEGORY_KEY_EXPR,
+        "description": 1,
+        "amount": AMOUNT_EXPR,
+        "payment_mode": PAYMENT_MODE_KEY_EXPR,
+        "currency": 1,
+        "amount_base": {"$ifNull": [{"$divide": ["$amount_base_minor", SCALE]}, "$amount_base"]},
+        "base_currency": 1,
+        "fx_rate": 1,
+        "bill_filename": {"$ifNull": ["$bill_filename", None]},
+        "recurring_id": 1,
+    }
+
+
+def decode_view(doc):
+    """Names in place of the ids expense_view() leaves in category / payment_mode."""
+    doc["category"] = categories.decode(doc.get("category"))
+    doc["payment_mode"] = payment_modes.decode(doc.get("payment_mode"))
+    return doc
+
+
+# -------------------------------
+# Query filters (both document shapes)
+# -------------------------------
+def category_filter(name):
+    code = categories.id_for(name, create=False)
+    if code is None:
+        return {"category": name}
+    return {"$or": [{"category_id": code}, {"category": name}]}
+
+
+def date_range_filter(start, end):
+    """start <= date < end, for datetime and legacy string dates."""
+    start, end = parse_day(start), parse_day(end)
+    return {"$or": [
+        {"date": {"$gte": start, "$lt": end}},
+        {"date": {"$gte": start.strftime("%Y-%m-%d"), "$lt": end.strftime("%Y-%m-%d")}},
+    ]}
+
+
+# -------------------------------
+# Documents
+# -------------------------------
+def build_expense(user_id, date, category, description, amount, payment_mode, currency,
+                  amount_base, base_currency, fx_rate, bill_filename=None, **extra):
+    doc = {
+        "user_id": user_id,
+        "date": parse_day(date),
+        "category_id": categories.id_for(category),
+        "payment_mode_id": payment_modes.id_for(payment_mode),
+        "amount_minor": to_minor(amount),
+        "currency": currency,
+        "base_currency": base_currency,
+        "fx_rate": fx_rate,
+        "description": description or "",
+        **extra,
+    }
+    if amount_base is not None:
+        doc["amount_base_minor"] = to_minor(amount_base)
+    if bill_filename:
+        doc["bill_filename"] = bill_filename
+    return doc
+
+
+def to_compact(doc):
+    """Compact copy of a legacy document (same _id and extra fields); compact docs pass through."""
+    if "amount_minor" in doc:
+        return doc
+    known = {"user_id", "date", "category", "description", "amount", "payment_mode", "currency",
+             "amount_base", "base_currency", "fx_rate", "bill_filename"}
+    extra = {k: v for k, v in doc.items() if k not in known}
+    return build_expense(
+        doc.get("user_id"), doc.get("date"), doc.get("category"), doc.get("description"),
+        doc.get("amount") or 0, doc.get("payment_mode"), doc.get("currency"),
+        doc.get("amount_base"), doc.get("base_currency"), doc.get("fx_rate"),
+        doc.get("bill_filename"), **extra,
+    )
+
+
+def base_amount(doc):
+    """Amount in the base currency; 0.0 when the document has none (see BASE_AMOUNT_EXPR)."""
+    for field, scale in (("amount_base_minor", SCALE), ("amount_base", 1)):
+        if doc.get(field) is not None:
+            return doc[field] / scale
+    return 0.0
+
+
+def category_of(doc):
+    if doc.get("category_id") is not None:
+        return categories.name_for(doc["category_id"])
+    return doc.get("category")
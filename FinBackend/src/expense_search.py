@@ -0,0 +1,217 @@
+# expense_search.py
+"""
+Filter language for /api/expense/search, translated to one indexed query.
+
+    GET /api/expense/search?q=amount>=100 amount<500 date>=2025-01-01 mode:UPI,Card coffee
+                           &sort=-date&limit=50&cursor=<next_cursor>
+
+`q` is a list of terms, all of which must match:
+
+    amount>=100  amount<500  amount:250     entered amount (>, >=, <, <=, :)
+    date>=2025-01-01  date:2025-06          a day or a month (YYYY-MM)
+    category:Food,Travel                    any of these names
+    payment_mode:UPI  mode:Card             any of these payment modes
+    currency:₹,$                            any of these currencies
+    -category:Rent                          none of these (for : terms)
+    category:"Eating Out"                   quote values with spaces
+    coffee "movie night" -uber              description keywords
+
+Keywords go to MongoDB's text search on `description` (whole words,
+stemmed; a leading - excludes a word, quotes match a phrase). Terms on
+the same field narrow each other. `sort` is date, -date (default),
+amount or -amount, and pages are keyset cursors on (sort key, _id), so
+page 100 costs the same as page 1.
+
+Indexes: (user_id, date, _id), (user_id, amount_minor, _id) and a text
+index on (user_id, description). Ranges and sorts run on the compact
+fields (see expense_schema.py), so documents still in the legacy shape
+are left out until expense_migrator.py has rewritten them.
+"""
+
+import base64
+import json
+import re
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from db import register_index
+from expense_schema import categories, expense_view, parse_day, payment_modes, to_minor
+
+register_index("expenses", [("user_id", 1), ("date", -1), ("_id", -1)])
+register_index("expenses", [("user_id", 1), ("amount_minor", 1), ("_id", 1)])
+register_index("expenses", [("user_id", 1), ("description", "text")])
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_TERMS = 30
+
+SORTS = {"date": "date", "amount": "amount_minor"}
+FIELD_ALIASES = {"mode": "payment_mode"}
+RANGE_OPS = {">": "$gt", ">=": "$gte", "<": "$lt", "<=": "$lte"}
+
+_VALUE = r'(?:"[^"]*"|[^\s",]+)'
+_TERM = re.compile(
+    rf'(-?)(?:([a-z_]+)(>=|<=|>|<|:)({_VALUE}(?:,{_VALUE})*)|("[^"]*")|(\S+))', re.IGNORECASE
+)
+_LIST_ITEM = re.compile(r'"([^"]*)"|([^,]+)')
+
+
+class SearchError(ValueError):
+    pass
+
+
+# -------------------------------
+# Parsing
+# -------------------------------
+def parse(q):
+    """(field terms as (negated, field, op, value), text terms) from a query string."""
+    terms, text = [], []
+    for match in _TERM.finditer(q or ""):
+        negated, field, op, value, phrase, word = match.groups()
+        field = field and field.lower()
+        field = FIELD_ALIASES.get(field, field)
+        if field in ("amount", "date", "category", "payment_mode", "currency"):
+            terms.append((bool(negated), field, op, value))
+        else:
+            # Unknown "field:value" is just a keyword that contains a colon
+            text.append(match.group(0))
+    if len(terms) + len(text) > MAX_TERMS:
+        raise SearchError(f"At most {MAX_TERMS} terms")
+    return terms, text
+
+
+def _tighten(bounds, op, value):
+    """Add a bound to a {$gt/$gte/$lt/$lte/$eq: value} dict, keeping the tighter one."""
+    if op in bounds:
+        value = max(bounds[op], value) if op in ("$gt", "$gte") else min(bounds[op], value)
+    bounds[op] = value
+
+
+def _values(value):
+    return [quoted or bare for quoted, bare in _LIST_ITEM.findall(value) if quoted or bare]
+
+
+def _day_range(value):
+    value = value.strip('"')
+    try:
+        if len(value) == 7:  # YYYY-MM
+            start = datetime.strptime(value, "%Y-%m")
+            return start, (start + timedelta(days=32)).replace(day=1)
+        start = parse_day(value)
+        return start, start + timedelta(days=1)
+    except ValueError:
+        raise SearchError(f"Invalid date {value!r} (expected YYYY-MM-DD or YYYY-MM)")
+
+
+def _names(codebook, values):
+    codes = [codebook.id_for(v, create=False) for v in values]
+    return [c for c in codes if c is not None]
+
+
+def build_query(user_id, q):
+    terms, text = parse(q)
+    query = {"user_id": user_id}
+    amount, date = {"$exists": True}, {}
+    members = {}  # field -> {"$in": set} / {"$nin": set}
+
+    for negated, field, op, value in terms:
+        if negated and op != ":":
+            raise SearchError(f"Only ':' terms can be negated ({field}{op}{value})")
+        if field == "amount":
+            try:
+                minor = to_minor(float(value.strip('"')))
+            except (ValueError, OverflowError):
+                raise SearchError(f"Invalid amount {value!r}")
+            if negated:
+                amount.setdefault("$nin", []).append(minor)
+            elif op == ":":
+                amount["$eq"] = minor
+            else:
+                _tighten(amount, RANGE_OPS[op], minor)
+        elif field == "date":
+            start, end = _day_range(value)
+            if negated:
+                query.setdefault("$nor", []).append({"date": {"$gte": start, "$lt": end}})
+            elif op == ":":
+                _tighten(date, "$gte", start)
+                _tighten(date, "$lt", end)
+            elif op in (">", ">="):
+                _tighten(date, "$gte", end if op == ">" else start)
+            else:
+                _tighten(date, "$lt", start if op == "<" else end)
+        else:
+            values = _values(value)
+            if field == "category":
+                key, values = "category_id", _names(categories, values)
+            elif field == "payment_mode":
+                key, values = "payment_mode_id", _names(payment_modes, values)
+            else:
+                key = "currency"
+            op_name = "$nin" if negated else "$in"
+            current = members.setdefault(key, {})
+            if op_name == "$in" and "$in" in current:
+                current["$in"] &= set(values)  # two positive lists: both must hold
+            else:
+                current.setdefault(op_name, set()).update(values)
+
+    query["amount_minor"] = amount
+    if date:
+        query["date"] = date
+    for key, ops in members.items():
+        query[key] = {op: sorted(values, key=str) for op, values in ops.items()}
+    if text:
+        query["$text"] = {"$search": " ".join(text)}
+    return query
+
+
+# -------------------------------
+# Sorting and keyset cursors
+# -------------------------------
+def parse_sort(value):
+    value = value or "-date"
+    field = SORTS.get(value.lstrip("-"))
+    if field is None:
+        raise SearchError(f"Unknown sort {value!r} (use date, -date, amount or -amount)")
+    return value, field, -1 if value.startswith("-") else 1
+
+
+def encode_cursor(sort, doc):
+    """Cursor after `doc` (an expense_view() document)."""
+    if sort.lstrip("-") == "date":
+        key = doc["date"]  # YYYY-MM-DD of a midnight datetime
+    else:
+        key = to_minor(doc["amount"])
+    raw = json.dumps({"s": sort, "k": key, "i": doc["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def cursor_clause(sort, field, direction, cursor):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key, after = raw["k"], ObjectId(raw["i"])
+        if field == "date":
+            key = parse_day(key)
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise SearchError("Invalid cursor")
+    if raw.get("s") != sort:
+        raise SearchError("Cursor belongs to a different sort")
+    op = "$lt" if direction < 0 else "$gt"
+    return {"$or": [{field: {op: key}}, {field: key, "_id": {op: after}}]}
+
+
+def search_pipeline(user_id, q, sort=None, limit=None, cursor=None):
+    """(pipeline, sort, limit); the pipeline returns up to limit + 1 expense_view() documents (for decode_view())."""
+    sort, field, direction = parse_sort(sort)
+    limit = min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    match = build_query(user_id, q)
+    if cursor:
+        match.setdefault("$and", []).append(cursor_clause(sort, field, direction, cursor))
+    pipeline = [
+        {"$match": match},
+        {"$sort": {field: direction, "_id": direction}},
+        {"$limit": limit + 1},
+        {"$project": expense_view()},
+    ]
+    return pipeline, sort, limit
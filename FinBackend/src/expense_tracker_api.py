@@ -6,6 +6,25 @@ from datetime import datetime
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from bson import ObjectId
+from versions import bump_version, current_etag, not_modified, with_etag
+from db_budget import db_budget, untracked
+from budget_alerts import record_spend
+from expense_search import SearchError, encode_cursor, search_pipeline
+from rate_table import DEFAULT_BASE_CURRENCY, get_table, normalize_amount, normalize_code
+from normalize_expenses import normalize, user_query
+from expense_schema import (
+    BASE_AMOUNT_EXPR,
+    CATEGORY_KEY_EXPR,
+    UNCONVERTED_EXPR,
+    base_amount,
+    build_expense,
+    category_filter,
+    category_of,
+    decode_view,
+    expense_view,
+    merge_category_totals,
+    parse_day,
+)
 
 # Import MongoDB collections from db.py
 from db import (
@@ -14,7 +33,8 @@ from db import (
     expense_collection,
     goals_collection,
     loan_collection,
-    tax_collection
+    tax_collection,
+    insights_collection
 )
 
 expense_api = Blueprint("expense_api", __name__)
@@ -25,6 +45,8 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 
+NORMALIZE_BATCH = int(os.getenv("BASE_CURRENCY_NORMALIZE_BATCH", "1000"))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -37,8 +59,48 @@ def get_user_id():
     if not decoded_token:
         return None
     return decoded_token.get('uid')  # <-- ensure it's the UID
+# User's base currency (all totals are reported in it)
+def get_base_currency(user_id):
+    user = users_collection.find_one({"uid": user_id}, {"base_currency": 1})
+    return (user or {}).get("base_currency") or DEFAULT_BASE_CURRENCY
+
+@expense_api.route('/base_currency', methods=['GET', 'POST'])
+@db_budget(round_trips=2)
+def base_currency():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    if request.method == 'GET':
+        return jsonify({"base_currency": get_base_currency(user_id)})
+
+    code = normalize_code((request.get_json() or {}).get("base_currency"))
+    if not code or len(code) != 3:
+        return jsonify({"message": "Invalid currency code"}), 400
+
+    table = get_table()
+    if table is None:
+        return jsonify({"message": "Exchange rates unavailable; try again later"}), 503
+
+    users_collection.update_one({"uid": user_id}, {"$set": {"base_currency": code}}, upsert=True)
+    # Re-normalize existing expenses now, in batches, so totals never mix the
+    # old and new base. Its round trips grow with the user's history and are
+    # left out of the route budget.
+    with untracked():
+        updated, unconverted = normalize(user_query(user_id), table, NORMALIZE_BATCH)
+    bump_version(user_id, "expenses")
+    return jsonify({
+        "message": "Base currency updated",
+        "base_currency": code,
+        "renormalized": updated,
+        "unconverted_expenses": unconverted,
+    })
+
 #ADD EXPENSE 
 @expense_api.route('/add_expense', methods=['POST'])
+# base currency, insert, version, running total, alert seq + alerts; +3 the
+# first time a category whose budget has no running total yet is written to
+@db_budget(round_trips=9)
 def add_expense():
     user_id = get_user_id()
     if not user_id:
@@ -52,6 +114,11 @@ def add_expense():
     payment_mode = data.get("payment_mode")
     currency = data.get("currency", "$")
 
+    try:
+        parse_day(date)
+    except ValueError:
+        return jsonify({"message": "Invalid date (expected YYYY-MM-DD)"}), 400
+
     # File upload
     bill_file = request.files.get('bill')
     bill_filename = None
@@ -65,121 +132,198 @@ def add_expense():
         bill_filename = f"{timestamp}_{safe_name}"
         bill_file.save(os.path.join(UPLOAD_FOLDER, bill_filename))
 
-    # Insert into MongoDB with user_id
-    expense_doc = {
-        "user_id": user_id,
-        "date": date,
-        "category": category,
-        "description": description,
-        "amount": amount,
-        "payment_mode": payment_mode,
-        "currency": currency,
-        "bill_filename": bill_filename
-    }
+    # Normalize into the user's base currency with the cached rate table
+    base = get_base_currency(user_id)
+    amount_base, fx_rate = normalize_amount(amount, currency, base)
+
+    # Insert into MongoDB with user_id (compact schema, see expense_schema.py);
+    # amount_base is None if no rate was available and is backfilled later
+    expense_doc = build_expense(
+        user_id, date, category, description, amount, payment_mode, currency,
+        amount_base, base, fx_rate, bill_filename,
+    )
 
     expense_collection.insert_one(expense_doc)
+    bump_version(user_id, "expenses")
+    if amount_base is not None:  # counted once normalize_expenses.py converts it
+        record_spend(user_id, category, amount_base)
     return jsonify({"message": "Expense added successfully!"}), 201
 
 # GET ALL EXPENSES 
 @expense_api.route('/get_expenses', methods=['GET'])
+@db_budget(round_trips=2)
 def get_expenses():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"message": "Unauthorized"}), 401
 
     category = request.args.get("category")
+
+    etag = current_etag(user_id, "expenses", scope=f"expenses:{category or ''}")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     query = {"user_id": user_id}  # <-- only fetch this user's data
     if category:
-        query["category"] = category
-
-    expenses = list(expense_collection.find(query))
+        query.update(category_filter(category))
 
-    # Convert ObjectId to string
-    for e in expenses:
-        e["id"] = str(e["_id"])
-        del e["_id"]
+    # Stored documents are compact; clients get the original shape
+    expenses = [decode_view(doc) for doc in expense_collection.aggregate([
+        {"$match": query},
+        {"$project": expense_view()},
+    ])]
 
-    return jsonify(expenses)
+    return with_etag(jsonify(expenses), etag)
 
-#SUMMARY
-@expense_api.route('/get_summary', methods=['GET'])
-def get_summary():
+# SEARCH (filter language, sort and keyset cursors: see expense_search.py)
+@expense_api.route('/search', methods=['GET'])
+@db_budget(round_trips=1)
+def search_expenses():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"message": "Unauthorized"}), 401
 
-    # Total spending
-    pipeline_total = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    total_result = list(expense_collection.aggregate(pipeline_total))
-    total_spent = total_result[0]["total"] if total_result else 0
+    try:
+        pipeline, sort, limit = search_pipeline(
+            user_id,
+            request.args.get("q", ""),
+            sort=request.args.get("sort"),
+            limit=request.args.get("limit", type=int),
+            cursor=request.args.get("cursor"),
+        )
+    except SearchError as e:
+        return jsonify({"message": str(e)}), 400
 
-    # Category-wise totals
-    pipeline_cat = [
+    expenses = [decode_view(doc) for doc in expense_collection.aggregate(pipeline)]
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = encode_cursor(sort, expenses[-1])
+    return jsonify({"expenses": expenses, "next_cursor": next_cursor})
+
+# Total + per-category spend in one aggregation (shared by the expense
+# summary, the budget summary and the dashboard). Expenses with no amount
+# in the base currency yet are left out of the sums and counted instead.
+def expense_totals(user_id):
+    pipeline = [
         {"$match": {"user_id": user_id}},
-        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}}
+        {"$group": {
+            "_id": CATEGORY_KEY_EXPR,
+            "total": {"$sum": BASE_AMOUNT_EXPR},
+            "unconverted": {"$sum": UNCONVERTED_EXPR},
+        }}
     ]
-    cat_results = list(expense_collection.aggregate(pipeline_cat))
-    category_totals = [{"category": c["_id"], "total": c["total"]} for c in cat_results]
+    rows = list(expense_collection.aggregate(pipeline))
+    by_category = merge_category_totals(rows)
+    return sum(by_category.values()), by_category, sum(r["unconverted"] for r in rows)
+
+def build_summary(totals, base_currency):
+    total_spent, by_category, unconverted = totals
 
     # Dummy budget (replace when you add Budget module)
     dummy_budget = 5000
     remaining = dummy_budget - total_spent
 
-    return jsonify({
+    return {
+        "base_currency": base_currency,
         "total_spent": total_spent,
         "budget": dummy_budget,
         "remaining": remaining,
-        "category_totals": category_totals
-    })
+        "category_totals": [{"category": c, "total": t} for c, t in by_category.items()],
+        "unconverted_expenses": unconverted,
+    }
+
+#SUMMARY
+@expense_api.route('/get_summary', methods=['GET'])
+@db_budget(round_trips=3)
+def get_summary():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    etag = current_etag(user_id, "expenses", scope="summary")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    summary = build_summary(expense_totals(user_id), get_base_currency(user_id))
+    return with_etag(jsonify(summary), etag)
+
+DEFAULT_TIPS = [
+    "Review your top expenses and reduce by 10%.",
+    "Avoid impulse purchases by setting a 24-hour wait rule.",
+    "Use digital wallets to track spending automatically.",
+    "Set weekly mini-budgets for tighter control."
+]
 
 #  EXPENSE ANALYTICS
+# Precomputed nightly by insights_job.py; users it hasn't covered yet
+# (e.g. brand-new accounts) get the plain top-3 aggregation.
 @expense_api.route('/get_analytics', methods=['GET'])
+@db_budget(round_trips=2)
 def get_analytics():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"message": "Unauthorized"}), 401
 
+    insights = insights_collection.find_one({"_id": user_id})
+    if insights:
+        tips = insights.get("tips") or []
+        return jsonify({
+            "top_categories": insights.get("top_categories", []),
+            "tips": tips + DEFAULT_TIPS[len(tips):],
+            "forecast_total": insights.get("forecast_total"),
+            "forecast": [
+                {"category": c["category"], "forecast": c["forecast"], "zscore": c["zscore"]}
+                for c in insights.get("categories", [])
+            ],
+            "anomalies": insights.get("anomalies", []),
+            "generated_at": insights["generated_at"].isoformat() if insights.get("generated_at") else None,
+        })
+
+    # Few groups per user; top 3 after merging legacy and compact keys
     pipeline = [
         {"$match": {"user_id": user_id}},
-        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
-        {"$sort": {"total": -1}},
-        {"$limit": 3}
+        {"$group": {"_id": CATEGORY_KEY_EXPR, "total": {"$sum": BASE_AMOUNT_EXPR}}},
     ]
-    results = list(expense_collection.aggregate(pipeline))
-    top_categories = [{"category": r["_id"], "total": r["total"]} for r in results]
+    totals = merge_category_totals(expense_collection.aggregate(pipeline))
+    top_categories = [{"category": c, "total": t} for c, t in sorted(totals.items(), key=lambda x: -x[1])[:3]]
 
     analytics = {
         "top_categories": top_categories,
-        "tips": [
-            "Review your top expenses and reduce by 10%.",
-            "Avoid impulse purchases by setting a 24-hour wait rule.",
-            "Use digital wallets to track spending automatically.",
-            "Set weekly mini-budgets for tighter control."
-        ]
+        "tips": DEFAULT_TIPS
     }
     return jsonify(analytics)
 
 #  DELETE EXPENSE BY ID
 @expense_api.route('/delete_expense/<string:expense_id>', methods=['DELETE'])
+@db_budget(round_trips=7)  # delete, version, running total, alerts (+3 as in add_expense)
 def delete_expense_by_id(expense_id):
     user_id = get_user_id()
     if not user_id:
         return jsonify({"message": "Unauthorized"}), 401
 
-    result = expense_collection.delete_one({
-        "_id": ObjectId(expense_id),
-        "user_id": user_id  # ensure only owner can delete
-    })
+    deleted = expense_collection.find_one_and_delete(
+        {
+            "_id": ObjectId(expense_id),
+            "user_id": user_id  # ensure only owner can delete
+        },
+        projection={
+            "category_id": 1, "amount_minor": 1, "amount_base_minor": 1,
+            "category": 1, "amount": 1, "amount_base": 1,  # pre-migration documents
+        }
+    )
 
-    if result.deleted_count == 1:
+    if deleted:
+        bump_version(user_id, "expenses")
+        record_spend(user_id, category_of(deleted), -base_amount(deleted))
         return jsonify({"message": "Expense deleted"}), 200
     else:
         return jsonify({"message": "Expense not found"}), 404
 
 # SERVE BILL FILES
 @expense_api.route('/bills/<path:filename>', methods=['GET'])
+@db_budget(round_trips=0)
 def serve_bill(filename):
     return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False)
@@ -0,0 +1,180 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from firebase_admin_setup import verify_token
+from datetime import datetime
+import csv
+import io
+import json
+import os
+import zipfile
+
+from db import (
+    expense_collection,
+    tasks_collection,
+    goals_collection,
+    contributions_collection,
+    budget_collection,
+    recurring_collection,
+)
+from expense_tracker_api import UPLOAD_FOLDER
+from expense_schema import decode_view, expense_view
+from notes_api import client_note, notes
+from db_budget import db_budget
+
+export_api = Blueprint("export_api", __name__)
+
+# Flush the zip stream to the client whenever this much output is buffered
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH = 500
+
+# Support staff may export any account with ?user_id=
+SUPPORT_UIDS = {u.strip() for u in os.getenv("SUPPORT_UIDS", "").split(",") if u.strip()}
+
+EXPENSE_COLUMNS = [
+    "id", "date", "category", "description", "amount", "currency",
+    "payment_mode", "amount_base", "base_currency", "fx_rate", "bill_filename",
+]
+
+# -------------------------------
+# Get Firebase User ID
+# -------------------------------
+def get_user_id():
+    token = request.headers.get("Authorization")
+    if not token:
+        return None
+    decoded = verify_token(token.replace("Bearer ", ""))
+    if not decoded:
+        return None
+    return decoded.get("uid")
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink for ZipFile; the generator drains it."""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    @property
+    def buffered(self):
+        return self._size
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+def _ndjson_lines(cursor):
+    for doc in cursor:
+        yield (json.dumps(doc, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _expense_csv_lines(cursor):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EXPENSE_COLUMNS)
+    for doc in cursor:
+        writer.writerow([doc.get(c, "") if doc.get(c) is not None else "" for c in EXPENSE_COLUMNS])
+        yield out.getvalue().encode("utf-8")
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+
+def _bill_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def export_sections(user_id):
+    """(archive name, iterator of bytes) for every part of the export, lazily."""
+    def find(collection, query, **kwargs):
+        return collection.find(query, **kwargs).sort("_id", 1).batch_size(CURSOR_BATCH)
+
+    expenses = expense_collection.aggregate(
+        [{"$match": {"user_id": user_id}}, {"$sort": {"_id": 1}}, {"$project": expense_view()}],
+        batchSize=CURSOR_BATCH,
+    )
+    yield "expenses.csv", _expense_csv_lines(decode_view(doc) for doc in expenses)
+    yield "notes.ndjson", _ndjson_lines(
+        client_note(n) for n in notes.iter_by_user(user_id, sort=[("createdAt", 1)], batch_size=CURSOR_BATCH)
+    )
+    yield "tasks.ndjson", _ndjson_lines(find(tasks_collection, {"user_id": user_id}))
+    yield "goals.ndjson", _ndjson_lines(find(goals_collection, {"user_id": user_id}))
+    yield "goal_contributions.ndjson", _ndjson_lines(find(contributions_collection, {"user_id": user_id}))
+    yield "budget.ndjson", _ndjson_lines(find(budget_collection, {"user_id": user_id}))
+    yield "recurring_templates.ndjson", _ndjson_lines(find(recurring_collection, {"user_id": user_id}))
+
+    bills = find(
+        expense_collection,
+        {"user_id": user_id, "bill_filename": {"$nin": [None, ""]}},
+        projection={"bill_filename": 1},
+    )
+    for doc in bills:
+        filename = os.path.basename(doc["bill_filename"])
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.isfile(path):
+            yield f"bills/{filename}", _bill_chunks(path)
+
+
+def stream_export(user_id):
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        manifest = {"user_id": user_id, "exported_at": datetime.utcnow().isoformat() + "Z"}
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+        for name, chunks in export_sections(user_id):
+            with archive.open(name, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    if sink.buffered >= CHUNK_SIZE:
+                        yield sink.drain()
+            if sink.buffered >= CHUNK_SIZE:
+                yield sink.drain()
+
+    yield sink.drain()
+
+
+# -------------------------------
+# Full account export (streamed zip)
+# -------------------------------
+@export_api.route("", methods=["GET"])
+@db_budget(round_trips=0)  # every read happens in the streamed body
+def export_account():
+    uid = get_user_id()
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    user_id = request.args.get("user_id") or uid
+    if user_id != uid and uid not in SUPPORT_UIDS:
+        return jsonify({"error": "Forbidden"}), 403
+
+    filename = f"nexwise-export-{datetime.utcnow():%Y%m%d}.zip"
+    return Response(
+        stream_with_context(stream_export(user_id)),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
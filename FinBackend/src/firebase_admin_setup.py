@@ -2,21 +2,44 @@ import firebase_admin
 from firebase_admin import credentials, auth
 from dotenv import load_dotenv
 import os
+from metrics import track_dependency
+import rate_limit
+import resilience
 
 # Load variables from .env file
 load_dotenv()
 
 SERVICE_ACCOUNT_PATH = os.getenv("FIREBASE_SERVICE_KEY")
+# Bounds the public-key certificate fetch inside verify_id_token (SDK default: 120s)
+HTTP_TIMEOUT_SECONDS = float(os.getenv("FIREBASE_HTTP_TIMEOUT_SECONDS", 5))
 
 if not SERVICE_ACCOUNT_PATH:
     raise ValueError("FIREBASE_SERVICE_KEY not found in .env file!")
 
 if not firebase_admin._apps:
     cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-    firebase_admin.initialize_app(cred)
+    firebase_admin.initialize_app(cred, {"httpTimeout": HTTP_TIMEOUT_SECONDS})
+
+def verify_id_token(id_token):
+    """
+    Decoded token; raises auth errors for bad tokens and
+    resilience.DependencyUnavailable while Google's certificates can't be fetched.
+    """
+    try:
+        with resilience.guard("firebase", HTTP_TIMEOUT_SECONDS, trips=(auth.CertificateFetchError,)):
+            with track_dependency("firebase", "verify_id_token"):
+                decoded = auth.verify_id_token(id_token)
+    except auth.CertificateFetchError as e:
+        raise resilience.DependencyUnavailable("firebase", "error") from e
+    # Lets the rate limiter key this token's requests on its (now verified) uid
+    rate_limit.remember_verified(id_token, decoded)
+    return decoded
 
 def verify_token(id_token):
+    # None for an invalid token; an unreachable Firebase still surfaces as a 503
     try:
-        return auth.verify_id_token(id_token)
+        return verify_id_token(id_token)
+    except resilience.DependencyUnavailable:
+        raise
     except Exception:
         return None
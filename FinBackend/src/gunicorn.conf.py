@@ -0,0 +1,15 @@
+# gunicorn.conf.py
+"""
+Threaded workers: /budget/alerts/stream keeps its request open for up to
+ALERT_STREAM_MAX_SECONDS, which would take a whole sync worker. With
+gthread an open stream holds one thread, and budget_planner_api caps
+open streams per process (ALERT_STREAM_MAX_OPEN) below GUNICORN_THREADS
+so the remaining threads keep serving requests.
+"""
+
+import os
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
@@ -0,0 +1,195 @@
+# insights_job.py
+"""
+Nightly spending forecast + anomaly job.
+
+    python insights_job.py [--months 12] [--chunk-users 2000]
+
+One aggregation pulls per-user, per-category monthly totals (base
+currency) for the last `months` complete months. The rows are processed
+in chunks of users. For each chunk the (user, category) series are
+stacked into one NumPy matrix, then:
+
+- Holt's linear exponential smoothing forecasts next month's spend for
+  every series at once.
+- A z-score compares the latest complete month against the months
+  before it.
+
+The results go to one `insights` document per user (`_id` = user id),
+which get_analytics reads with a single lookup. Documents the run did
+not rewrite (users with no expenses left in the window) are deleted.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from db import expense_collection, insights_collection
+from expense_schema import BASE_AMOUNT_EXPR, CATEGORY_KEY_EXPR, MONTH_EXPR, category_name, date_range_filter
+
+ALPHA = 0.5   # level smoothing
+BETA = 0.3    # trend smoothing
+ANOMALY_Z = 2.0
+MIN_HISTORY = 3  # months of history before a series can be flagged
+
+
+def month_keys(now, months):
+    """The `months` complete months before `now`, oldest first, as 'YYYY-MM'."""
+    index = now.year * 12 + (now.month - 1)
+    return [f"{(i // 12):04d}-{(i % 12) + 1:02d}" for i in range(index - months, index)]
+
+
+def monthly_rows(first_month, end_month):
+    """Cursor of {_id: {u, c, m}, total} sorted by user (c: category id or legacy name)."""
+    return expense_collection.aggregate([
+        {"$match": date_range_filter(f"{first_month}-01", f"{end_month}-01")},
+        {"$group": {
+            "_id": {"u": "$user_id", "c": CATEGORY_KEY_EXPR, "m": MONTH_EXPR},
+            "total": {"$sum": BASE_AMOUNT_EXPR},
+        }},
+        {"$sort": {"_id.u": 1, "_id.c": 1}},
+    ], allowDiskUse=True)
+
+
+def holt_forecast(matrix, first_active, alpha=ALPHA, beta=BETA):
+    """
+    One-step-ahead Holt forecast for every row of a (series x months)
+    matrix. Each row starts at its first non-zero month (first_active), so
+    a category that appeared partway through the window isn't smoothed
+    through the zeros before it.
+    """
+    rows = np.arange(matrix.shape[0])
+    level = matrix[rows, np.minimum(first_active, matrix.shape[1] - 1)]
+    trend = np.zeros(matrix.shape[0])
+    for t in range(1, matrix.shape[1]):
+        started = t > first_active
+        previous = level
+        smoothed = alpha * matrix[:, t] + (1 - alpha) * (level + trend)
+        level = np.where(started, smoothed, level)
+        trend = np.where(started, beta * (level - previous) + (1 - beta) * trend, trend)
+    return np.maximum(level + trend, 0.0)
+
+
+def anomaly_scores(matrix, first_active):
+    """
+    z-score of the last column against the series' own history: the
+    previous columns from its first non-zero month (first_active) on, so
+    the months before a category existed don't pull the mean and spread
+    down (0 without MIN_HISTORY months of it).
+    """
+    history = matrix[:, :-1]
+    history_months = history.shape[1] - first_active
+    columns = np.arange(history.shape[1])
+    history = np.ma.masked_array(history, mask=columns[None, :] < first_active[:, None])
+    mean = history.mean(axis=1).filled(0.0)
+    std = history.std(axis=1).filled(0.0)
+    z = np.where(std > 1e-9, (matrix[:, -1] - mean) / np.maximum(std, 1e-9), 0.0)
+    return np.where(history_months >= MIN_HISTORY, z, 0.0), mean
+
+
+def build_tips(categories):
+    tips = []
+    for c in sorted(categories, key=lambda c: -c["zscore"]):
+        if c["anomaly"]:
+            tips.append(
+                f"{c['category']} spending last month ({c['last_month']:.0f}) was well above "
+                f"your usual {c['average']:.0f}."
+            )
+    for c in sorted(categories, key=lambda c: -c["forecast"])[:1]:
+        if c["forecast"] > 0:
+            tips.append(f"{c['category']} is on track to be your biggest expense next month (~{c['forecast']:.0f}).")
+    return tips[:4]
+
+
+def process_chunk(rows, months, generated_at):
+    """rows: list of (user_id, category, month, total) for a set of whole users."""
+    month_index = {m: i for i, m in enumerate(months)}
+    series_index = {}
+    series_keys = []
+    row_idx, col_idx, values = [], [], []
+    for user_id, category, month, total in rows:
+        key = (user_id, category)
+        if key not in series_index:
+            series_index[key] = len(series_keys)
+            series_keys.append(key)
+        row_idx.append(series_index[key])
+        col_idx.append(month_index[month])
+        values.append(total)
+
+    matrix = np.zeros((len(series_keys), len(months)))
+    # add.at: a legacy name and its compact id are two rows for one series
+    np.add.at(matrix, (np.asarray(row_idx), np.asarray(col_idx)), np.asarray(values, dtype=float))
+
+    # Months since a series first appeared (so new categories aren't "anomalous")
+    active = matrix > 0
+    first_active = np.where(active.any(axis=1), active.argmax(axis=1), len(months))
+
+    forecast = holt_forecast(matrix, first_active)
+    zscores, averages = anomaly_scores(matrix, first_active)
+    year_totals = matrix.sum(axis=1)
+
+    per_user = {}
+    for i, (user_id, category) in enumerate(series_keys):
+        per_user.setdefault(user_id, []).append({
+            "category": category,
+            "forecast": round(float(forecast[i]), 2),
+            "last_month": round(float(matrix[i, -1]), 2),
+            "average": round(float(averages[i]), 2),
+            "zscore": round(float(zscores[i]), 2),
+            "anomaly": bool(zscores[i] >= ANOMALY_Z),
+            "total": round(float(year_totals[i]), 2),
+        })
+
+    writes = []
+    for user_id, categories in per_user.items():
+        top = sorted(categories, key=lambda c: -c["total"])[:3]
+        writes.append(ReplaceOne({"_id": user_id}, {
+            "_id": user_id,
+            "generated_at": generated_at,
+            "months": [months[0], months[-1]],
+            "forecast_total": round(sum(c["forecast"] for c in categories), 2),
+            "top_categories": [{"category": c["category"], "total": c["total"]} for c in top],
+            "categories": categories,
+            "anomalies": [c["category"] for c in categories if c["anomaly"]],
+            "tips": build_tips(categories),
+        }, upsert=True))
+    if writes:
+        insights_collection.bulk_write(writes, ordered=False)
+    return len(writes)
+
+
+def run(months=12, chunk_users=2000, now=None):
+    now = now or datetime.utcnow()
+    keys = month_keys(now, months)
+    end_month = f"{now.year:04d}-{now.month:02d}"
+    started = time.time()
+
+    users_done = 0
+    chunk, chunk_user_count, current_user = [], 0, None
+    for row in monthly_rows(keys[0], end_month):
+        user_id = row["_id"]["u"]
+        if user_id != current_user:
+            if chunk_user_count >= chunk_users:
+                users_done += process_chunk(chunk, keys, now)
+                chunk, chunk_user_count = [], 0
+            current_user = user_id
+            chunk_user_count += 1
+        chunk.append((user_id, category_name(row["_id"]["c"]), row["_id"]["m"], row["total"]))
+    if chunk:
+        users_done += process_chunk(chunk, keys, now)
+
+    # Users with no expenses in the window any more
+    stale = insights_collection.delete_many({"generated_at": {"$lt": now}}).deleted_count
+
+    print(f"Insights for {users_done} users ({stale} stale removed) in {time.time() - started:.1f}s")
+    return users_done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--chunk-users", type=int, default=2000)
+    args = parser.parse_args()
+    run(months=args.months, chunk_users=args.chunk_users)
@@ -0,0 +1,52 @@
+# json_provider.py
+"""
+orjson-based JSON encoding for both apps, aware of BSON types.
+
+- ObjectId -> its hex string
+- datetime / date -> ISO 8601 (naive datetimes are UTC, as everything is
+  stored with utcnow)
+- Decimal128 / Decimal -> float
+
+Flask:   app.json = ORJSONProvider(app)  (jsonify() then uses it)
+FastAPI: a JSONResponse whose render() is dumps_bytes (see currency_converter)
+"""
+
+from decimal import Decimal
+
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+
+OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=default, option=OPTIONS)
+
+
+class ORJSONProvider(JSONProvider):
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the base implementation
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Sequence, Union
 import csv
 import math
 
@@ -188,6 +188,216 @@ def compare_loans(loans: List[Dict[str, Any]]) -> List[LoanResult]:
     return results
 
 
+# -------------------------------
+# Variable-rate loans
+# -------------------------------
+# Between two rate resets the rate and EMI are fixed, so the balance after
+# k months has a closed form:
+#
+#     B_k = B_0 * (1 + r)^k - EMI * ((1 + r)^k - 1) / r
+#
+# and so does the number of months an EMI needs to clear a balance:
+#
+#     n = -ln(1 - r * B_0 / EMI) / ln(1 + r)
+#
+# Each segment is therefore O(1) to evaluate. Monthly rows are only
+# produced when LoanSegment.rows() / VariableRateResult.schedule is iterated.
+
+EMI_POLICY = "emi"        # keep the end date, recompute the EMI at the reset
+TENURE_POLICY = "tenure"  # keep the EMI, recompute the remaining months
+
+
+@dataclass
+class RateReset:
+    month: int                    # first month (1-based) charged at the new rate
+    annual_rate: float
+    policy: Optional[str] = None  # EMI_POLICY / TENURE_POLICY; None = the loan's default
+
+
+@dataclass
+class LoanSegment:
+    start_month: int
+    months: int
+    annual_rate: float
+    emi: float
+    opening_balance: float
+    closing_balance: float
+    interest: float
+    principal: float
+
+    def rows(self) -> Iterator[AmortizationRow]:
+        """Monthly rows of this segment, computed on demand."""
+        r = self.annual_rate / 12.0 / 100.0
+        balance = self.opening_balance
+        for i in range(self.months):
+            interest = balance * r
+            # Last month of the loan: pay off whatever is left
+            principal = min(self.emi - interest, balance)
+            balance -= principal
+            if balance < 0.01 or (i == self.months - 1 and self.closing_balance == 0.0):
+                balance = 0.0
+            yield AmortizationRow(
+                month=self.start_month + i,
+                interest=round(interest, 2),
+                principal=round(principal, 2),
+                extra_payment=0.0,
+                total_payment=round(principal + interest, 2),
+                balance=round(balance, 2),
+            )
+
+
+@dataclass
+class VariableRateResult:
+    loan_amount: float
+    months: int              # original tenure
+    total_interest: float
+    total_payment: float
+    months_taken: int
+    segments: List[LoanSegment]
+
+    # Same names as LoanResult, so export_schedule_to_csv() works on both
+    @property
+    def annual_rate(self) -> float:
+        return self.segments[0].annual_rate
+
+    @property
+    def emi(self) -> float:
+        return round(self.segments[0].emi, 2)
+
+    @property
+    def schedule(self) -> Iterator[AmortizationRow]:
+        for segment in self.segments:
+            yield from segment.rows()
+
+    def balance_after(self, month: int) -> float:
+        """Outstanding balance after `month` payments, without building rows."""
+        for segment in self.segments:
+            if month < segment.start_month + segment.months:
+                k = max(month - segment.start_month + 1, 0)
+                if k == segment.months:
+                    # The last payment of the loan is whatever is left, not a full EMI
+                    return segment.closing_balance
+                balance = _balance_after(segment.opening_balance, segment.annual_rate, segment.emi, k)
+                return round(balance, 2) if balance >= 0.01 else 0.0
+        return 0.0
+
+
+def _balance_after(balance: float, annual_rate: float, emi: float, k: int) -> float:
+    r = annual_rate / 12.0 / 100.0
+    if r == 0:
+        return balance - emi * k
+    growth = (1 + r) ** k
+    return balance * growth - emi * (growth - 1) / r
+
+
+def _segment_interest(balance: float, annual_rate: float, emi: float, k: int) -> float:
+    """Interest over a final segment of k months whose last payment clears the balance."""
+    # k - 1 full EMIs, then a last payment of whatever is left plus its interest
+    r = annual_rate / 12.0 / 100.0
+    before_last = _balance_after(balance, annual_rate, emi, k - 1)
+    return emi * (k - 1) - (balance - before_last) + before_last * r
+
+
+def _months_to_clear(balance: float, annual_rate: float, emi: float) -> Optional[int]:
+    """None when `emi` doesn't even cover the first month's interest."""
+    r = annual_rate / 12.0 / 100.0
+    if r == 0:
+        return math.ceil(balance / emi - 1e-9)
+    if emi <= balance * r:
+        return None
+    return math.ceil(-math.log(1 - r * balance / emi) / math.log(1 + r) - 1e-9)
+
+
+def _as_reset(item: Union[RateReset, Dict[str, Any], Sequence]) -> RateReset:
+    if isinstance(item, RateReset):
+        return item
+    if isinstance(item, dict):
+        return RateReset(int(item["month"]), float(item["annual_rate"]), item.get("policy"))
+    return RateReset(int(item[0]), float(item[1]), *(item[2:3]))
+
+
+def generate_variable_rate_schedule(
+    loan_amount: float,
+    annual_rate: float,
+    resets: Sequence[Union[RateReset, Dict[str, Any], Sequence]] = (),
+    years: Optional[int] = None,
+    months: Optional[int] = None,
+    policy: str = EMI_POLICY,
+) -> VariableRateResult:
+    """
+    Schedule for a floating-rate loan, evaluated segment by segment.
+
+    - annual_rate: rate from month 1
+    - resets: RateReset, {"month", "annual_rate", "policy"} dicts or
+      (month, annual_rate[, policy]) tuples; month is when the new rate starts
+    - policy: what a reset changes by default, EMI_POLICY or TENURE_POLICY.
+      A TENURE_POLICY reset whose rate the current EMI can't keep up with
+      (EMI <= monthly interest) recomputes the EMI instead.
+
+    Resets after the loan is paid off are ignored. Prepayments are only
+    supported by generate_amortization_schedule().
+    """
+    if months is None:
+        if years is None:
+            raise ValueError("Either years or months must be provided")
+        months = years * 12
+
+    if months <= 0:
+        raise ValueError("Tenure (months) must be > 0")
+
+    timeline = sorted((_as_reset(x) for x in resets), key=lambda x: x.month)
+    for reset in timeline:
+        if reset.month < 2:
+            raise ValueError("Rate resets must start at month 2 or later (use annual_rate for month 1)")
+        if (reset.policy or policy) not in (EMI_POLICY, TENURE_POLICY):
+            raise ValueError(f"Unknown reset policy: {reset.policy or policy!r}")
+
+    balance = float(loan_amount)
+    rate = float(annual_rate)
+    emi = calculate_loan_emi(balance, rate, months=months)
+    end_month = months  # last month of the loan under the current terms
+    start = 1
+    segments: List[LoanSegment] = []
+    pending = iter(timeline)
+    reset = next(pending, None)
+
+    while balance > 0:
+        # This segment runs until the next reset or until the loan ends
+        last = end_month if reset is None or reset.month > end_month else reset.month - 1
+        k = last - start + 1
+        if k > 0:
+            closing = _balance_after(balance, rate, emi, k)
+            if last == end_month or closing < 0.01:
+                closing = 0.0
+            principal = balance - closing
+            interest = (emi * k - principal) if last < end_month else _segment_interest(balance, rate, emi, k)
+            segments.append(LoanSegment(start, k, rate, emi, balance, closing, interest, principal))
+            balance = closing
+            start = last + 1
+        if balance <= 0 or reset is None:
+            break
+
+        rate = reset.annual_rate
+        remaining = None
+        if (reset.policy or policy) == TENURE_POLICY:
+            remaining = _months_to_clear(balance, rate, emi)
+        if remaining is None:
+            emi = calculate_loan_emi(balance, rate, months=end_month - start + 1)
+        else:
+            end_month = start - 1 + remaining
+        reset = next(pending, None)
+
+    total_interest = sum(seg.interest for seg in segments)
+    return VariableRateResult(
+        loan_amount=float(loan_amount),
+        months=months,
+        total_interest=round(total_interest, 2),
+        total_payment=round(float(loan_amount) + total_interest, 2),
+        months_taken=segments[-1].start_month + segments[-1].months - 1 if segments else 0,
+        segments=segments,
+    )
+
+
 def export_schedule_to_csv(result: LoanResult, filename: str) -> None:
     """
     Export amortization schedule to a CSV file (Excel-compatible).
@@ -0,0 +1,126 @@
+# normalize_expenses.py
+"""
+Backfill base-currency amounts on existing expenses.
+
+    python normalize_expenses.py                 # every expense without amount_base
+    python normalize_expenses.py --user <uid>    # re-normalize one user (after a base-currency change)
+
+Expenses are read in _id order and rewritten with batched bulk_write
+calls, using one snapshot of the shared rate table for the whole run.
+The selection only matches documents that still need work, so an
+interrupted run can simply be started again.
+
+Every batch bumps the touched users' "expenses" version (cached
+summaries revalidate) and drops their running budget totals, which
+budget_alerts reseeds from the new amounts. An expense whose currency
+has no known rate loses a base amount in a previous base currency: it
+is then left out of totals (and counted as unconverted) rather than
+summed in the wrong currency. POST /api/expense/base_currency runs
+`normalize(user_query(uid), ...)` itself.
+"""
+
+import argparse
+import time
+
+from pymongo import UpdateOne
+
+from db import expense_collection, users_collection
+import rate_table
+from budget_alerts import reset_spent
+from expense_schema import from_minor, to_minor
+from versions import bump_version
+
+PROJECTION = {"user_id": 1, "amount_minor": 1, "amount": 1, "currency": 1, "base_currency": 1}
+# Neither a compact nor a legacy base amount yet
+NOT_NORMALIZED = {"amount_base_minor": None, "amount_base": None}
+
+
+def base_currencies(user_ids):
+    found = {
+        u["uid"]: u.get("base_currency")
+        for u in users_collection.find({"uid": {"$in": list(user_ids)}}, {"uid": 1, "base_currency": 1})
+    }
+    return {uid: found.get(uid) or rate_table.DEFAULT_BASE_CURRENCY for uid in user_ids}
+
+
+def normalize_batch(docs, table):
+    bases = base_currencies({d["user_id"] for d in docs})
+    writes = []
+    users = set()
+    skipped = 0
+    for d in docs:
+        base = bases[d["user_id"]]
+        compact = d.get("amount_minor") is not None
+        amount = from_minor(d["amount_minor"]) if compact else float(d.get("amount") or 0)
+        amount_base, rate = rate_table.normalize_amount(amount, d.get("currency") or "$", base, table)
+        if amount_base is None:
+            skipped += 1
+            if d.get("base_currency") not in (None, base):
+                # Don't keep summing it in the old base currency
+                writes.append(UpdateOne(
+                    {"_id": d["_id"]},
+                    {"$set": {"base_currency": base, "fx_rate": None},
+                     "$unset": {"amount_base_minor": "", "amount_base": ""}},
+                ))
+                users.add(d["user_id"])
+            continue
+        field, value = ("amount_base_minor", to_minor(amount_base)) if compact else ("amount_base", amount_base)
+        writes.append(UpdateOne(
+            {"_id": d["_id"]},
+            {"$set": {field: value, "base_currency": base, "fx_rate": rate}},
+        ))
+        users.add(d["user_id"])
+    if writes:
+        expense_collection.bulk_write(writes, ordered=False)
+        reset_spent(users)
+        for user_id in users:
+            bump_version(user_id, "expenses")
+    return len(docs) - skipped, skipped
+
+
+def user_query(user_id):
+    """One user's expenses not yet in their current base currency."""
+    base = base_currencies([user_id])[user_id]
+    return {"user_id": user_id, "$or": [NOT_NORMALIZED, {"base_currency": {"$ne": base}}]}
+
+
+def normalize(query, table, batch_size=1000, progress=None):
+    """Normalize every expense matching `query`; returns (updated, skipped)."""
+    updated = skipped = 0
+    batch = []
+    for doc in expense_collection.find(query, PROJECTION).sort("_id", 1).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            u, s = normalize_batch(batch, table)
+            updated, skipped = updated + u, skipped + s
+            batch = []
+            if progress:
+                progress(updated, skipped)
+    if batch:
+        u, s = normalize_batch(batch, table)
+        updated, skipped = updated + u, skipped + s
+    return updated, skipped
+
+
+def run(user_id=None, batch_size=1000):
+    table = rate_table.get_table()
+    if table is None:
+        raise SystemExit("No exchange rates available; try again when the upstream is reachable.")
+
+    query = user_query(user_id) if user_id else dict(NOT_NORMALIZED)
+    started = time.time()
+    updated, skipped = normalize(
+        query, table, batch_size,
+        progress=lambda u, s: print(f"  normalized {u} (skipped {s})"),
+    )
+    print(f"Done: {updated} expenses normalized, {skipped} without a known rate, "
+          f"{time.time() - started:.1f}s")
+    return updated, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="only this user's expenses")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    run(user_id=args.user, batch_size=args.batch_size)
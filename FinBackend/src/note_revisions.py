@@ -0,0 +1,180 @@
+# note_revisions.py
+"""
+Text deltas for note updates and compressed revision history.
+
+A delta is a JSON list of operations over the base text, in order:
+
+    [12, -3, "new words", 40]
+
+- a positive int keeps that many characters,
+- a negative int deletes that many,
+- a string inserts it.
+
+Whatever follows the last operation is kept. Counts are in Unicode code
+points (Python str indices), not UTF-16 units. Clients send a delta with
+the revision it was made against; the server applies it only if the
+note is still at that revision.
+
+History lives in `note_revisions`, one document per revision:
+
+    {uid, note_id, revision, base, kind: "snapshot" | "delta",
+     data: zlib(UTF-8 text or delta JSON), size, createdAt}
+
+Revision 1 and every NOTE_SNAPSHOT_EVERY-th revision after it store the
+full text; the rest store the delta from the previous revision. `base`
+is the snapshot a revision's chain starts from, so rebuilding revision N
+is one query: the snapshot plus at most NOTE_SNAPSHOT_EVERY - 1 deltas.
+
+The note document follows the same cadence, so an autosave writes the
+size of its edit rather than the whole note: `content` is the text at
+the last snapshot revision and `deltas` the edits saved since, which
+`note_update()` appends to and `note_content()` replays. Notes saved
+before this have no `deltas`, and their `content` is current.
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime
+
+from repository import repository
+
+NOTE_SNAPSHOT_EVERY = int(os.getenv("NOTE_SNAPSHOT_EVERY", 20))
+MAX_DELTA_OPS = int(os.getenv("NOTE_MAX_DELTA_OPS", 1000))
+
+revisions = repository("note_revisions", user_field="uid", indexes=("note_id", "base"))
+
+
+class DeltaError(ValueError):
+    pass
+
+
+# -------------------------------
+# Deltas
+# -------------------------------
+def apply_delta(text, delta):
+    if not isinstance(delta, list) or len(delta) > MAX_DELTA_OPS:
+        raise DeltaError(f"Patch must be a list of at most {MAX_DELTA_OPS} operations")
+    parts = []
+    pos = 0
+    for op in delta:
+        if isinstance(op, bool) or not isinstance(op, (int, str)):
+            raise DeltaError(f"Invalid operation {op!r}")
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            if pos + op > len(text):
+                raise DeltaError("Patch keeps past the end of the note")
+            parts.append(text[pos:pos + op])
+            pos += op
+        elif op < 0:
+            if pos - op > len(text):
+                raise DeltaError("Patch deletes past the end of the note")
+            pos -= op
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def diff(old, new):
+    """Delta from `old` to `new`: common prefix and suffix kept, the middle replaced."""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    delta = [prefix] if prefix else []
+    if len(old) - prefix - suffix:
+        delta.append(-(len(old) - prefix - suffix))
+    if len(new) - prefix - suffix:
+        delta.append(new[prefix:len(new) - suffix])
+    return delta
+
+
+# -------------------------------
+# Storage
+# -------------------------------
+def _pack(value):
+    return zlib.compress(value.encode("utf-8"))
+
+
+def _unpack(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def snapshot_base(revision):
+    return revision - (revision - 1) % NOTE_SNAPSHOT_EVERY
+
+
+def revision_doc(uid, note_id, revision, content, delta, now=None):
+    """History entry for `revision`: the full `content` at snapshot revisions, else `delta`."""
+    base = snapshot_base(revision)
+    if revision == base:
+        kind, raw = "snapshot", content
+    else:
+        kind, raw = "delta", json.dumps(delta, separators=(",", ":"), ensure_ascii=False)
+    data = _pack(raw)
+    return {
+        "uid": uid,
+        "note_id": str(note_id),
+        "revision": revision,
+        "base": base,
+        "kind": kind,
+        "data": data,
+        "size": len(data),
+        "createdAt": now or datetime.utcnow(),
+    }
+
+
+def note_content(note):
+    """Current text of a note document: its stored text plus the deltas saved since."""
+    text = note.get("content") or ""
+    for delta in note.get("deltas") or ():
+        text = apply_delta(text, delta)
+    return text
+
+
+def note_update(revision, content, delta):
+    """(fields to set, arrays to push) on the note document when saving `revision`."""
+    if revision == snapshot_base(revision):
+        return {"content": content, "deltas": [], "revision": revision}, None
+    return {"revision": revision}, {"deltas": delta}
+
+
+def record(docs):
+    """Store history entries in one write."""
+    if len(docs) == 1:
+        revisions.insert(docs[0])
+    elif docs:
+        revisions.insert_many(docs)
+
+
+def content_at(uid, note_id, revision):
+    """Text of the note at `revision`, or None if that revision isn't stored."""
+    base = snapshot_base(revision)
+    chain = revisions.find_by_user(uid, where={"note_id": str(note_id), "base": base}, sort=[("revision", 1)])
+    if not chain or chain[0]["revision"] != base or chain[0]["kind"] != "snapshot":
+        return None
+    text = _unpack(chain[0]["data"])
+    expected = base + 1
+    for doc in chain[1:]:
+        if doc["revision"] > revision:
+            break
+        if doc["revision"] != expected:
+            return None  # a gap in the chain
+        text = apply_delta(text, json.loads(_unpack(doc["data"])))
+        expected += 1
+    return text if expected > revision else None
+
+
+def list_revisions(uid, note_id):
+    docs = revisions.find_by_user(uid, where={"note_id": str(note_id)}, sort=[("revision", -1)])
+    return [
+        {"revision": d["revision"], "kind": d["kind"], "size": d["size"], "createdAt": d["createdAt"]}
+        for d in docs
+    ]
+
+
+def delete_history(uid, note_id):
+    return revisions.delete_many(uid, where={"note_id": str(note_id)})
@@ -1,11 +1,17 @@
 from flask import Blueprint, request, jsonify
-from firebase_admin import auth
-from db import notes_collection
+from firebase_admin_setup import verify_id_token
+from resilience import DependencyUnavailable
+from repository import repository
+from bson.errors import InvalidId
+import note_revisions
 from datetime import datetime
-from bson import ObjectId
+from versions import bump_version, current_etag, not_modified, with_etag
+from db_budget import db_budget
 
 notes_api = Blueprint("notes_api", __name__)
 
+notes = repository("notes", user_field="uid", indexes=("createdAt",))
+
 # 🔐 Helper: verify Firebase token
 def verify_user(request):
     token = request.headers.get("Authorization")
@@ -13,14 +19,26 @@ def verify_user(request):
         return None
 
     try:
-        decoded = auth.verify_id_token(token.replace("Bearer ", ""))
+        decoded = verify_id_token(token.replace("Bearer ", ""))
         return decoded["uid"]
+    except DependencyUnavailable:
+        raise
     except Exception:
         return None
 
 
+def client_note(note):
+    """A note document as clients see it: current content, no stored deltas."""
+    if note is None:
+        return None
+    note = dict(note, content=note_revisions.note_content(note))
+    note.pop("deltas", None)
+    return note
+
+
 # 📝 Add new note
 @notes_api.route("/add", methods=["POST"])
+@db_budget(round_trips=2)
 def add_note():
     uid = verify_user(request)
     if not uid:
@@ -32,88 +50,168 @@ def add_note():
         "content": data.get("content", ""),
         "createdAt": datetime.utcnow(),
         "updatedAt": datetime.utcnow(),
+        "revision": 1,
     }
 
-    result = notes_collection.insert_one(note)
+    notes.insert(note)
+    bump_version(uid, "notes")
 
-    # ✅ return saved note with id
-    note["_id"] = str(result.inserted_id)
+    # ✅ return saved note with id (insert_one sets note["_id"])
     return jsonify(note)
 
 
 # 📥 Get ALL notes (IMPORTANT FIX)
 @notes_api.route("", methods=["GET"])
+@db_budget(round_trips=2)
 def get_all_notes():
     uid = verify_user(request)
     if not uid:
         return jsonify({"error": "Unauthorized"}), 401
 
-    notes = list(
-        notes_collection.find(
-            {"uid": uid},
-            sort=[("createdAt", -1)]
-        )
-    )
+    etag = current_etag(uid, "notes", scope="notes")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return with_etag(jsonify([client_note(n) for n in notes.iter_by_user(uid, sort=[("createdAt", -1)])]), etag)
 
-    for n in notes:
-        n["_id"] = str(n["_id"])
 
-    return jsonify(notes)
+def latest_note(uid):
+    found = notes.find_by_user(uid, sort=[("createdAt", -1)], limit=1)
+    return client_note(found[0]) if found else None
 
 
 # 📥 Get latest note (unchanged)
 @notes_api.route("/latest", methods=["GET"])
+@db_budget(round_trips=2)
 def get_latest_note():
     uid = verify_user(request)
     if not uid:
         return jsonify({"error": "Unauthorized"}), 401
 
-    note = notes_collection.find_one(
-        {"uid": uid},
-        sort=[("createdAt", -1)]
-    )
+    etag = current_etag(uid, "notes", scope="notes_latest")
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    if note:
-        note["_id"] = str(note["_id"])
+    return with_etag(jsonify(latest_note(uid) or {}), etag)
 
-    return jsonify(note or {})
 
-
-# ✏️ Update note (FIXED)
+# ✏️ Update note
+# Body: {"id", "patch": delta, "base_revision": n} (see note_revisions.py),
+# or {"id", "content": full text[, "base_revision": n]}. Notes saved
+# before revisions existed are at revision 1.
 @notes_api.route("/update", methods=["PUT"])
+@db_budget(round_trips=4)  # note, compare-and-set, history, version
 def update_note():
     uid = verify_user(request)
     if not uid:
         return jsonify({"error": "Unauthorized"}), 401
 
-    data = request.json
+    data = request.json or {}
     note_id = data.get("id")
+    if not note_id:
+        return jsonify({"error": "id is required"}), 400
+    patch = data.get("patch")
+    base_revision = data.get("base_revision")
+    if patch is None and not isinstance(data.get("content"), str):
+        return jsonify({"error": "Send either patch + base_revision or content"}), 400
+    if patch is not None and base_revision is None:
+        return jsonify({"error": "base_revision is required with a patch"}), 400
+    if base_revision is not None and (isinstance(base_revision, bool) or not isinstance(base_revision, int)):
+        return jsonify({"error": "base_revision must be an integer"}), 400
 
-    notes_collection.update_one(
-        {"_id": ObjectId(note_id), "uid": uid},
-        {
-            "$set": {
-                "content": data.get("content"),
-                "updatedAt": datetime.utcnow()
-            }
-        }
-    )
+    try:
+        note = notes.get(uid, note_id)
+    except InvalidId:
+        note = None
+    if not note:
+        return jsonify({"error": "Note not found"}), 404
+
+    current = note.get("revision", 1)
+    if base_revision is not None and base_revision != current:
+        return jsonify({"error": "Note has changed", "revision": current}), 409
+
+    old = note_revisions.note_content(note)
+    if patch is not None:
+        try:
+            content = note_revisions.apply_delta(old, patch)
+        except note_revisions.DeltaError as e:
+            return jsonify({"error": str(e)}), 400
+        delta = patch
+    else:
+        content = data["content"]
+        delta = note_revisions.diff(old, content)
+
+    now = datetime.utcnow()
+    revision = current + 1
+    # Only the delta is written, except at snapshot revisions
+    fields, push = note_revisions.note_update(revision, content, delta)
+    # Compare-and-set: a save that raced us since the read gets a 409
+    if not notes.update(uid, note_id, {**fields, "updatedAt": now}, push=push,
+                        where={"revision": note.get("revision")}):
+        return jsonify({"error": "Note has changed"}), 409
+
+    history = [note_revisions.revision_doc(uid, note_id, revision, content, delta, now)]
+    if current == 1:
+        # First edit: revision 1 was never stored
+        history.insert(0, note_revisions.revision_doc(uid, note_id, 1, old, None, note.get("createdAt")))
+    note_revisions.record(history)
+    bump_version(uid, "notes")
+
+    return jsonify({"message": "Note updated", "revision": revision})
+
+
+# 🕘 Revision history
+@notes_api.route("/<note_id>/revisions", methods=["GET"])
+@db_budget(round_trips=1)
+def get_note_revisions(note_id):
+    uid = verify_user(request)
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify({"id": note_id, "revisions": note_revisions.list_revisions(uid, note_id)})
 
-    return jsonify({"message": "Note updated"})
+
+@notes_api.route("/<note_id>/revisions/<int:revision>", methods=["GET"])
+@db_budget(round_trips=2)  # history, then the note for a never-edited revision 1
+def get_note_revision(note_id, revision):
+    uid = verify_user(request)
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    content = note_revisions.content_at(uid, note_id, revision) if revision >= 1 else None
+    if content is None and revision == 1:
+        # History starts at the first edit; until then the note is revision 1
+        try:
+            note = notes.get(uid, note_id)
+        except InvalidId:
+            note = None
+        if note and note.get("revision", 1) == 1:
+            content = note_revisions.note_content(note)
+    if content is None:
+        return jsonify({"error": "Revision not found"}), 404
+    return jsonify({"id": note_id, "revision": revision, "content": content})
 
 
 # 🗑 Delete note (FIXED)
 @notes_api.route("/delete", methods=["DELETE"])
+@db_budget(round_trips=3)
 def delete_note():
     uid = verify_user(request)
     if not uid:
         return jsonify({"error": "Unauthorized"}), 401
 
-    data = request.json
+    data = request.json or {}
     note_id = data.get("id")
+    if not note_id:
+        return jsonify({"error": "id is required"}), 400
 
-    notes_collection.delete_one(
-        {"_id": ObjectId(note_id), "uid": uid}
-    )
+    try:
+        notes.delete(uid, note_id)
+    except InvalidId:
+        return jsonify({"error": "Note not found"}), 404
+    note_revisions.delete_history(uid, note_id)
+    bump_version(uid, "notes")
 
-    return jsonify({"message": "Note deleted"})
\ No newline at end of file
+    return jsonify({"message": "Note deleted"})
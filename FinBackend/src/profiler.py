@@ -0,0 +1,360 @@
+# profiler.py
+"""
+Opt-in stack-sampling profiler for single requests.
+
+A request is profiled when either:
+
+- it carries `X-Profile: 1` and a token whose uid is in ADMIN_UIDS, or
+- random() < PROFILE_SAMPLE_RATE (default 0: off).
+
+While a profiled request runs, one sampler thread per process reads the
+handling thread's stack from sys._current_frames() every
+PROFILE_INTERVAL_SECONDS. The request itself runs no tracing hooks. While
+the handler runs pure-Python code without releasing the GIL, samples
+can't be taken more often than sys.getswitchinterval() (5 ms by
+default). The same thread writes each finished profile, so the disk
+I/O stays off the request. Profiles are collapsed stacks, one line per
+unique stack:
+
+    app.wsgi_app (app.py:1);...;get_summary (expense_tracker_api.py:171) 42
+
+This is the input format of flamegraph.pl, speedscope and inferno.
+Profiles go to PROFILE_DIR, shared by every worker process, and only
+the newest PROFILE_KEEP are kept.
+
+Admin routes (ADMIN_UIDS only) on the Flask app:
+
+    GET /api/admin/profiles          newest first, metadata only
+    GET /api/admin/profiles/<id>     the collapsed stacks as text/plain
+
+Unprofiled requests pay one header lookup and, with a sample rate set,
+one random() call.
+
+FastAPI: async handlers run on the event loop thread, so their samples
+also include whatever other requests the loop ran meanwhile. Work
+offloaded with run_in_threadpool is not sampled.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+import metrics
+
+logger = logging.getLogger("profiler")
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.005))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 200))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"),
+)
+ADMIN_UIDS = {u.strip() for u in os.getenv("ADMIN_UIDS", "").split(",") if u.strip()}
+
+PROFILE_HEADER = "X-Profile"
+MAX_DEPTH = 200
+
+PROFILES = metrics.counter(
+    "nexwise_profiles_total",
+    "Requests profiled, by trigger.",
+    ("app", "trigger"),
+)
+
+
+# -------------------------------
+# Sampling
+# -------------------------------
+_labels = {}  # code object -> "func (file.py:line)"
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _labels[code] = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _stack(frame):
+    codes = []
+    while frame is not None and len(codes) < MAX_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(reversed(codes))
+
+
+class Session:
+    def __init__(self, thread_id, app, method, path, trigger):
+        now = time.time()
+        # Sortable by start time (to the millisecond), unique across processes
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now % 1 * 1000):03d}-{uuid.uuid4().hex[:8]}"
+        self.thread_id = thread_id
+        self.app = app
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.route = None
+        self.status = None
+        self.started = time.perf_counter()
+        self.started_at = now
+        self.stacks = Counter()   # tuple of code objects -> samples
+
+    def sample(self, frame):
+        self.stacks[_stack(frame)] += 1
+
+    def collapsed(self):
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(_label(code) for code in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def metadata(self, duration):
+        return {
+            "id": self.id,
+            "app": self.app,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": duration * 1000,
+            "samples": sum(self.stacks.values()),
+            "interval_ms": PROFILE_INTERVAL_SECONDS * 1000,
+            "pid": os.getpid(),
+        }
+
+
+class Sampler:
+    """One daemon thread per process; it sleeps on an Event while nothing is profiled."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid():
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def add(self, session):
+        with self._lock:
+            self._ensure_thread()
+            self._sessions[session.id] = session
+        self._wake.set()
+
+    def remove(self, session):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+
+    def finish(self, session):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+            self._finished.append((session, time.perf_counter() - session.started))
+        self._wake.set()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = list(self._sessions.values())
+                finished, self._finished = self._finished, []
+                if not sessions and not finished:
+                    self._wake.clear()
+            for session, duration in finished:
+                try:
+                    save(session, duration)
+                except OSError:
+                    logger.exception("Could not save profile %s", session.id)
+            if not sessions:
+                if not finished:
+                    self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for session in sessions:
+                frame = frames.get(session.thread_id)
+                if frame is not None and session.thread_id != me:
+                    session.sample(frame)
+                if now - session.started > PROFILE_MAX_SECONDS:
+                    self.remove(session)
+            del frames
+            time.sleep(PROFILE_INTERVAL_SECONDS)
+
+
+_sampler = Sampler()
+
+
+def start(app, method, path, trigger):
+    session = Session(threading.get_ident(), app, method, path, trigger)
+    _sampler.add(session)
+    PROFILES.inc(app=app, trigger=trigger)
+    return session
+
+
+def finish(session, route=None, status=None):
+    session.route = route
+    session.status = status
+    _sampler.finish(session)
+
+
+# -------------------------------
+# Storage (PROFILE_DIR/<id>.collapsed + <id>.json)
+# -------------------------------
+def save(session, duration):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, session.id)
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        f.write(session.collapsed())
+    tmp = f"{base}.json.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(session.metadata(duration), f)
+    os.replace(tmp, base + ".json")  # listed only once both files exist
+    _prune()
+
+
+def _prune():
+    names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for name in names[:-PROFILE_KEEP] if len(names) > PROFILE_KEEP else []:
+        for suffix in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + suffix))
+            except OSError:
+                pass
+
+
+def list_profiles(limit=50):
+    try:
+        names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    out = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def load_collapsed(profile_id):
+    # Ids come from the URL: only accept what Session generates
+    if not profile_id or any(c not in "0123456789abcdef-" for c in profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, profile_id + ".collapsed"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# -------------------------------
+# Triggers
+# -------------------------------
+def _is_admin(authorization):
+    if not ADMIN_UIDS or not authorization:
+        return False
+    from firebase_admin_setup import verify_token
+
+    decoded = verify_token(authorization.replace("Bearer ", ""))
+    return bool(decoded) and decoded.get("uid") in ADMIN_UIDS
+
+
+def trigger_for(headers):
+    """"header", "sampled" or None. Cheap unless the profile header is present."""
+    if headers.get(PROFILE_HEADER) == "1" and _is_admin(headers.get("Authorization")):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+# -------------------------------
+# Flask
+# -------------------------------
+def init_flask_profiling(app, app_name="flask"):
+    from flask import Response, abort, g, jsonify, request
+
+    @app.before_request
+    def _profile_start():
+        trigger = trigger_for(request.headers)
+        if trigger:
+            g._profile = start(app_name, request.method, request.path, trigger)
+
+    @app.after_request
+    def _profile_status(response):
+        session = g.get("_profile")
+        if session is not None:
+            session.status = response.status_code
+            response.headers["X-Profile-Id"] = session.id
+        return response
+
+    @app.teardown_request
+    def _profile_finish(exc):
+        session = g.pop("_profile", None)
+        if session is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            finish(session, route=rule, status=session.status or 500)
+
+    def _require_admin():
+        if not _is_admin(request.headers.get("Authorization")):
+            abort(403)
+
+    @app.route("/api/admin/profiles", methods=["GET"])
+    def list_profiles_endpoint():
+        _require_admin()
+        limit = min(int(request.args.get("limit", 50)), PROFILE_KEEP)
+        return jsonify(list_profiles(limit)), 200
+
+    @app.route("/api/admin/profiles/<profile_id>", methods=["GET"])
+    def get_profile_endpoint(profile_id):
+        _require_admin()
+        body = load_collapsed(profile_id)
+        if body is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(body, content_type="text/plain; charset=utf-8", headers={
+            "Content-Disposition": f'attachment; filename="{profile_id}.collapsed"',
+        })
+
+
+# -------------------------------
+# FastAPI
+# -------------------------------
+def init_fastapi_profiling(app, app_name="fastapi"):
+    from fastapi import Request
+    from starlette.concurrency import run_in_threadpool
+
+    @app.middleware("http")
+    async def _profile_middleware(request: Request, call_next):
+        if request.headers.get(PROFILE_HEADER) == "1":
+            # The admin check verifies a Firebase token (and may fetch
+            # Google's certificates): keep it off the event loop
+            trigger = await run_in_threadpool(trigger_for, request.headers)
+        else:
+            trigger = trigger_for(request.headers)
+        if not trigger:
+            return await call_next(request)
+        session = start(app_name, request.method, request.url.path, trigger)
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Profile-Id"] = session.id
+            return response
+        finally:
+            route = request.scope.get("route")
+            finish(session, route=getattr(route, "path", "<unmatched>"), status=status)
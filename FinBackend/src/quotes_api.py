@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
 import random
+from db_budget import db_budget
 
 quotes_api = Blueprint("quotes_api", __name__)
 
@@ -20,7 +21,10 @@ QUOTES = [
     "Budgeting but make it aesthetic.",
 ]
 
+def daily_quote():
+    return random.choice(QUOTES)
+
 @quotes_api.route("/daily", methods=["GET"])
+@db_budget(round_trips=0)
 def get_daily_quote():
-    quote = random.choice(QUOTES)
-    return jsonify({ "quote": quote })
+    return jsonify({ "quote": daily_quote() })
@@ -0,0 +1,210 @@
+# rate_history.py
+"""
+Local store of daily exchange-rate snapshots (USD-based, like rate_table).
+
+    data/rate_history/rates.f64    float64 matrix, one row per day x MAX_CURRENCIES columns
+    data/rate_history/index.json   {"epoch": "YYYY-MM-DD", "days": n, "capacity": rows,
+                                    "currencies": ["AED", ...]}
+
+Row `i` holds the rates for `epoch + i` days and column `j` the currency
+`currencies[j]`, so a lookup is an index computation plus a read from
+the memory-mapped file. Gaps are forward-filled when a snapshot is
+written: every day between the last recorded day and the new one gets
+the last known rates, and a currency missing from a snapshot keeps its
+previous value. Days after the last snapshot resolve to the last
+snapshot.
+
+rate_table.refresh() records a snapshot for every upstream fetch.
+Writers replace index.json atomically after the data rows are flushed,
+so readers in other processes only ever see fully written rows. Every
+gunicorn worker and the uvicorn process may record, so a writer holds
+an exclusive flock on data/rate_history/.lock from reading the index to
+replacing it: two processes can't give two new currencies the same
+column or overwrite each other's `days`.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev servers run a single process
+    fcntl = None
+
+logger = logging.getLogger("rate_history")
+
+HISTORY_DIR = os.getenv(
+    "RATE_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rate_history"),
+)
+DATA_PATH = os.path.join(HISTORY_DIR, "rates.f64")
+INDEX_PATH = os.path.join(HISTORY_DIR, "index.json")
+LOCK_PATH = os.path.join(HISTORY_DIR, ".lock")
+
+MAX_CURRENCIES = 256   # columns reserved up front so new currencies never force a rewrite
+GROW_DAYS = 366        # rows added whenever the file runs out of space
+ROW_BYTES = MAX_CURRENCIES * 8
+
+_index = None          # parsed index.json
+_index_mtime = None
+_columns = {}          # currency code -> column
+_matrix = None         # read-only memmap
+_lock = threading.Lock()
+
+
+def parse_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def _open(mode, capacity):
+    return np.memmap(DATA_PATH, dtype=np.float64, mode=mode, shape=(capacity, MAX_CURRENCIES))
+
+
+def _load():
+    """(Re)open the index and matrix if another process has written since."""
+    global _index, _index_mtime, _columns, _matrix
+    try:
+        stat = os.stat(INDEX_PATH)
+    except OSError:
+        return None
+    mtime = (stat.st_mtime_ns, stat.st_size)
+    if mtime == _index_mtime:
+        return _index
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        matrix = _open("r", index["capacity"])
+    except (OSError, ValueError, KeyError):
+        logger.exception("Unreadable rate history in %s", HISTORY_DIR)
+        return None
+    _index, _index_mtime, _matrix = index, mtime, matrix
+    _columns = {code: i for i, code in enumerate(index["currencies"])}
+    return _index
+
+
+def _row_number(day):
+    index = _load()
+    if index is None or index["days"] == 0:
+        return None
+    offset = (day - parse_day(index["epoch"])).days
+    if offset < 0:
+        return None
+    return min(offset, index["days"] - 1)
+
+
+def cross_rate_on(from_code, to_code, day):
+    """Rate from `from_code` to `to_code` on `day` (None if not recorded)."""
+    if from_code == to_code:
+        return 1.0
+    row = _row_number(parse_day(day))
+    if row is None or from_code not in _columns or to_code not in _columns:
+        return None
+    values = _matrix[row]
+    rate_from, rate_to = values[_columns[from_code]], values[_columns[to_code]]
+    if np.isnan(rate_from) or np.isnan(rate_to) or rate_from == 0:
+        return None
+    return float(rate_to / rate_from)
+
+
+def table_on(day):
+    """{"date", "rates"} for `day` in rate_table's format, or None."""
+    day = parse_day(day)
+    row = _row_number(day)
+    if row is None:
+        return None
+    values = _matrix[row]
+    rates = {code: float(values[col]) for code, col in _columns.items() if not np.isnan(values[col])}
+    recorded = parse_day(_index["epoch"]) + timedelta(days=row)
+    return {"base": "USD", "date": recorded.isoformat(), "rates": rates}
+
+
+def latest_table():
+    """The last recorded snapshot (used when the upstream has never been reachable)."""
+    index = _load()
+    if index is None or index["days"] == 0:
+        return None
+    last = parse_day(index["epoch"]) + timedelta(days=index["days"] - 1)
+    table = table_on(last)
+    table["fetched_at"] = 0  # always stale, so rate_table keeps retrying the upstream
+    return table
+
+
+def _write_index(index):
+    tmp = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, INDEX_PATH)
+
+
+@contextmanager
+def _writer_lock():
+    """This process's threads, then the other processes sharing HISTORY_DIR."""
+    with _lock:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(LOCK_PATH, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def record_snapshot(day, rates):
+    """Store `rates` (USD-based) as the snapshot for `day`, forward-filling any gap."""
+    global _index_mtime
+    day = parse_day(day)
+    with _writer_lock():
+        # Always re-read: the mtime check can miss a write in the same tick
+        _index_mtime = None
+        index = _load()
+        if index is None:
+            index = {"epoch": day.isoformat(), "days": 0, "capacity": 0, "currencies": []}
+        index = dict(index, currencies=list(index["currencies"]))
+        columns = {code: i for i, code in enumerate(index["currencies"])}
+
+        for code in rates:
+            if code not in columns:
+                if len(columns) >= MAX_CURRENCIES:
+                    logger.warning("Rate history is full; not tracking %s", code)
+                    continue
+                columns[code] = len(columns)
+                index["currencies"].append(code)
+
+        row = (day - parse_day(index["epoch"])).days
+        if row < 0:
+            raise ValueError(f"{day} is before the first recorded day {index['epoch']}")
+
+        if row >= index["capacity"]:
+            capacity = row + GROW_DAYS
+            with open(DATA_PATH, "ab") as f:
+                f.truncate(capacity * ROW_BYTES)
+            index["capacity"] = capacity
+
+        matrix = _open("r+", index["capacity"])
+        days = index["days"]
+        if row >= days:
+            previous = matrix[days - 1].copy() if days else np.full(MAX_CURRENCIES, np.nan)
+            matrix[days:row + 1] = previous
+        for code, value in rates.items():
+            if code in columns:
+                matrix[row, columns[code]] = float(value)
+        matrix.flush()
+        del matrix
+
+        index["days"] = max(days, row + 1)
+        _write_index(index)
+        _index_mtime = None
+    return row
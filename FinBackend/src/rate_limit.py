@@ -0,0 +1,316 @@
+# rate_limit.py
+"""
+Per-route token-bucket rate limiting for the expensive endpoints.
+
+Every limited route has two buckets, one per uid and one per client IP.
+Each bucket is (capacity, refill per minute). A request must take a
+token from both, or it gets a 429 with Retry-After; a bucket that let
+it through gets its token back when the other one refuses.
+
+The uid bucket only applies to bearer tokens this process has already
+verified: firebase_admin_setup.verify_id_token records each verified
+token here (remember_verified), and the limiter looks the token up
+instead of paying for a Firebase verification itself. A token's first
+request, and any forged or expired token, is limited by IP alone, so
+claims copied into a forged token can't drain another user's bucket.
+
+Backends (RATE_LIMIT_BACKEND):
+
+- "memory" (default): per process. With N gunicorn workers, a client
+  effectively gets N times the limit.
+- "mongo": one document per bucket, updated atomically with an
+  update pipeline, so limits hold across workers and hosts. Idle
+  buckets expire through a TTL index. If Mongo errors, the limiter
+  fails open.
+
+Limits can be overridden with RATE_LIMIT_RULES, e.g.
+    {"chat": {"uid": [10, 10], "ip": [30, 30]}}
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from db import rate_limits_collection, register_index
+from metrics import counter
+
+logger = logging.getLogger("rate_limit")
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+VERIFIED_CACHE_SIZE = int(os.getenv("RATE_LIMIT_VERIFIED_CACHE_SIZE", 50_000))
+
+LIMITED = counter(
+    "nexwise_rate_limited_total",
+    "Requests rejected by the rate limiter.",
+    ("rule", "scope"),
+)
+BACKEND_ERRORS = counter(
+    "nexwise_rate_limit_backend_errors_total",
+    "Rate limiter backend failures (the request was let through).",
+    ("backend",),
+)
+
+
+class Rule:
+    def __init__(self, name, method, path, uid, ip, bytes_per_token=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.uid = uid                    # (capacity, refill per minute)
+        self.ip = ip
+        # Large uploads cost one extra token per this many bytes
+        self.bytes_per_token = bytes_per_token
+
+    def cost(self, content_length):
+        if not self.bytes_per_token or not content_length:
+            return 1
+        return 1 + int(content_length) // self.bytes_per_token
+
+
+RULES = [
+    Rule("chat", "POST", "/api/chat", uid=(10, 10), ip=(30, 30)),
+    Rule("convert", "POST", "/api/convert", uid=(60, 60), ip=(120, 120)),
+    Rule("add_expense", "POST", "/api/expense/add_expense", uid=(30, 30), ip=(60, 60),
+         bytes_per_token=1024 * 1024),
+]
+
+for _name, _override in json.loads(os.getenv("RATE_LIMIT_RULES", "{}")).items():
+    for _rule in RULES:
+        if _rule.name == _name:
+            _rule.uid = tuple(_override.get("uid", _rule.uid))
+            _rule.ip = tuple(_override.get("ip", _rule.ip))
+
+_rules_by_route = {(r.method, r.path): r for r in RULES}
+
+
+def rule_for(method, path):
+    return _rules_by_route.get((method, path.rstrip("/") or "/"))
+
+
+# -------------------------------
+# Request identity
+# -------------------------------
+# token digest -> (uid, exp), least recently verified first
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+def _token_key(token):
+    token = (token or "").replace("Bearer ", "").strip()
+    return hashlib.blake2b(token.encode(), digest_size=16).digest() if token else None
+
+
+def remember_verified(id_token, claims):
+    """Record a token Firebase has verified, so later requests can use its uid bucket."""
+    key = _token_key(id_token)
+    uid = claims.get("uid") or claims.get("user_id") or claims.get("sub")
+    if key is None or not uid:
+        return
+    with _verified_lock:
+        _verified[key] = (uid, claims.get("exp", 0))
+        _verified.move_to_end(key)
+        while len(_verified) > VERIFIED_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+
+def uid_from_authorization(header):
+    """uid of a bearer token this process has verified and that hasn't expired, else None."""
+    key = _token_key(header)
+    entry = _verified.get(key) if key is not None else None
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+
+def client_ip(remote_addr, forwarded_for):
+    if TRUST_PROXY and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return remote_addr or "unknown"
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class MemoryBackend:
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self._buckets = {}  # key -> [tokens, updated]
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key, capacity, per_second, cost, now):
+        """(allowed, seconds until `cost` tokens are available)."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * per_second)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                allowed, retry_after = True, 0.0
+            else:
+                bucket[0] = tokens
+                allowed, retry_after = False, (cost - tokens) / per_second
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return allowed, retry_after
+
+    def refund(self, key, capacity, cost):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(capacity, bucket[0] + cost)
+
+    def _prune(self, now):
+        # Buckets idle for an hour are full again; dropping them changes nothing
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for k in stale:
+            del self._buckets[k]
+
+
+class MongoBackend:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def take(self, key, capacity, per_second, cost, now):
+        refill = {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$ts", now]}]}]}, per_second]}
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, refill]}]},
+                    "ts": now,
+                }},
+                {"$set": {"ok": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$ok", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    "expires_at": datetime.utcnow() + timedelta(seconds=capacity / per_second),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["ok"]:
+            return True, 0.0
+        return False, (cost - doc["tokens"]) / per_second
+
+    def refund(self, key, capacity, cost):
+        self.collection.update_one(
+            {"_id": key}, [{"$set": {"tokens": {"$min": [capacity, {"$add": ["$tokens", cost]}]}}}]
+        )
+
+
+if BACKEND == "mongo":
+    register_index("rate_limits", [("expires_at", 1)], expireAfterSeconds=0)
+    _backend = MongoBackend(rate_limits_collection)
+else:
+    _backend = MemoryBackend()
+
+
+def check(rule, uid, ip, content_length=None, backend=None):
+    """None if the request may proceed, else seconds to wait before retrying."""
+    backend = backend or _backend
+    cost = rule.cost(content_length)
+    now = time.time()
+    buckets = [("ip", ip, rule.ip)]
+    if uid:
+        buckets.insert(0, ("uid", uid, rule.uid))
+
+    taken = []
+    for scope, ident, (capacity, per_minute) in buckets:
+        key, amount = f"{rule.name}:{scope}:{ident}", min(cost, capacity)
+        try:
+            allowed, retry_after = backend.take(key, capacity, per_minute / 60.0, amount, now)
+            if not allowed:
+                # A rejected request costs nothing: give back what earlier buckets took
+                for args in taken:
+                    backend.refund(*args)
+        except Exception:
+            logger.exception("Rate limit backend failed; letting the request through")
+            BACKEND_ERRORS.inc(backend=BACKEND)
+            return None
+        if not allowed:
+            LIMITED.inc(rule=rule.name, scope=scope)
+            return retry_after
+        taken.append((key, capacity, amount))
+    return None
+
+
+def _retry_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+# -------------------------------
+# Flask
+# -------------------------------
+def init_flask_rate_limits(app):
+    from flask import jsonify, request
+
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def _rate_limit():
+        rule = rule_for(request.method, request.path)
+        if rule is None:
+            return None
+        retry_after = check(
+            rule,
+            uid_from_authorization(request.headers.get("Authorization")),
+            client_ip(request.remote_addr, request.headers.get("X-Forwarded-For")),
+            request.content_length,
+        )
+        if retry_after is None:
+            return None
+        response = jsonify({"error": "Too many requests", "retry_after": math.ceil(retry_after)})
+        response.status_code = 429
+        response.headers["Retry-After"] = _retry_header(retry_after)
+        return response
+
+
+# -------------------------------
+# FastAPI
+# -------------------------------
+def init_fastapi_rate_limits(app):
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+    from starlette.concurrency import run_in_threadpool
+
+    if not ENABLED:
+        return
+
+    @app.middleware("http")
+    async def _rate_limit(request: Request, call_next):
+        rule = rule_for(request.method, request.url.path)
+        if rule is None:
+            return await call_next(request)
+
+        args = (
+            rule,
+            uid_from_authorization(request.headers.get("Authorization")),
+            client_ip(request.client.host if request.client else None, request.headers.get("X-Forwarded-For")),
+            request.headers.get("Content-Length"),
+        )
+        # The Mongo backend does blocking I/O; keep it off the event loop
+        retry_after = check(*args) if isinstance(_backend, MemoryBackend) else await run_in_threadpool(check, *args)
+        if retry_after is None:
+            return await call_next(request)
+        return JSONResponse(
+            {"detail": "Too many requests", "retry_after": math.ceil(retry_after)},
+            status_code=429,
+            headers={"Retry-After": _retry_header(retry_after)},
+        )
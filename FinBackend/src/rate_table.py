@@ -0,0 +1,191 @@
+# rate_table.py
+"""
+Locally cached exchange-rate table shared by the Flask app and the
+currency FastAPI app.
+
+Rates are stored relative to USD in a small JSON file next to this
+module, so every process (gunicorn workers, uvicorn) reads the same
+table and only one of them needs to hit the upstream when it goes
+stale. Cross rates are derived from the USD table.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from metrics import track_dependency
+import rate_history
+import resilience
+
+logger = logging.getLogger("rate_table")
+
+EXCHANGE_API_BASE = os.getenv("EXCHANGE_API_BASE", "https://api.exchangerate-api.com/v4/latest")
+REQUEST_TIMEOUT = float(os.getenv("RATE_TABLE_TIMEOUT_SECONDS", 8))
+PIVOT = "USD"
+
+CACHE_PATH = os.getenv(
+    "RATE_TABLE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rates_cache.json"),
+)
+TTL_SECONDS = int(os.getenv("RATE_TABLE_TTL_SECONDS", 3600))
+# After a failed refresh, keep serving the stale table for this long before retrying
+RETRY_AFTER_SECONDS = int(os.getenv("RATE_TABLE_RETRY_SECONDS", 60))
+
+DEFAULT_BASE_CURRENCY = os.getenv("DEFAULT_BASE_CURRENCY", "USD")
+
+# The web client sends currency symbols; accept those as well as ISO codes
+SYMBOL_TO_CODE = {
+    "$": "USD",
+    "₹": "INR",
+    "RS": "INR",
+    "€": "EUR",
+    "£": "GBP",
+    "¥": "JPY",
+    "₩": "KRW",
+    "฿": "THB",
+    "₺": "TRY",
+    "C$": "CAD",
+    "A$": "AUD",
+}
+
+def normalize_code(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    return SYMBOL_TO_CODE.get(value.upper(), SYMBOL_TO_CODE.get(value, value.upper()))
+
+
+_table = None          # {"date": ..., "rates": {...}, "fetched_at": epoch}
+_table_mtime = None
+_next_attempt = 0.0
+_lock = threading.Lock()
+
+
+def _read_cache_file():
+    global _table, _table_mtime
+    try:
+        mtime = os.path.getmtime(CACHE_PATH)
+    except OSError:
+        return
+    if mtime == _table_mtime:
+        return
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            _table = json.load(f)
+        _table_mtime = mtime
+    except (OSError, ValueError):
+        logger.exception("Unreadable rate cache %s", CACHE_PATH)
+
+
+def _write_cache_file(table):
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+    os.replace(tmp, CACHE_PATH)
+
+
+def fetch_latest():
+    """Fetch the USD table from the upstream (raises on failure, fast while its breaker is open)."""
+    with resilience.guard("exchangerate_api", REQUEST_TIMEOUT) as timeout:
+        with track_dependency("exchangerate_api", "latest"):
+            resp = requests.get(f"{EXCHANGE_API_BASE}/{PIVOT}", timeout=timeout)
+            resp.raise_for_status()
+            data = resp.json()
+    rates = data.get("rates") or {}
+    if not rates:
+        raise ValueError(f"No rates in upstream response: {str(data)[:300]}")
+    return {
+        "base": PIVOT,
+        "date": data.get("date"),
+        "rates": {k: float(v) for k, v in rates.items()},
+        "fetched_at": time.time(),
+    }
+
+
+def refresh():
+    global _table, _table_mtime
+    table = fetch_latest()
+    _write_cache_file(table)
+    _table = table
+    _table_mtime = os.path.getmtime(CACHE_PATH)
+    try:
+        rate_history.record_snapshot(table.get("date") or time.strftime("%Y-%m-%d", time.gmtime()), table["rates"])
+    except Exception:
+        logger.exception("Could not record rate history snapshot")
+    return table
+
+
+def get_table(allow_stale=True):
+    """
+    Current rate table, refreshing it when older than the TTL.
+    Without a cache file and with the upstream unavailable, falls back to
+    the last rate_history snapshot; returns None only if there is none.
+    """
+    global _next_attempt
+
+    _read_cache_file()
+    now = time.time()
+    fresh = _table is not None and now - _table.get("fetched_at", 0) < TTL_SECONDS
+    if fresh or now < _next_attempt:
+        if fresh:
+            return _table
+        if not allow_stale:
+            return None
+        return _table if _table is not None else rate_history.latest_table()
+
+    # Only one thread refreshes; the others serve the stale table rather
+    # than queue behind a slow upstream (or wait at most until their deadline)
+    if _table is not None and allow_stale:
+        acquired = _lock.acquire(blocking=False)
+    else:
+        acquired = _lock.acquire(timeout=max(resilience.timeout_for(REQUEST_TIMEOUT), 0))
+    if not acquired:
+        if not allow_stale:
+            return None
+        return _table if _table is not None else rate_history.latest_table()
+    try:
+        _read_cache_file()  # another process / thread may have refreshed it
+        if _table is not None and time.time() - _table.get("fetched_at", 0) < TTL_SECONDS:
+            return _table
+        try:
+            return refresh()
+        except resilience.DependencyUnavailable as e:
+            # Breaker open or this request out of time: no upstream call was made
+            logger.warning("Rate table refresh skipped (%s); serving last known rates", e)
+            if e.retry_after:
+                _next_attempt = time.time() + e.retry_after
+        except Exception:
+            logger.exception("Rate table refresh failed; serving last known rates")
+            _next_attempt = time.time() + RETRY_AFTER_SECONDS
+        if not allow_stale:
+            return None
+        return _table if _table is not None else rate_history.latest_table()
+    finally:
+        _lock.release()
+
+
+def cross_rate(from_code, to_code, table=None):
+    """Rate to multiply an amount in `from_code` by to get `to_code` (None if unknown)."""
+    from_code, to_code = normalize_code(from_code), normalize_code(to_code)
+    if from_code == to_code:
+        return 1.0
+    table = table or get_table()
+    if not table:
+        return None
+    rates = table["rates"]
+    if from_code not in rates or to_code not in rates:
+        return None
+    return rates[to_code] / rates[from_code]
+
+
+def normalize_amount(amount, currency, base_currency, table=None):
+    """(amount in base currency, rate used) — (None, None) when no rate is known."""
+    rate = cross_rate(currency, base_currency, table)
+    if rate is None:
+        return None, None
+    return round(amount * rate, 2), rate
@@ -0,0 +1,166 @@
+# recurrence.py
+"""
+Recurrence rules for recurring expenses (pure date math, no DB).
+
+A rule is a dict, one of:
+
+    {"freq": "daily",   "interval": 1}
+    {"freq": "weekly",  "interval": 1, "weekday": 0}        # 0 = Monday
+    {"freq": "monthly", "interval": 1, "day_of_month": 31}  # clamped to month end
+    {"cron": "1 * *"}                                       # day-of-month month day-of-week
+
+`cron` uses the date fields of a crontab line ("dom mon dow"); a full
+5-field line is accepted and its minute/hour fields are ignored.
+"""
+
+from __future__ import annotations
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Set
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+MAX_CRON_SCAN_DAYS = 366 * 5
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(p) for p in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or step < 1:
+            raise ValueError(f"cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_cron(expr: str) -> Dict[str, Set[int]]:
+    fields = expr.split()
+    if len(fields) == 5:
+        fields = fields[2:]
+    if len(fields) != 3:
+        raise ValueError("cron rule must be 'dom mon dow' (or a 5-field crontab line)")
+    dom, mon, dow = fields
+    return {
+        "dom": _parse_cron_field(dom, 1, 31),
+        "mon": _parse_cron_field(mon, 1, 12),
+        # crontab: 0 and 7 are Sunday; Python: Monday = 0
+        "dow": {(d - 1) % 7 for d in _parse_cron_field(dow, 0, 7)},
+        "dom_any": dom == "*",
+        "dow_any": dow == "*",
+    }
+
+
+def _cron_matches(spec, day: date) -> bool:
+    if day.month not in spec["mon"]:
+        return False
+    dom_ok = day.day in spec["dom"]
+    dow_ok = day.weekday() in spec["dow"]
+    # crontab semantics: if both day fields are restricted, either may match
+    if spec["dom_any"] or spec["dow_any"]:
+        return dom_ok and dow_ok
+    return dom_ok or dow_ok
+
+
+def validate_rule(rule: dict) -> dict:
+    """Return a cleaned copy of `rule` or raise ValueError."""
+    if not isinstance(rule, dict):
+        raise ValueError("rule must be an object")
+    if "cron" in rule:
+        parse_cron(str(rule["cron"]))
+        return {"cron": str(rule["cron"])}
+
+    freq = rule.get("freq")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"freq must be one of {', '.join(FREQUENCIES)}")
+    cleaned = {"freq": freq, "interval": int(rule.get("interval", 1))}
+    if cleaned["interval"] < 1:
+        raise ValueError("interval must be >= 1")
+    if freq == "weekly":
+        cleaned["weekday"] = int(rule.get("weekday", 0))
+        if not 0 <= cleaned["weekday"] <= 6:
+            raise ValueError("weekday must be 0 (Mon) - 6 (Sun)")
+    if freq == "monthly":
+        cleaned["day_of_month"] = int(rule.get("day_of_month", 1))
+        if not 1 <= cleaned["day_of_month"] <= 31:
+            raise ValueError("day_of_month must be 1-31")
+    return cleaned
+
+
+def _month_day(year: int, month: int, day_of_month: int) -> date:
+    return date(year, month, min(day_of_month, monthrange(year, month)[1]))
+
+
+def first_occurrence(rule: dict, start: date) -> Optional[date]:
+    """First date on or after `start` that the rule fires."""
+    if "cron" in rule:
+        spec = parse_cron(rule["cron"])
+        day = start
+        for _ in range(MAX_CRON_SCAN_DAYS):
+            if _cron_matches(spec, day):
+                return day
+            day += timedelta(days=1)
+        return None
+
+    freq = rule["freq"]
+    if freq == "daily":
+        return start
+    if freq == "weekly":
+        return start + timedelta(days=(rule["weekday"] - start.weekday()) % 7)
+    candidate = _month_day(start.year, start.month, rule["day_of_month"])
+    if candidate < start:
+        year, month = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+        candidate = _month_day(year, month, rule["day_of_month"])
+    return candidate
+
+
+def next_occurrence(rule: dict, previous: date) -> Optional[date]:
+    """The occurrence following `previous` (itself an occurrence)."""
+    if "cron" in rule:
+        return first_occurrence(rule, previous + timedelta(days=1))
+
+    freq, interval = rule["freq"], rule["interval"]
+    if freq == "daily":
+        return previous + timedelta(days=interval)
+    if freq == "weekly":
+        return previous + timedelta(weeks=interval)
+    month_index = previous.year * 12 + (previous.month - 1) + interval
+    return _month_day(month_index // 12, month_index % 12 + 1, rule["day_of_month"])
+
+
+def resume_occurrence(rule: dict, next_run: date, today: date) -> Optional[date]:
+    """First occurrence on or after `today`, continuing the series from `next_run`.
+
+    Occurrences that fell due while a template was paused are skipped, not
+    back-filled.
+    """
+    current: Optional[date] = next_run
+    while current is not None and current < today:
+        current = next_occurrence(rule, current)
+    return current
+
+
+def occurrences_due(rule: dict, next_run: date, until: date, end: Optional[date] = None,
+                    limit: int = 400) -> List[date]:
+    """All occurrences from `next_run` up to and including `until` (and `end`, if set)."""
+    due: List[date] = []
+    current: Optional[date] = next_run
+    stop = min(until, end) if end else until
+    while current is not None and current <= stop and len(due) < limit:
+        due.append(current)
+        current = next_occurrence(rule, current)
+    return due
+
+
+def iter_occurrences(rule: dict, start: date) -> Iterator[date]:
+    current = first_occurrence(rule, start)
+    while current is not None:
+        yield current
+        current = next_occurrence(rule, current)
@@ -0,0 +1,150 @@
+from flask import Blueprint, request, jsonify
+from firebase_admin_setup import verify_token
+from bson import ObjectId
+from datetime import datetime
+
+from db import recurring_collection, register_index
+from recurrence import validate_rule, first_occurrence, resume_occurrence
+from db_budget import db_budget
+
+recurring_api = Blueprint("recurring_api", __name__)
+
+# The worker's scan index is registered in recurring_worker.py
+register_index("recurring_templates", [("user_id", 1)])
+
+# -------------------------------
+# Get Firebase User ID
+# -------------------------------
+def get_user_id():
+    token = request.headers.get("Authorization")
+    if not token:
+        return None
+    decoded = verify_token(token.replace("Bearer ", ""))
+    if not decoded:
+        return None
+    return decoded.get("uid")
+
+
+def parse_date(value):
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d")
+
+
+def serialize_template(t):
+    return {
+        "id": str(t["_id"]),
+        "category": t.get("category"),
+        "description": t.get("description"),
+        "amount": t.get("amount"),
+        "payment_mode": t.get("payment_mode"),
+        "currency": t.get("currency"),
+        "rule": t.get("rule"),
+        "start_date": t["start_date"].strftime("%Y-%m-%d") if t.get("start_date") else None,
+        "end_date": t["end_date"].strftime("%Y-%m-%d") if t.get("end_date") else None,
+        "next_run": t["next_run"].strftime("%Y-%m-%d") if t.get("next_run") else None,
+        "last_run": t["last_run"].strftime("%Y-%m-%d") if t.get("last_run") else None,
+        "active": t.get("active", True),
+    }
+
+# -------------------------------
+# Create template
+# -------------------------------
+@recurring_api.route("/templates", methods=["POST"])
+@db_budget(round_trips=1)
+def create_template():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.json or {}
+    try:
+        rule = validate_rule(data.get("rule"))
+        amount = float(data.get("amount"))
+        start = parse_date(data.get("start_date") or datetime.utcnow().strftime("%Y-%m-%d"))
+        end = parse_date(data["end_date"]) if data.get("end_date") else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid template: {e}"}), 400
+    if not data.get("category"):
+        return jsonify({"error": "Missing category"}), 400
+
+    first = first_occurrence(rule, start.date())
+    template = {
+        "user_id": user_id,
+        "category": data.get("category"),
+        "description": data.get("description", ""),
+        "amount": amount,
+        "payment_mode": data.get("payment_mode"),
+        "currency": data.get("currency", "$"),
+        "rule": rule,
+        "start_date": start,
+        "end_date": end,
+        "next_run": datetime.combine(first, datetime.min.time()) if first else None,
+        "last_run": None,
+        "active": first is not None and (end is None or first <= end.date()),
+        "created_at": datetime.utcnow(),
+    }
+    recurring_collection.insert_one(template)
+    return jsonify(serialize_template(template)), 201
+
+# -------------------------------
+# List templates
+# -------------------------------
+@recurring_api.route("/templates", methods=["GET"])
+@db_budget(round_trips=1)
+def list_templates():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    templates = recurring_collection.find({"user_id": user_id}).sort("_id", 1)
+    return jsonify({"templates": [serialize_template(t) for t in templates]})
+
+# -------------------------------
+# Pause / resume
+# -------------------------------
+@recurring_api.route("/templates/<template_id>", methods=["PATCH"])
+@db_budget(round_trips=2)
+def set_template_active(template_id):
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    active = bool((request.json or {}).get("active", True))
+    try:
+        query = {"_id": ObjectId(template_id), "user_id": user_id}
+    except Exception:
+        return jsonify({"error": "Invalid template id"}), 400
+    template = recurring_collection.find_one(query)
+    if template is None:
+        return jsonify({"error": "Not found"}), 404
+
+    update = {"active": active}
+    if active and not template.get("active") and template.get("next_run"):
+        # Resuming skips whatever fell due while paused: the worker would
+        # otherwise materialize one back-dated expense per missed occurrence
+        today = datetime.utcnow().date()
+        end = template["end_date"].date() if template.get("end_date") else None
+        following = resume_occurrence(template["rule"], template["next_run"].date(), today)
+        update["next_run"] = datetime.combine(following, datetime.min.time()) if following else None
+        update["active"] = following is not None and (end is None or following <= end)
+
+    recurring_collection.update_one(query, {"$set": update})
+    template.update(update)
+    return jsonify({"success": True, "template": serialize_template(template)})
+
+# -------------------------------
+# Delete template
+# -------------------------------
+@recurring_api.route("/templates/<template_id>", methods=["DELETE"])
+@db_budget(round_trips=1)
+def delete_template(template_id):
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        result = recurring_collection.delete_one({"_id": ObjectId(template_id), "user_id": user_id})
+    except Exception:
+        return jsonify({"error": "Invalid template id"}), 400
+    if result.deleted_count == 0:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"success": True})
@@ -0,0 +1,193 @@
+# recurring_worker.py
+"""
+Materialize recurring-expense templates into expenses.
+
+    python recurring_worker.py                     # everything due up to today
+    python recurring_worker.py --date 2025-07-01   # as of a given day
+    python recurring_worker.py --restart           # ignore today's checkpoint
+
+Due templates are scanned in _id order in batches. Each batch becomes
+one insert_many of expenses plus one bulk_write advancing the
+templates' next_run. Every materialized expense carries an idempotency
+key (template id + occurrence date) under a unique index, so re-running
+after a crash never duplicates an expense. The last processed _id is
+checkpointed per run date, so a run over millions of templates resumes
+where it stopped.
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db import (
+    checkpoints_collection,
+    expense_collection,
+    recurring_collection,
+    register_index,
+)
+from recurrence import next_occurrence, occurrences_due
+from budget_alerts import record_spend
+from versions import bump_version
+from normalize_expenses import base_currencies
+import rate_table
+from expense_schema import base_amount, build_expense
+
+DUPLICATE_KEY = 11000
+
+register_index(
+    "expenses",
+    [("idempotency_key", 1)],
+    unique=True,
+    partialFilterExpression={"idempotency_key": {"$exists": True}},
+)
+
+
+# Due templates in _id order (checkpointable). Equality, sort, range: the
+# scan walks this index in _id order from the checkpoint and checks
+# next_run on the index key, so there is no in-memory sort and non-due
+# templates are never fetched. It replaces (active, next_run, _id), which
+# can be dropped.
+SCAN_INDEX = [("active", 1), ("_id", 1), ("next_run", 1)]
+register_index("recurring_templates", SCAN_INDEX)
+
+
+def _midnight(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def materialize(template, until, bases, table):
+    """Expense docs for every occurrence due, plus the template's new next_run."""
+    rule = template["rule"]
+    end = template["end_date"].date() if template.get("end_date") else None
+    due = occurrences_due(rule, template["next_run"].date(), until, end)
+
+    base = bases[template["user_id"]]
+    amount_base, fx_rate = rate_table.normalize_amount(
+        template["amount"], template.get("currency") or "$", base, table
+    )
+    docs = [
+        build_expense(
+            template["user_id"], _midnight(day), template.get("category"),
+            template.get("description", ""), template["amount"], template.get("payment_mode"),
+            template.get("currency"), amount_base, base, fx_rate,
+            recurring_id=template["_id"],
+            idempotency_key=f"{template['_id']}:{day:%Y-%m-%d}",
+        )
+        for day in due
+    ]
+    following = next_occurrence(rule, due[-1]) if due else template["next_run"].date()
+    return docs, following, end
+
+
+def insert_idempotent(docs):
+    """insert_many that treats already-materialized occurrences as done; returns inserted docs."""
+    if not docs:
+        return []
+    try:
+        expense_collection.insert_many(docs, ordered=False)
+        return docs
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        other = [w for w in errors if w.get("code") != DUPLICATE_KEY]
+        if other:
+            raise
+        failed = {w["index"] for w in errors}
+        return [d for i, d in enumerate(docs) if i not in failed]
+
+
+def process_batch(templates, until, table):
+    bases = base_currencies({t["user_id"] for t in templates})
+    expenses = []
+    template_updates = []
+    for t in templates:
+        docs, following, end = materialize(t, until, bases, table)
+        expenses.extend(docs)
+        still_active = following is not None and (end is None or following <= end)
+        template_updates.append(UpdateOne(
+            {"_id": t["_id"]},
+            {"$set": {
+                "next_run": _midnight(following) if following else None,
+                "last_run": _midnight(until) if docs else t.get("last_run"),
+                "active": still_active,
+            }},
+        ))
+
+    inserted = insert_idempotent(expenses)
+    if template_updates:
+        recurring_collection.bulk_write(template_updates, ordered=False)
+
+    # Budget alerts + ETags, once per user/category rather than per expense
+    category_names = {t["_id"]: t.get("category") for t in templates}
+    spend = defaultdict(float)
+    for d in inserted:
+        spend[(d["user_id"], category_names[d["recurring_id"]])] += base_amount(d)
+    for (user_id, category), total in spend.items():
+        record_spend(user_id, category, total)
+    for user_id in {d["user_id"] for d in inserted}:
+        bump_version(user_id, "expenses")
+
+    return len(inserted), len(expenses) - len(inserted)
+
+
+def run(until=None, batch_size=1000, restart=False):
+    until = until or datetime.utcnow().date()
+    checkpoint_id = f"recurring:{until:%Y-%m-%d}"
+    # Re-running a finished day resumes after its last template, so it only
+    # picks up templates created since
+    checkpoint = None if restart else checkpoints_collection.find_one({"_id": checkpoint_id})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    totals = {
+        "templates": checkpoint.get("templates", 0) if checkpoint else 0,
+        "inserted": checkpoint.get("inserted", 0) if checkpoint else 0,
+        "duplicates": checkpoint.get("duplicates", 0) if checkpoint else 0,
+    }
+
+    table = rate_table.get_table()  # may be None: amounts are then backfilled later
+    started = time.time()
+    query = {"active": True, "next_run": {"$lte": _midnight(until)}}
+
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        # Hinted: the older (active, next_run, _id) index, where it still
+        # exists, would need a blocking sort on _id
+        templates = list(
+            recurring_collection.find(page).sort("_id", 1).hint(SCAN_INDEX).limit(batch_size)
+        )
+        if not templates:
+            break
+
+        inserted, duplicates = process_batch(templates, until, table)
+        last_id = templates[-1]["_id"]
+        totals["templates"] += len(templates)
+        totals["inserted"] += inserted
+        totals["duplicates"] += duplicates
+        checkpoints_collection.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow(), **totals}},
+            upsert=True,
+        )
+        print(f"  {totals['templates']} templates, {totals['inserted']} expenses")
+
+    checkpoints_collection.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"done": True, "finished_at": datetime.utcnow(), **totals}},
+        upsert=True,
+    )
+    print(f"Done in {time.time() - started:.1f}s: {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", help="materialize occurrences up to this day (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint for this date")
+    args = parser.parse_args()
+    until = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+    run(until=until, batch_size=args.batch_size, restart=args.restart)
@@ -0,0 +1,460 @@
+# repository.py
+"""
+Per-user document storage behind a small interface, so a blueprint does
+not depend on PyMongo directly.
+
+    notes = repository("notes", user_field="uid", indexes=("createdAt",))
+    note_id = notes.insert({"uid": uid, "content": "...", "createdAt": now})
+    notes.find_by_user(uid, sort=[("createdAt", -1)], limit=1)
+    for note in notes.iter_by_user(uid, sort=[("createdAt", 1)]): ...  # streamed, not a list
+    notes.count(uid)
+    notes.group_sum(uid, "category", "amount")        # {category: total}
+    notes.update(uid, note_id, {"content": "..."})    # -> bool
+    notes.update(uid, note_id, {...}, where={"revision": 3})  # compare-and-set
+    notes.update(uid, note_id, {"revision": 4}, push={"deltas": [5, "x"]})  # append to an array field
+    notes.delete(uid, note_id)                        # -> bool
+    notes.delete_many(uid, where={"note_id": note_id})  # -> count
+
+    versions = repository("user_versions", user_field="_id")
+    versions.increment(uid, ("notes",))               # per-user counters, created on first use
+    versions.counters(uid, ("notes", "tasks"))        # {"notes": 3, "tasks": 0}
+
+STORAGE_BACKEND picks the implementation:
+
+- "mongo" (default): MongoRepository, a thin wrapper over db.py's lazy
+  collections;
+- "sqlite": SQLiteRepository, one file (SQLITE_PATH) for single-node
+  installs and tests, with no MongoDB server needed for the
+  repositories that use it.
+
+Every operation is scoped to one user, and get / update / delete raise
+bson's InvalidId for a missing or malformed id. `where` is equality on
+top-level fields and `sort` a list of (field, 1 | -1), which is all the
+blueprints need. Documents keep their ObjectId `_id` on both backends, so ids move
+between them unchanged.
+
+Notes, their revision history and the versions.py counters (ETags) go
+through repositories, so with STORAGE_BACKEND=sqlite and no MONGO_URI
+the app boots and the notes routes work (db.py only needs MONGO_URI
+once a Mongo client is built). Expenses, budgets, tasks and goals still
+use aggregation pipelines and bulk writes directly, so their routes
+need MongoDB.
+"""
+
+import base64
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+SQLITE_PATH = os.getenv(
+    "SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nexwise.db"),
+)
+
+_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _field(name):
+    # Field names are spliced into SQL / JSON paths, so only plain identifiers
+    if not _FIELD.match(name):
+        raise ValueError(f"Unsupported field name: {name!r}")
+    return name
+
+
+def _object_id(doc_id):
+    # None must not turn into "no _id filter" (any of the user's documents)
+    if isinstance(doc_id, ObjectId):
+        return doc_id
+    if not isinstance(doc_id, str) or not ObjectId.is_valid(doc_id):
+        raise InvalidId(f"{doc_id!r} is not a valid document id")
+    return ObjectId(doc_id)
+
+
+class Repository:
+    def __init__(self, name, user_field="user_id", indexes=()):
+        self.name = _field(name)
+        self.user_field = _field(user_field)
+        self.indexes = tuple(_field(f) for f in indexes)
+
+    def insert(self, doc):
+        """Store `doc` (sets doc["_id"]) and return the id as a string."""
+        raise NotImplementedError
+
+    def insert_many(self, docs):
+        raise NotImplementedError
+
+    def get(self, user_id, doc_id):
+        raise NotImplementedError
+
+    def find_by_user(self, user_id, where=None, sort=None, limit=None):
+        return list(self.iter_by_user(user_id, where, sort, limit))
+
+    def iter_by_user(self, user_id, where=None, sort=None, limit=None, batch_size=None):
+        """Like find_by_user, but documents are read as they are consumed."""
+        raise NotImplementedError
+
+    def count(self, user_id, where=None):
+        raise NotImplementedError
+
+    def group_sum(self, user_id, key, value, where=None):
+        """{key value: sum of `value`} over the user's documents."""
+        raise NotImplementedError
+
+    def update(self, user_id, doc_id, fields, where=None, push=None):
+        """
+        Set top-level `fields` on one document and append each `push`
+        value to its array field (created if missing); False if the
+        document doesn't exist or doesn't match `where` (compare-and-set
+        on e.g. a revision).
+        """
+        raise NotImplementedError
+
+    def delete(self, user_id, doc_id):
+        raise NotImplementedError
+
+    def delete_many(self, user_id, where=None):
+        """Delete the user's documents matching `where`; returns how many."""
+        raise NotImplementedError
+
+    # One counter document per user, separate from the documents above
+    def counters(self, user_id, names):
+        """{name: value} from the user's counter document (0 when unset)."""
+        raise NotImplementedError
+
+    def increment(self, user_id, names):
+        """Atomically add 1 to each counter in `names`, creating the document."""
+        raise NotImplementedError
+
+
+# -------------------------------
+# MongoDB
+# -------------------------------
+class MongoRepository(Repository):
+    def __init__(self, name, user_field="user_id", indexes=()):
+        super().__init__(name, user_field, indexes)
+        from db import lazy_collection, register_index
+
+        self.collection = lazy_collection(self.name)
+        if self.user_field != "_id":
+            register_index(self.name, [(self.user_field, 1)] + [(f, 1) for f in self.indexes])
+
+    def _query(self, user_id, where=None):
+        return {self.user_field: user_id, **(where or {})}
+
+    def _one(self, user_id, doc_id, where=None):
+        return {**self._query(user_id, where), "_id": _object_id(doc_id)}
+
+    def insert(self, doc):
+        return str(self.collection.insert_one(doc).inserted_id)
+
+    def insert_many(self, docs):
+        if not docs:
+            return []
+        return [str(i) for i in self.collection.insert_many(docs, ordered=False).inserted_ids]
+
+    def get(self, user_id, doc_id):
+        return self.collection.find_one(self._one(user_id, doc_id))
+
+    def iter_by_user(self, user_id, where=None, sort=None, limit=None, batch_size=None):
+        return self.collection.find(
+            self._query(user_id, where), sort=sort, limit=limit or 0, batch_size=batch_size or 0
+        )
+
+    def count(self, user_id, where=None):
+        return self.collection.count_documents(self._query(user_id, where))
+
+    def group_sum(self, user_id, key, value, where=None):
+        rows = self.collection.aggregate([
+            {"$match": self._query(user_id, where)},
+            {"$group": {"_id": f"${key}", "total": {"$sum": f"${value}"}}},
+        ])
+        return {row["_id"]: row["total"] for row in rows}
+
+    def update(self, user_id, doc_id, fields, where=None, push=None):
+        update = {"$set": fields} if fields else {}
+        if push:
+            update["$push"] = push
+        if not update:
+            return self.collection.count_documents(self._one(user_id, doc_id, where), limit=1) > 0
+        return self.collection.update_one(self._one(user_id, doc_id, where), update).matched_count > 0
+
+    def delete(self, user_id, doc_id):
+        return self.collection.delete_one(self._one(user_id, doc_id)).deleted_count > 0
+
+    def delete_many(self, user_id, where=None):
+        return self.collection.delete_many(self._query(user_id, where)).deleted_count
+
+    # With user_field="_id" the counter document is {_id: user_id, name: n, ...}
+    def counters(self, user_id, names):
+        doc = self.collection.find_one(self._query(user_id), {name: 1 for name in names}) or {}
+        return {name: doc.get(name, 0) for name in names}
+
+    def increment(self, user_id, names):
+        self.collection.update_one(self._query(user_id), {"$inc": {name: 1 for name in names}}, upsert=True)
+
+
+# -------------------------------
+# SQLite
+# -------------------------------
+# One table per repository:
+#
+#     user_id TEXT, id TEXT (ObjectId hex), data TEXT (the document as JSON)
+#     PRIMARY KEY (user_id, id) WITHOUT ROWID
+#
+# A user's counter document is the row with id COUNTER_ID, which no
+# ObjectId hex can collide with.
+#
+# The primary key clusters each user's rows together, so find_by_user is
+# a range scan and get / update / delete are one key lookup. Declared
+# `indexes` become expression indexes on (user_id, json_extract(field)),
+# matching the ORDER BY / WHERE expressions below.
+#
+# Datetimes and ObjectIds are stored as {"$date": fixed-width ISO} and
+# {"$oid": hex}, so their JSON text sorts chronologically. Bytes (BSON
+# binary on Mongo) become {"$binary": base64}.
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="microseconds")}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, bytes):
+        return {"$binary": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _json_hook(obj):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$binary" in obj:
+            return base64.b64decode(obj["$binary"])
+    return obj
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_json_hook)
+
+
+def _path(field):
+    return f"json_extract(data, '$.{field}')"
+
+
+COUNTER_ID = "counters"
+
+
+class SQLiteRepository(Repository):
+    """
+    Connections are per thread (sqlite3 objects can't be shared) and per
+    process, opened in WAL mode so readers never block the single writer.
+    Every statement is parameterised and its SQL text is built once per
+    shape (lru_cache), so the connection's statement cache reuses the
+    prepared statement instead of re-parsing it.
+    """
+
+    _local = threading.local()
+    _schema_lock = threading.Lock()
+    _created = set()
+
+    def __init__(self, name, user_field="user_id", indexes=(), path=None):
+        super().__init__(name, user_field, indexes)
+        self.path = path or SQLITE_PATH
+
+    # ---- connections ----
+    def _conn(self):
+        conns = getattr(self._local, "conns", None)
+        if conns is None or self._local.pid != os.getpid():
+            conns = self._local.conns = {}
+            self._local.pid = os.getpid()
+        conn = conns.get(self.path)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; WAL keeps it consistent
+            conn.execute("PRAGMA busy_timeout=5000")
+            conns[self.path] = conn
+        key = (os.getpid(), self.path, self.name)
+        if key not in self._created:
+            with self._schema_lock:
+                if key not in self._created:
+                    self._create_schema(conn)
+                    self._created.add(key)
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" ('
+            "user_id TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, id)) WITHOUT ROWID"
+        )
+        for field in self.indexes:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.name}_{field}" ON "{self.name}" (user_id, {_path(field)})'
+            )
+
+    # ---- SQL text, one string per statement shape ----
+    @functools.lru_cache(maxsize=None)
+    def _where_sql(self, fields):
+        clauses = ["user_id = ?"] + [f"{_path(_field(f))} IS ?" for f in fields]
+        return " AND ".join(clauses)
+
+    @functools.lru_cache(maxsize=None)
+    def _select_sql(self, fields, sort, limited):
+        sql = f'SELECT id, data FROM "{self.name}" WHERE {self._where_sql(fields)}'
+        if sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{_path(_field(f))} {'DESC' if d < 0 else 'ASC'}" for f, d in sort
+            )
+        return sql + (" LIMIT ?" if limited else "")
+
+    @functools.lru_cache(maxsize=None)
+    def _count_sql(self, fields):
+        return f'SELECT COUNT(*) FROM "{self.name}" WHERE {self._where_sql(fields)}'
+
+    @functools.lru_cache(maxsize=None)
+    def _group_sql(self, key, value, fields):
+        return (
+            f"SELECT {_path(_field(key))} AS k, TOTAL({_path(_field(value))}) "
+            f'FROM "{self.name}" WHERE {self._where_sql(fields)} GROUP BY k'
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def _increment_sql(self, names):
+        initial = ", ".join(f"'{_field(n)}', 1" for n in names)
+        bumped = ", ".join(f"'$.{_field(n)}', COALESCE({_path(n)}, 0) + 1" for n in names)
+        return (
+            f'INSERT INTO "{self.name}" (user_id, id, data) VALUES (?, ?, json_object({initial})) '
+            f"ON CONFLICT (user_id, id) DO UPDATE SET data = json_set(data, {bumped})"
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def _update_sql(self, fields, where_fields, push_fields=()):
+        data = "data"
+        if fields:
+            data = f"json_set({data}, " + ", ".join(f"'$.{_field(f)}', json(?)" for f in fields) + ")"
+        for f in push_fields:
+            appended = f"json_insert(COALESCE({_path(_field(f))}, '[]'), '$[#]', json(?))"
+            data = f"json_set({data}, '$.{f}', json({appended}))"
+        return f'UPDATE "{self.name}" SET data = {data} WHERE {self._where_sql(where_fields)} AND id = ?'
+
+    @staticmethod
+    def _where_params(where):
+        fields = tuple(sorted(where or ()))
+        params = []
+        for f in fields:
+            value = where[f]
+            if isinstance(value, (dict, list, datetime, ObjectId)):
+                raise ValueError(f"SQLite repositories only filter on scalar values ({f!r})")
+            params.append(value)
+        return fields, params
+
+    def _row(self, doc_id, data):
+        doc = _loads(data)
+        doc["_id"] = ObjectId(doc_id)
+        return doc
+
+    # ---- operations ----
+    def _insert_params(self, doc):
+        doc.setdefault("_id", ObjectId())
+        body = {k: v for k, v in doc.items() if k != "_id"}
+        return (doc[self.user_field], str(doc["_id"]), _dumps(body))
+
+    def insert(self, doc):
+        params = self._insert_params(doc)
+        self._conn().execute(f'INSERT INTO "{self.name}" (user_id, id, data) VALUES (?, ?, ?)', params)
+        return params[1]
+
+    def insert_many(self, docs):
+        rows = [self._insert_params(doc) for doc in docs]
+        conn = self._conn()
+        with conn:  # one transaction (and one WAL commit) for the whole batch
+            conn.execute("BEGIN")
+            conn.executemany(f'INSERT INTO "{self.name}" (user_id, id, data) VALUES (?, ?, ?)', rows)
+        return [row[1] for row in rows]
+
+    def get(self, user_id, doc_id):
+        row = self._conn().execute(
+            f'SELECT id, data FROM "{self.name}" WHERE user_id = ? AND id = ?', (user_id, str(_object_id(doc_id)))
+        ).fetchone()
+        return self._row(*row) if row else None
+
+    def iter_by_user(self, user_id, where=None, sort=None, limit=None, batch_size=None):
+        fields, params = self._where_params(where)
+        sort = tuple((f, d) for f, d in sort) if sort else ()
+        sql = self._select_sql(fields, sort, bool(limit))
+        params = [user_id, *params] + ([limit] if limit else [])
+        # sqlite3 cursors step through the result as they are iterated
+        return (self._row(*row) for row in self._conn().execute(sql, params))
+
+    def count(self, user_id, where=None):
+        fields, params = self._where_params(where)
+        return self._conn().execute(self._count_sql(fields), [user_id, *params]).fetchone()[0]
+
+    def group_sum(self, user_id, key, value, where=None):
+        fields, params = self._where_params(where)
+        rows = self._conn().execute(self._group_sql(key, value, fields), [user_id, *params])
+        return {k: total for k, total in rows}
+
+    def update(self, user_id, doc_id, fields, where=None, push=None):
+        if not fields and not push:
+            doc = self.get(user_id, doc_id)
+            return doc is not None and all(doc.get(f) == v for f, v in (where or {}).items())
+        names, pushed = tuple(fields or ()), tuple(push or ())
+        where_fields, where_params = self._where_params(where)
+        params = (
+            [_dumps(fields[f]) for f in names] + [_dumps(push[f]) for f in pushed]
+            + [user_id, *where_params, str(_object_id(doc_id))]
+        )
+        return self._conn().execute(self._update_sql(names, where_fields, pushed), params).rowcount > 0
+
+    def delete(self, user_id, doc_id):
+        cur = self._conn().execute(f'DELETE FROM "{self.name}" WHERE user_id = ? AND id = ?', (user_id, str(_object_id(doc_id))))
+        return cur.rowcount > 0
+
+    def delete_many(self, user_id, where=None):
+        fields, params = self._where_params(where)
+        cur = self._conn().execute(f'DELETE FROM "{self.name}" WHERE {self._where_sql(fields)}', [user_id, *params])
+        return cur.rowcount
+
+    def counters(self, user_id, names):
+        row = self._conn().execute(
+            f'SELECT data FROM "{self.name}" WHERE user_id = ? AND id = ?', (user_id, COUNTER_ID)
+        ).fetchone()
+        doc = _loads(row[0]) if row else {}
+        return {name: doc.get(name, 0) for name in names}
+
+    def increment(self, user_id, names):
+        # One upsert statement, so concurrent bumps never lose a count
+        self._conn().execute(self._increment_sql(tuple(names)), (user_id, COUNTER_ID))
+
+
+# -------------------------------
+# Factory
+# -------------------------------
+_BACKENDS = {"mongo": MongoRepository, "sqlite": SQLiteRepository}
+_repositories = {}
+
+
+def repository(name, user_field="user_id", indexes=(), backend=None):
+    backend = backend or STORAGE_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r} (expected one of {sorted(_BACKENDS)})")
+    key = (backend, name)
+    if key not in _repositories:
+        _repositories[key] = _BACKENDS[backend](name, user_field=user_field, indexes=indexes)
+    return _repositories[key]
@@ -0,0 +1,237 @@
+# resilience.py
+"""
+Circuit breakers and request deadlines for the external dependencies
+(exchangerate-api, OpenAI, Firebase).
+
+    with resilience.guard("openai", cap=OPENAI_TIMEOUT_SECONDS) as timeout:
+        client.chat.completions.create(..., timeout=timeout)
+
+guard() fails fast with DependencyUnavailable, without touching the
+network, when the dependency's breaker is open or the request deadline
+has (nearly) passed. Otherwise it yields the timeout to use:
+min(cap, time left before the deadline).
+
+Deadlines: every request gets one, from an `X-Request-Timeout: <seconds>`
+header (capped at REQUEST_DEADLINE_SECONDS) or REQUEST_DEADLINE_SECONDS.
+It lives in a contextvar, so it follows the request into copied
+contexts (dashboard fan-out, run_in_threadpool).
+
+Breakers are per process and per dependency. FAILURE_THRESHOLD
+consecutive failures open a breaker. After RESET_SECONDS one probe call
+is let through (half-open): success closes the breaker, failure opens it
+for another RESET_SECONDS. Only the exceptions listed in `trips` count as
+failures, so a caller's own bad input (an invalid token, say) never
+opens a breaker.
+
+The init_* hooks install the deadline and turn DependencyUnavailable
+into `503` with `Retry-After`.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger("resilience")
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 15))
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+# Don't start a call with less time than this left; it couldn't finish anyway
+MIN_CALL_SECONDS = float(os.getenv("MIN_CALL_SECONDS", 0.05))
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+class DependencyUnavailable(Exception):
+    def __init__(self, dependency, reason, retry_after=None):
+        super().__init__(f"{dependency} unavailable ({reason})")
+        self.dependency = dependency
+        self.reason = reason            # "circuit_open" | "deadline" | "error"
+        self.retry_after = retry_after
+
+
+# -------------------------------
+# Circuit breakers
+# -------------------------------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit %s open after %d failures", self.name, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def retry_after(self):
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(dependency):
+    found = _breakers.get(dependency)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(dependency, CircuitBreaker(dependency))
+    return found
+
+
+def _breaker_states():
+    return {(name,): float(b.state != CircuitBreaker.CLOSED) for name, b in list(_breakers.items())}
+
+
+CIRCUIT_OPEN = metrics.gauge(
+    "nexwise_circuit_open",
+    "1 while the dependency's circuit breaker is open or half-open.",
+    ("dependency",),
+    callback=_breaker_states,
+)
+FAST_FAILURES = metrics.counter(
+    "nexwise_dependency_fast_failures_total",
+    "Calls refused without contacting the dependency.",
+    ("dependency", "reason"),
+)
+
+
+# -------------------------------
+# Request deadlines
+# -------------------------------
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+def parse_budget(header_value):
+    """Seconds the caller allows for this request, capped at REQUEST_DEADLINE_SECONDS."""
+    try:
+        requested = float(header_value) if header_value else REQUEST_DEADLINE_SECONDS
+    except ValueError:
+        requested = REQUEST_DEADLINE_SECONDS
+    return min(max(requested, 0.0), REQUEST_DEADLINE_SECONDS)
+
+
+def start_deadline(seconds):
+    _deadline.set(time.monotonic() + seconds)
+
+
+def clear_deadline():
+    _deadline.set(None)
+
+
+def time_left():
+    """Seconds until the current request's deadline (None outside a request)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout_for(cap):
+    left = time_left()
+    return cap if left is None else min(cap, left)
+
+
+@contextmanager
+def guard(dependency, cap, trips=(Exception,)):
+    timeout = timeout_for(cap)
+    if timeout < MIN_CALL_SECONDS:
+        FAST_FAILURES.inc(dependency=dependency, reason="deadline")
+        raise DependencyUnavailable(dependency, "deadline")
+    circuit = breaker(dependency)
+    if not circuit.allow():
+        FAST_FAILURES.inc(dependency=dependency, reason="circuit_open")
+        raise DependencyUnavailable(dependency, "circuit_open", circuit.retry_after())
+    try:
+        yield timeout
+    except trips:
+        circuit.record_failure()
+        raise
+    except BaseException:
+        circuit.record_success()  # the dependency answered; the error is ours
+        raise
+    else:
+        circuit.record_success()
+
+
+def error_body(exc):
+    return {"error": f"{exc.dependency} is temporarily unavailable", "reason": exc.reason}
+
+
+def _retry_after_header(exc):
+    return str(max(int(exc.retry_after or 0) + 1, 1))
+
+
+# -------------------------------
+# Framework hooks
+# -------------------------------
+def init_flask_resilience(app):
+    from flask import jsonify, request
+
+    @app.before_request
+    def _start_deadline():
+        start_deadline(parse_budget(request.headers.get(DEADLINE_HEADER)))
+
+    @app.teardown_request
+    def _clear_deadline(exc):
+        clear_deadline()
+
+    @app.errorhandler(DependencyUnavailable)
+    def _unavailable(exc):
+        response = jsonify(error_body(exc))
+        response.headers["Retry-After"] = _retry_after_header(exc)
+        return response, 503
+
+
+def init_fastapi_resilience(app):
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    @app.middleware("http")
+    async def _deadline_middleware(request: Request, call_next):
+        start_deadline(parse_budget(request.headers.get(DEADLINE_HEADER)))
+        try:
+            return await call_next(request)
+        finally:
+            clear_deadline()
+
+    @app.exception_handler(DependencyUnavailable)
+    async def _unavailable(request: Request, exc: DependencyUnavailable):
+        return JSONResponse(error_body(exc), status_code=503,
+                            headers={"Retry-After": _retry_after_header(exc)})
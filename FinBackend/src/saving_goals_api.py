@@ -1,11 +1,32 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin_setup import verify_token
 from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from db import goals_collection
+from db import goals_collection, contributions_collection, register_index
+from versions import bump_version, current_etag, not_modified, with_etag
+from db_budget import db_budget
 
 saving_goals_bp = Blueprint("saving_goals", __name__)
 
+# One goal name per user; also serves the get_goals (user_id) read
+register_index("goals", [("user_id", 1), ("name", 1)], unique=True)
+# Ledger reads: a goal's contributions, newest first / within a window
+register_index("goal_contributions", [("goal_id", 1), ("date", -1)])
+
+# Projection uses the contribution rate over this many recent days
+RATE_WINDOW_DAYS = 90
+
+# Fields only the server writes
+SERVER_FIELDS = {"_id", "user_id", "status", "savedAmount", "contributionCount",
+                 "lastContributionAt", "recentDailyRate", "projectedCompletion",
+                 "pendingContributions"}
+# Goals as clients see them (pendingContributions is add_contribution's outbox)
+GOAL_PROJECTION = {"pendingContributions": 0}
+DUPLICATE_KEY = 11000
+
 # -------------------------------
 # Get Firebase User ID  
 # -------------------------------
@@ -22,53 +43,85 @@ def get_user_id():
 
     return decoded.get("uid")
 
+# -------------------------------
+# Goal lookup (by id, or by name for older clients)
+# -------------------------------
+def goal_filter(user_id, data):
+    goal_id = data.get("id") or data.get("goal_id") or data.get("_id")
+    if goal_id:
+        return {"_id": ObjectId(goal_id), "user_id": user_id}
+    return {"user_id": user_id, "name": data.get("name")}
+
 # -------------------------------
 # Save Goal
 # -------------------------------
 @saving_goals_bp.route("/save_goal", methods=["POST"])
+@db_budget(round_trips=2)
 def save_goal():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    new_goal = request.json
+    data = request.json or {}
+    if not data.get("name"):
+        return jsonify({"error": "Goal name is required"}), 400
+
+    new_goal = {k: v for k, v in data.items() if k not in SERVER_FIELDS}
     new_goal["user_id"] = user_id
     new_goal["status"] = "Pending"
+    new_goal["savedAmount"] = 0.0
+    new_goal["contributionCount"] = 0
+    new_goal["projectedCompletion"] = None
 
-    result = goals_collection.insert_one(new_goal)
+    try:
+        result = goals_collection.insert_one(new_goal)
+    except DuplicateKeyError:
+        return jsonify({"error": "A goal with this name already exists"}), 409
+    bump_version(user_id, "goals")
 
     return jsonify({"message": "Goal saved successfully", "goal_id": str(result.inserted_id)})
 
 
 # -------------------------------
-# Get Goals
+# Get Goals (progress is stored on each goal, so this is one indexed read)
 # -------------------------------
+def list_goals(user_id):
+    return list(goals_collection.find({"user_id": user_id}, GOAL_PROJECTION))
+
 @saving_goals_bp.route("/get_goals", methods=["GET"])
+@db_budget(round_trips=2)
 def get_goals():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    goals = list(goals_collection.find({"user_id": user_id}))
-
-    for g in goals:
-        g["_id"] = str(g["_id"])
+    etag = current_etag(user_id, "goals", scope="goals")
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    return jsonify({"goals": goals})
+    return with_etag(jsonify({"goals": list_goals(user_id)}), etag)
 
 
 # -------------------------------
 # Delete Goal
 # -------------------------------
 @saving_goals_bp.route("/delete_goal", methods=["POST"])
+@db_budget(round_trips=3)
 def delete_goal():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    goal_name = request.json.get("name")
+    try:
+        query = goal_filter(user_id, request.json or {})
+    except Exception:
+        return jsonify({"error": "Invalid goal id"}), 400
 
-    goals_collection.delete_one({"user_id": user_id, "name": goal_name})
+    goal = goals_collection.find_one_and_delete(query, projection={"_id": 1})
+    if goal:
+        contributions_collection.delete_many({"goal_id": goal["_id"]})
+    bump_version(user_id, "goals")
 
     return jsonify({"message": "Goal deleted"})
 
@@ -77,16 +130,158 @@ def delete_goal():
 # Mark Completed
 # -------------------------------
 @saving_goals_bp.route("/complete_goal", methods=["POST"])
+@db_budget(round_trips=2)
 def complete_goal():
     user_id = get_user_id()
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
-    goal_name = request.json.get("name")
+    try:
+        query = goal_filter(user_id, request.json or {})
+    except Exception:
+        return jsonify({"error": "Invalid goal id"}), 400
 
-    goals_collection.update_one(
-        {"user_id": user_id, "name": goal_name},
-        {"$set": {"status": "Completed"}}
-    )
+    goals_collection.update_one(query, {"$set": {"status": "Completed"}})
+    bump_version(user_id, "goals")
 
     return jsonify({"message": "Goal marked as completed"})
+
+
+# -------------------------------
+# Contributions ledger
+# -------------------------------
+def project_completion(target, saved, recent_total, window_days, now):
+    """
+    Estimate the completion date from the recent contribution rate.
+    Returns (daily_rate, projected_datetime_or_None); window_days is None
+    while there are too few contributions to measure a rate.
+    """
+    daily_rate = recent_total / window_days if window_days else 0.0
+    remaining = float(target or 0) - saved
+    if remaining <= 0:
+        return daily_rate, now
+    if daily_rate <= 0:
+        return daily_rate, None
+    return daily_rate, now + timedelta(days=remaining / daily_rate)
+
+
+def insert_contributions(entries):
+    """Append ledger entries, skipping any already stored (same _id)."""
+    try:
+        contributions_collection.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        if any(w.get("code") != DUPLICATE_KEY for w in e.details.get("writeErrors", [])):
+            raise
+
+
+def recent_contributions(goal_id, now):
+    """
+    Sum of the goal's contributions inside the rate window, and the days
+    that sum covers (None with fewer than two contributions).
+
+    n deposits from `first` to now pay for n intervals, the last of which
+    runs past now, so the window is (now - first) plus one average
+    interval: three monthly deposits cover ~90 days, not 60, and a single
+    deposit says nothing about the rate yet.
+    """
+    since = now - timedelta(days=RATE_WINDOW_DAYS)
+    result = next(contributions_collection.aggregate([
+        {"$match": {"goal_id": goal_id, "date": {"$gte": since}}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}, "first": {"$min": "$date"}, "count": {"$sum": 1}}},
+    ]), None)
+    if not result or result["count"] < 2:
+        return (float(result["total"]) if result else 0.0), None
+    span_days = (now - result["first"]).total_seconds() / 86400.0
+    window_days = span_days + span_days / (result["count"] - 1)
+    return float(result["total"]), max(window_days, 1.0)
+
+
+@saving_goals_bp.route("/<goal_id>/contributions", methods=["POST"])
+@db_budget(round_trips=5)
+def add_contribution(goal_id):
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.json or {}
+    try:
+        goal_oid = ObjectId(goal_id)
+        amount = float(data.get("amount"))
+    except Exception:
+        return jsonify({"error": "Invalid goal id or amount"}), 400
+    if amount == 0:
+        return jsonify({"error": "Amount must be non-zero"}), 400
+
+    now = datetime.utcnow()
+    entry = {
+        "_id": ObjectId(),
+        "goal_id": goal_oid,
+        "user_id": user_id,
+        "amount": amount,
+        "note": data.get("note", ""),
+        "date": now,
+    }
+    # The running totals and the entry land in one write; the ledger
+    # insert after it is idempotent, so a request that dies in between
+    # leaves the entry pending on the goal for the next contribution.
+    goal = goals_collection.find_one_and_update(
+        {"_id": goal_oid, "user_id": user_id},
+        {
+            "$inc": {"savedAmount": amount, "contributionCount": 1},
+            "$set": {"lastContributionAt": now},
+            "$push": {"pendingContributions": entry},
+        },
+        projection={"targetAmount": 1, "savedAmount": 1, "pendingContributions": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not goal:
+        return jsonify({"error": "Goal not found"}), 404
+
+    pending = goal.get("pendingContributions") or [entry]
+    insert_contributions(pending)
+
+    recent_total, window_days = recent_contributions(goal_oid, now)
+    daily_rate, projected = project_completion(
+        goal.get("targetAmount"), float(goal.get("savedAmount") or 0), recent_total, window_days, now
+    )
+
+    updated = goals_collection.find_one_and_update(
+        {"_id": goal_oid, "user_id": user_id},
+        {
+            "$pull": {"pendingContributions": {"_id": {"$in": [e["_id"] for e in pending]}}},
+            "$set": {
+                "recentDailyRate": round(daily_rate, 4),
+                "projectedCompletion": projected,
+            },
+        },
+        projection=GOAL_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    bump_version(user_id, "goals")
+
+    return jsonify({
+        "message": "Contribution added",
+        "contribution_id": str(entry["_id"]),
+        "goal": updated,
+    }), 201
+
+
+@saving_goals_bp.route("/<goal_id>/contributions", methods=["GET"])
+@db_budget(round_trips=1)
+def list_contributions(goal_id):
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        goal_oid = ObjectId(goal_id)
+    except Exception:
+        return jsonify({"error": "Invalid goal id"}), 400
+
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    entries = list(contributions_collection.find(
+        {"goal_id": goal_oid, "user_id": user_id},
+        {"goal_id": 0, "user_id": 0},
+    ).sort("date", -1).limit(limit))
+
+    return jsonify({"contributions": entries})
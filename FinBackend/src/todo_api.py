@@ -1,41 +1,67 @@
 # todo_api.py
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from db import tasks_collection
-from datetime import datetime
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError
+from db import tasks_collection, register_index
+from datetime import datetime, timedelta
+from versions import bump_version, current_etag, not_modified, with_etag
+from db_budget import db_budget
 
 todo_api = Blueprint("todo_api", __name__)
 
-def serialize_task(task):
-    return {
-        "id": str(task["_id"]),
-        "user_id": task.get("user_id"),
-        "title": task.get("title"),
-        "description": task.get("description"),
-        "date": task.get("date"),          # date assigned / task date (YYYY-MM-DD)
-        "deadline": task.get("deadline"),  # deadline date (YYYY-MM-DD)
-        "priority": task.get("priority"),
-        "urgent": task.get("urgent", False),
-        "category": task.get("category", "General"),
-        "completed": task.get("completed", False),
-        "created_at": task.get("created_at"),
-        "updated_at": task.get("updated_at"),
-    }
+UPDATABLE_FIELDS = ["title","description","date","deadline","priority","urgent","category","completed"]
+MAX_BULK_OPERATIONS = 500
 
-@todo_api.route("/tasks", methods=["POST"])
-def create_task():
-    data = request.json or {}
-    required = ["user_id", "title", "date"]
-    if not all(k in data and data[k] for k in required):
-        return jsonify({"error": "Missing required fields (user_id, title, date)"}), 400
+# Agenda queries: open tasks of a user, ranged / sorted on the typed deadline
+register_index("tasks", [("user_id", 1), ("completed", 1), ("deadline_at", 1)])
+register_index("tasks", [("user_id", 1), ("completed", 1), ("priority", 1), ("deadline_at", 1)])
 
-    now = datetime.utcnow().isoformat()
-    new_task = {
+def parse_day(value):
+    """'YYYY-MM-DD' -> datetime at midnight (None if missing / malformed)."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+
+# Fields returned to clients, with their defaults
+TASK_FIELDS = {
+    "user_id": None,
+    "title": None,
+    "description": None,
+    "date": None,          # date assigned / task date (YYYY-MM-DD)
+    "deadline": None,      # deadline date (YYYY-MM-DD)
+    "priority": None,
+    "urgent": False,
+    "category": "General",
+    "completed": False,
+    "created_at": None,
+    "updated_at": None,
+}
+
+# serialize_task() as a $project stage, so list endpoints get client-ready documents
+TASK_VIEW = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    **{field: {"$ifNull": [f"${field}", default]} for field, default in TASK_FIELDS.items()},
+}
+
+def serialize_task(task):
+    return {"id": str(task["_id"]), **{f: task.get(f, d) for f, d in TASK_FIELDS.items()}}
+
+def build_task(data, now):
+    """New task document (with its _id already assigned) from request data."""
+    return {
+        "_id": ObjectId(),
         "user_id": data["user_id"],
         "title": data["title"],
         "description": data.get("description", ""),
         "date": data.get("date"),        # YYYY-MM-DD
         "deadline": data.get("deadline"),
+        "deadline_at": parse_day(data.get("deadline")),  # typed copy for range queries
         "priority": data.get("priority", "Medium"),
         "urgent": bool(data.get("urgent", False)),
         "category": data.get("category", "General"),
@@ -43,16 +69,167 @@ def create_task():
         "created_at": now,
         "updated_at": now,
     }
-    res = tasks_collection.insert_one(new_task)
-    created = tasks_collection.find_one({"_id": res.inserted_id})
-    return jsonify(serialize_task(created)), 201
+
+def task_changes(data):
+    changes = {k: data[k] for k in UPDATABLE_FIELDS if k in data}
+    if "deadline" in changes:
+        changes["deadline_at"] = parse_day(changes["deadline"])
+    return changes
+
+def missing_task_fields(data):
+    required = ["user_id", "title", "date"]
+    return not all(k in data and data[k] for k in required)
+
+@todo_api.route("/tasks", methods=["POST"])
+@db_budget(round_trips=2)
+def create_task():
+    data = request.json or {}
+    if missing_task_fields(data):
+        return jsonify({"error": "Missing required fields (user_id, title, date)"}), 400
+
+    new_task = build_task(data, datetime.utcnow().isoformat())
+    tasks_collection.insert_one(new_task)
+    bump_version(new_task["user_id"], "tasks")
+    # _id was assigned client-side, so the document we built is what got stored
+    return jsonify(serialize_task(new_task)), 201
+
+# -------------------------------
+# Bulk create / update / delete
+# -------------------------------
+# Body:
+# {
+#   "user_id": "...",
+#   "operations": [
+#     {"op": "create", "task": {...}},
+#     {"op": "update", "id": "..." | "ids": [...], "fields": {...}},
+#     {"op": "delete", "id": "..." | "ids": [...]}
+#   ]
+# }
+# All operations run in a single ordered bulk_write. Update results carry
+# the updated tasks as stored after the batch, plus the ids that matched
+# no task of this user or were deleted later in the batch ("not_found").
+def _target_ids(op):
+    ids = op["ids"] if "ids" in op else [op.get("id")]
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        raise TypeError("id / ids must be task id strings")
+    return [ObjectId(i) for i in ids]
+
+@todo_api.route("/tasks/bulk", methods=["POST"])
+@db_budget(round_trips=3)  # bulk write, version, read-back of updated tasks
+def bulk_tasks():
+    data = request.json or {}
+    user_id = data.get("user_id")
+    operations = data.get("operations") or []
+    if not user_id:
+        return jsonify({"error": "Missing user_id"}), 400
+    if not operations or not isinstance(operations, list):
+        return jsonify({"error": "No operations"}), 400
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return jsonify({"error": f"At most {MAX_BULK_OPERATIONS} operations per request"}), 400
+
+    now = datetime.utcnow().isoformat()
+    writes = []
+    results = []
+
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            return jsonify({"error": "Each operation must be an object", "index": index}), 400
+        kind = op.get("op")
+        if kind in ("update", "delete"):
+            try:
+                ids = _target_ids(op)
+            except (InvalidId, TypeError):
+                return jsonify({"error": "Invalid task id", "index": index}), 400
+
+        if kind == "create":
+            task = op.get("task")
+            if not isinstance(task, dict):
+                return jsonify({"error": "task must be an object", "index": index}), 400
+            task_data = {**task, "user_id": user_id}
+            if missing_task_fields(task_data):
+                return jsonify({"error": "Missing required fields (title, date)", "index": index}), 400
+            doc = build_task(task_data, now)
+            writes.append(InsertOne(doc))
+            results.append({"op": "create", "task": serialize_task(doc)})
+
+        elif kind == "update":
+            fields = op.get("fields")
+            if not isinstance(fields, dict):
+                return jsonify({"error": "fields must be an object", "index": index}), 400
+            changes = task_changes(fields)
+            if not changes:
+                return jsonify({"error": "Nothing to update", "index": index}), 400
+            changes["updated_at"] = now
+            if len(ids) == 1:
+                writes.append(UpdateOne({"_id": ids[0], "user_id": user_id}, {"$set": changes}))
+            else:
+                writes.append(UpdateMany({"_id": {"$in": ids}, "user_id": user_id}, {"$set": changes}))
+            results.append({"op": "update", "ids": ids})
+
+        elif kind == "delete":
+            if len(ids) == 1:
+                writes.append(DeleteOne({"_id": ids[0], "user_id": user_id}))
+            else:
+                writes.append(DeleteMany({"_id": {"$in": ids}, "user_id": user_id}))
+            results.append({"op": "delete", "ids": [str(i) for i in ids]})
+
+        else:
+            return jsonify({"error": f"Unknown op '{kind}'", "index": index}), 400
+
+    try:
+        res = tasks_collection.bulk_write(writes, ordered=True)
+    except BulkWriteError as e:
+        details = e.details or {}
+        return jsonify({
+            "error": "Bulk write failed",
+            "write_errors": [
+                {"index": w.get("index"), "message": w.get("errmsg")}
+                for w in details.get("writeErrors", [])
+            ],
+            "inserted": details.get("nInserted", 0),
+            "modified": details.get("nModified", 0),
+            "deleted": details.get("nRemoved", 0),
+        }), 400
+    finally:
+        bump_version(user_id, "tasks")
+
+    updated_ids = {i for r in results if r["op"] == "update" for i in r["ids"]}
+    stored = {}
+    if updated_ids:
+        stored = {t["_id"]: t for t in tasks_collection.find({"_id": {"$in": list(updated_ids)}, "user_id": user_id})}
+    for r in results:
+        if r["op"] == "update":
+            ids = r.pop("ids")
+            r["tasks"] = [serialize_task(stored[i]) for i in ids if i in stored]
+            r["not_found"] = [str(i) for i in ids if i not in stored]
+
+    return jsonify({
+        "results": results,
+        "inserted": res.inserted_count,
+        "matched": res.matched_count,
+        "modified": res.modified_count,
+        "deleted": res.deleted_count,
+    }), 200
+
+def list_tasks(user_id):
+    return list(tasks_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"created_at": -1}},
+        {"$project": TASK_VIEW},
+    ]))
 
 @todo_api.route("/tasks/<user_id>", methods=["GET"])
+@db_budget(round_trips=2)
 def get_tasks_for_user(user_id):
-    tasks = list(tasks_collection.find({"user_id": user_id}).sort("created_at", -1))
-    return jsonify([serialize_task(t) for t in tasks]), 200
+    etag = current_etag(user_id, "tasks", scope="tasks")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return with_etag(jsonify(list_tasks(user_id)), etag), 200
 
 @todo_api.route("/tasks/item/<task_id>", methods=["GET"])
+@db_budget(round_trips=1)
 def get_single(task_id):
     try:
         t = tasks_collection.find_one({"_id": ObjectId(task_id)})
@@ -63,13 +240,10 @@ def get_single(task_id):
     return jsonify(serialize_task(t)), 200
 
 @todo_api.route("/tasks/<task_id>", methods=["PUT"])
+@db_budget(round_trips=2)
 def update_task(task_id):
     data = request.json or {}
-    update = {}
-    allowed = ["title","description","date","deadline","priority","urgent","category","completed"]
-    for k in allowed:
-        if k in data:
-            update[k] = data[k]
+    update = task_changes(data)
     if not update:
         return jsonify({"error": "Nothing to update"}), 400
     update["updated_at"] = datetime.utcnow().isoformat()
@@ -83,14 +257,144 @@ def update_task(task_id):
         return jsonify({"error": "Invalid task id"}), 400
     if not res:
         return jsonify({"error": "Not found"}), 404
+    bump_version(res.get("user_id"), "tasks")
     return jsonify(serialize_task(res)), 200
 
 @todo_api.route("/tasks/<task_id>", methods=["DELETE"])
+@db_budget(round_trips=2)
 def delete_task(task_id):
     try:
-        r = tasks_collection.delete_one({"_id": ObjectId(task_id)})
+        deleted = tasks_collection.find_one_and_delete(
+            {"_id": ObjectId(task_id)},
+            projection={"user_id": 1}
+        )
     except:
         return jsonify({"error": "Invalid task id"}), 400
-    if r.deleted_count == 0:
+    if not deleted:
         return jsonify({"error": "Not found"}), 404
+    bump_version(deleted.get("user_id"), "tasks")
     return jsonify({"success": True}), 200
+
+# -------------------------------
+# Agenda views
+# -------------------------------
+AGENDA_VIEWS = ["overdue", "today", "upcoming", "urgent"]
+MAX_AGENDA_LIMIT = 500
+
+def agenda_today():
+    """Day boundary for the agenda; clients may pass ?today=YYYY-MM-DD for their timezone."""
+    return parse_day(request.args.get("today")) or datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+def agenda_query(user_id, view, today, days=7, priority=None):
+    query = {"user_id": user_id, "completed": False}
+    if view == "overdue":
+        query["deadline_at"] = {"$lt": today}
+    elif view == "today":
+        query["deadline_at"] = {"$gte": today, "$lt": today + timedelta(days=1)}
+    elif view == "upcoming":
+        query["deadline_at"] = {"$gte": today + timedelta(days=1), "$lt": today + timedelta(days=1 + days)}
+    elif view == "urgent":
+        query["urgent"] = True
+    if priority:
+        query["priority"] = priority
+    return query
+
+@todo_api.route("/agenda/<user_id>/<view>", methods=["GET"])
+@db_budget(round_trips=2)
+def get_agenda(user_id, view):
+    if view not in AGENDA_VIEWS:
+        return jsonify({"error": f"Unknown view (use one of {', '.join(AGENDA_VIEWS)})"}), 400
+
+    today = agenda_today()
+    days = min(max(request.args.get("days", 7, type=int), 1), 366)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), MAX_AGENDA_LIMIT)
+    priority = request.args.get("priority")
+
+    etag = current_etag(
+        user_id, "tasks",
+        scope=f"agenda:{view}:{today:%Y%m%d}:{days}:{priority or ''}:{limit}",
+    )
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    tasks = list(tasks_collection.aggregate([
+        {"$match": agenda_query(user_id, view, today, days, priority)},
+        {"$sort": {"deadline_at": 1, "_id": 1}},
+        {"$limit": limit},
+        {"$project": TASK_VIEW},
+    ]))
+    return with_etag(jsonify(tasks), etag), 200
+
+@todo_api.route("/agenda/<user_id>/counts", methods=["GET"])
+@db_budget(round_trips=2)
+def get_agenda_counts(user_id):
+    today = agenda_today()
+    tomorrow = today + timedelta(days=1)
+    days = min(max(request.args.get("days", 7, type=int), 1), 366)
+    horizon = tomorrow + timedelta(days=days)
+
+    etag = current_etag(user_id, "tasks", scope=f"agenda_counts:{today:%Y%m%d}:{days}")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    def count_if(condition):
+        return {"$sum": {"$cond": [condition, 1, 0]}}
+
+    # Missing deadline_at compares as null, which sorts below every date,
+    # so "overdue" explicitly requires a date.
+    has_deadline = {"$eq": [{"$type": "$deadline_at"}, "date"]}
+    pipeline = [
+        {"$match": {"user_id": user_id, "completed": False}},
+        {"$group": {
+            "_id": None,
+            "open": {"$sum": 1},
+            "overdue": count_if({"$and": [has_deadline, {"$lt": ["$deadline_at", today]}]}),
+            "today": count_if({"$and": [{"$gte": ["$deadline_at", today]}, {"$lt": ["$deadline_at", tomorrow]}]}),
+            "upcoming": count_if({"$and": [{"$gte": ["$deadline_at", tomorrow]}, {"$lt": ["$deadline_at", horizon]}]}),
+            "urgent": count_if({"$eq": ["$urgent", True]}),
+            "high_priority": count_if({"$eq": ["$priority", "High"]}),
+        }},
+        {"$project": {"_id": 0}},
+    ]
+    result = next(tasks_collection.aggregate(pipeline), None) or {
+        "open": 0, "overdue": 0, "today": 0, "upcoming": 0, "urgent": 0, "high_priority": 0,
+    }
+    return with_etag(jsonify(result), etag), 200
+
+# -------------------------------
+# Backfill typed deadlines on tasks created before deadline_at existed:
+#   python todo_api.py
+# Each batch bumps its users' "tasks" version, so cached agenda views pick
+# up the backfilled tasks.
+# -------------------------------
+def _write_deadlines(batch, users):
+    updated = tasks_collection.bulk_write(batch, ordered=False).modified_count
+    for user_id in users:
+        bump_version(user_id, "tasks")
+    return updated
+
+
+def backfill_deadline_dates(batch_size=1000):
+    query = {"deadline_at": {"$exists": False}}
+    updated = 0
+    batch, users = [], set()
+    for task in tasks_collection.find(query, {"deadline": 1, "user_id": 1}).batch_size(batch_size):
+        batch.append(UpdateOne(
+            {"_id": task["_id"]},
+            {"$set": {"deadline_at": parse_day(task.get("deadline"))}},
+        ))
+        users.add(task.get("user_id"))
+        if len(batch) >= batch_size:
+            updated += _write_deadlines(batch, users)
+            batch, users = [], set()
+    if batch:
+        updated += _write_deadlines(batch, users)
+    return updated
+
+
+if __name__ == "__main__":
+    print("Backfilled deadline_at on", backfill_deadline_dates(), "tasks")
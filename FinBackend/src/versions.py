@@ -0,0 +1,67 @@
+# versions.py
+"""
+Per-user, per-collection version counters used for conditional GETs.
+
+Write endpoints call `bump_version(user_id, "expenses")` after a
+successful write; read endpoints derive an ETag from the counters and
+return 304 before touching the data collections:
+
+    etag = current_etag(user_id, "expenses", scope="summary")
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    ...
+    return with_etag(jsonify(payload), etag)
+
+Counters live in one small document per user (`_id` = user id on
+MongoDB), so the check is a single point read. They go through
+repository.py, so they follow STORAGE_BACKEND like the notes they
+version. Counters alone are the
+same for every user who has written the same number of times, so the
+ETag also carries a hash of the user id, and responses vary on
+Authorization: one user's validator never revalidates another user's
+cached copy.
+"""
+
+import hashlib
+
+from flask import request, make_response
+
+from repository import repository
+
+versions = repository("user_versions", user_field="_id")
+
+
+def bump_version(user_id, *collections):
+    if not user_id or not collections:
+        return
+    versions.increment(user_id, collections)
+
+
+def _owner(user_id):
+    return hashlib.blake2b(str(user_id).encode(), digest_size=8).hexdigest()
+
+
+def current_etag(user_id, *collections, scope=""):
+    found = versions.counters(user_id, collections)
+    counters = ".".join(str(found[name]) for name in collections)
+    return f"{_owner(user_id)}:{scope or '-'}:{counters}"
+
+
+def not_modified(etag):
+    """Return a 304 response when the client already holds `etag`, else None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    # Accepts either a Response or a (Response, status) tuple
+    status = None
+    if isinstance(response, tuple):
+        response, status = response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Authorization")
+    return (response, status) if status is not None else response
@@ -0,0 +1,184 @@
+# write_behind.py
+"""
+Bounded in-process write-behind queue for fire-and-forget inserts.
+
+Request handlers `put()` a document and return immediately. A daemon
+thread drains the queue and writes the documents with one
+`insert_many(ordered=False)` per batch. A batch is flushed when it
+reaches `batch_size` or when `flush_interval` seconds have passed since
+its first document. `close()` (also registered with atexit) flushes
+whatever is left.
+
+When the queue is full, `policy` decides what happens:
+
+- "drop" (default): the document is discarded and counted.
+- "block": the caller waits up to `block_timeout` seconds for room, then drops.
+
+Metrics: nexwise_write_behind_queue_depth,
+nexwise_write_behind_flush_seconds and
+nexwise_write_behind_records_total{outcome=written|dropped|failed}.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from metrics import counter, gauge, histogram
+
+logger = logging.getLogger("write_behind")
+
+POLICIES = ("drop", "block")
+
+_queues = {}
+
+
+def _depths():
+    return {(name,): q.depth() for name, q in list(_queues.items())}
+
+
+QUEUE_DEPTH = gauge(
+    "nexwise_write_behind_queue_depth",
+    "Documents waiting in a write-behind queue.",
+    ("queue",),
+    callback=_depths,
+)
+FLUSH_LATENCY = histogram(
+    "nexwise_write_behind_flush_seconds",
+    "Duration of one write-behind insert_many flush.",
+    ("queue",),
+)
+RECORDS = counter(
+    "nexwise_write_behind_records_total",
+    "Documents handled by a write-behind queue, by outcome.",
+    ("queue", "outcome"),
+)
+
+
+class WriteBehindQueue:
+    def __init__(self, name, collection, max_size=10000, batch_size=500,
+                 flush_interval=1.0, policy="drop", block_timeout=0.5):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.name = name
+        self.collection = collection
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        _queues[name] = self
+
+    # -------------------------------
+    # Producer side
+    # -------------------------------
+    def put(self, doc):
+        """Enqueue `doc`; returns False if it was dropped because the queue is full."""
+        self._ensure_worker()
+        try:
+            if self.policy == "block":
+                self._queue.put(doc, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(doc)
+            return True
+        except queue.Full:
+            RECORDS.inc(queue=self.name, outcome="dropped")
+            return False
+
+    def depth(self):
+        return self._queue.qsize()
+
+    # -------------------------------
+    # Worker
+    # -------------------------------
+    def _ensure_worker(self):
+        # Threads don't survive fork: each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_size)
+            # A fresh event per thread: a put() after close() restarts a live
+            # worker, and a worker that outlived close()'s join still stops
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                            name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain_nowait(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            RECORDS.inc(len(batch), queue=self.name, outcome="written")
+        except Exception:
+            logger.exception("write-behind flush of %d documents to %s failed", len(batch), self.name)
+            RECORDS.inc(len(batch), queue=self.name, outcome="failed")
+        finally:
+            FLUSH_LATENCY.observe(time.perf_counter() - start, queue=self.name)
+
+    def _run(self, stop):
+        while not stop.is_set():
+            self._write(self._next_batch())
+
+    # -------------------------------
+    # Shutdown
+    # -------------------------------
+    def close(self, timeout=5.0):
+        """Stop the worker and flush everything still queued."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        while True:
+            batch = self._drain_nowait()
+            if not batch:
+                break
+            self._write(batch)
+
+
+def close_all():
+    for q in list(_queues.values()):
+        q.close()
+
+
+atexit.register(close_all)
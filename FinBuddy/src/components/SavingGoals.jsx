@@ -108,7 +108,7 @@ function SavingGoals() {
         "Content-Type": "application/json",
         Authorization: `Bearer ${token}`,
       },
-      body: JSON.stringify({ name: goal.name }),
+      body: JSON.stringify({ id: goal._id, name: goal.name }),
     });
 
     loadGoals();
@@ -127,7 +127,7 @@ function SavingGoals() {
         "Content-Type": "application/json",
         Authorization: `Bearer ${token}`,
       },
-      body: JSON.stringify({ name: goal.name }),
+      body: JSON.stringify({ id: goal._id, name: goal.name }),
     });
 
     loadGoals();